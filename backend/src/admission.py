@@ -0,0 +1,178 @@
+# admission.py
+# 推理接口的准入控制与背压
+#
+# 每一类推理接口（按路径前缀与请求方法划分为一条 lane）有自己的并发上限和有界等待队列：
+# - 并发未满：直接进入
+# - 并发已满、队列未满：排队等待
+# - 队列也满了：立即返回 429，并根据观测到的服务时间给出 `Retry-After`
+
+import json
+import math
+import time
+import asyncio
+
+from src import metrics
+
+
+class AdmissionLane:
+    """
+    一条准入通道
+    """
+
+    _EWMA_ALPHA = 0.2 # 服务时间指数滑动平均的权重
+
+    def __init__(
+        self,
+        name: str,
+        prefixes: tuple[str, ...],
+        concurrency: int,
+        max_queue: int,
+        initial_service_time: float,
+        methods: frozenset[str] | None = None,
+    ):
+        self.name = name
+        self.prefixes = prefixes
+        self.methods = methods # None 表示不区分请求方法
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+
+        self.in_flight = 0
+        self.queued = 0
+        self.service_time = initial_service_time # 观测到的平均服务时间（秒）
+
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # 延迟创建 保证绑定到 uvicorn 的事件循环上
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def is_full(self) -> bool:
+        """并发与等待队列是否都已经满了"""
+
+        return self.in_flight + self.queued >= self.concurrency + self.max_queue
+
+    def retry_after(self) -> int:
+        """
+        估算多久之后再来大概率能被接纳（秒）
+
+        排在前面的请求数 / 并发数 × 平均服务时间
+        """
+
+        ahead = self.in_flight + self.queued - self.concurrency + 1
+        return max(1, math.ceil(self.service_time * max(ahead, 1) / self.concurrency))
+
+    def record_service_time(self, seconds: float) -> None:
+        self.service_time = (1 - self._EWMA_ALPHA) * self.service_time + self._EWMA_ALPHA * seconds
+        metrics.observe("admission_service_seconds", seconds, lane=self.name)
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("admission_in_flight", self.in_flight, lane=self.name)
+        metrics.set_gauge("admission_queued", self.queued, lane=self.name)
+
+    async def enter(self) -> None:
+        """排队直到获得执行名额"""
+
+        self.queued += 1
+        self._update_gauges()
+        start = time.monotonic()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+            metrics.observe("admission_queue_wait_seconds", time.monotonic() - start, lane=self.name)
+
+        self.in_flight += 1
+        self._update_gauges()
+
+    def leave(self, service_seconds: float) -> None:
+        """释放执行名额"""
+
+        self.in_flight -= 1
+        self.semaphore.release()
+        self.record_service_time(service_seconds)
+        self._update_gauges()
+
+
+class AdmissionControlMiddleware:
+    """
+    准入控制中间件（纯 ASGI 实现 不缓冲响应体）
+
+    Args:
+        app: 下游 ASGI 应用
+        limits: {lane 名: {"prefix": 路径前缀（或前缀列表）, "methods": 请求方法列表（可选 缺省不区分）,
+            "concurrency": 并发上限, "max_queue": 队列长度, "service_time": 初始服务时间估计}}
+    """
+
+    def __init__(self, app, limits: dict[str, dict]):
+        self.app = app
+        self.lanes = []
+        for name, limit in limits.items():
+            prefixes = limit["prefix"]
+            methods = limit.get("methods")
+            self.lanes.append(AdmissionLane(
+                name = name,
+                prefixes = (prefixes,) if isinstance(prefixes, str) else tuple(prefixes),
+                concurrency = limit["concurrency"],
+                max_queue = limit["max_queue"],
+                initial_service_time = limit.get("service_time", 10.0),
+                methods = frozenset(method.upper() for method in methods) if methods is not None else None,
+            ))
+        # 最长前缀优先
+        self._routes = sorted(
+            ((prefix, lane) for lane in self.lanes for prefix in lane.prefixes),
+            key=lambda route: len(route[0]),
+            reverse=True,
+        )
+
+    def _match(self, method: str, path: str) -> AdmissionLane | None:
+        for prefix, lane in self._routes:
+            if path.startswith(prefix) and (lane.methods is None or method in lane.methods):
+                return lane
+        return None
+
+    async def _reject(self, lane: AdmissionLane, send) -> None:
+        retry_after = lane.retry_after()
+        metrics.inc("admission_rejected_total", lane=lane.name)
+
+        body = json.dumps({ "success": False, "error": "Server busy, please retry later.", "retry_after": retry_after }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({ "type": "http.response.body", "body": body })
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS":
+            # CORS 预检等请求不占用推理名额
+            await self.app(scope, receive, send)
+            return
+
+        lane = self._match(scope.get("method", ""), scope["path"])
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        if lane.is_full():
+            await self._reject(lane, send)
+            return
+
+        await lane.enter()
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.leave(time.monotonic() - start)
+
+
+__all__ = [
+    "AdmissionLane",
+    "AdmissionControlMiddleware",
+]
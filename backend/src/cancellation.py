@@ -0,0 +1,225 @@
+# cancellation.py
+# 截止时间与取消传播
+#
+# HTTP 请求 → workflow → 在线调用 / 离线模型生成线程
+#
+# - 协程这一侧直接依靠 asyncio 的取消机制（`asyncio.wait_for` / `Task.cancel`）
+# - 离线模型在 `asyncio.to_thread` 的线程里跑，无法被 asyncio 打断，
+#   所以用 `CancellationToken` 在每生成一个 token 时检查一次，取消后最多再生成一个 token 就停下
+
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, TypeVar
+
+from fastapi import Request
+
+
+T = TypeVar("T")
+
+_DISCONNECT_POLL_INTERVAL = 0.5 # 检查 HTTP 连接是否断开的间隔（秒）
+
+# 当前上下文的截止时间（time.monotonic() 时间点） None 表示没有截止时间
+_current_deadline: ContextVar[float | None] = ContextVar("current_deadline", default=None)
+
+
+class ClientDisconnected(Exception):
+    """
+    HTTP 客户端在请求处理完成前断开了连接
+    """
+
+
+class CancellationToken:
+    """
+    跨线程的取消标记
+
+    既可以被显式 `cancel()`，也会在到达 `deadline` 后自动视为已取消。
+    """
+
+    def __init__(self, deadline: float | None = None):
+        self.deadline = deadline
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        """取消"""
+
+        self._event.set()
+
+    def is_cancelled(self) -> bool:
+        """是否已经被取消或者超过截止时间"""
+
+        if self._event.is_set():
+            return True
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def stopping_criteria(self, input_ids, logits) -> bool:
+        """
+        llama.cpp `StoppingCriteria` 形式的检查函数 取消后返回 True 停止生成
+        """
+
+        return self.is_cancelled()
+
+    def logits_processor(self, eos_token: int):
+        """
+        llama.cpp `LogitsProcessor` 形式的检查函数
+
+        `create_chat_completion` 不接受自定义的 stopping_criteria，但每生成一个 token 都会调用 logits_processor，
+        取消后把除 EOS 以外的所有 logits 置为负无穷，下一个 token 必然是 EOS，生成随即结束。
+
+        Args:
+            eos_token (int): 模型的结束符 token
+        """
+
+        def processor(input_ids, scores):
+            if self.is_cancelled():
+                scores[:] = float("-inf")
+                scores[eos_token] = 0.0
+            return scores
+
+        return processor
+
+
+@contextmanager
+def deadline_scope(seconds: float | None) -> Iterator[None]:
+    """
+    在当前上下文中设置截止时间
+
+    嵌套使用时取更早的那个；传入 None 表示清除截止时间（用于与请求生命周期解耦的共享任务）。
+
+    Args:
+        seconds (float | None): 从现在起的剩余秒数
+    """
+
+    if seconds is None:
+        deadline = None
+    else:
+        deadline = time.monotonic() + seconds
+        outer = _current_deadline.get()
+        if outer is not None:
+            deadline = min(deadline, outer)
+
+    reset_token = _current_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _current_deadline.reset(reset_token)
+
+
+def remaining_time() -> float | None:
+    """
+    当前上下文距离截止时间的剩余秒数
+
+    Returns:
+        float | None: 剩余秒数（可能为负） 没有截止时间时返回 None
+    """
+
+    deadline = _current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline() -> None:
+    """
+    如果已经超过截止时间 抛出 TimeoutError
+    """
+
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise TimeoutError("Deadline exceeded.")
+
+
+async def run_cancellable(func: Callable[[CancellationToken], T]) -> T:
+    """
+    在线程中执行一个可以被取消的阻塞函数（通常是离线模型生成）
+
+    `func` 接收一个 `CancellationToken`，需要在生成过程中检查它。
+    协程被取消时会取消 token，并等待线程真正退出后再继续抛出，保证模型已经被释放。
+
+    Args:
+        func: 接收 CancellationToken 的阻塞函数
+    Returns:
+        func 的返回值
+    """
+
+    token = CancellationToken(_current_deadline.get())
+    future = asyncio.ensure_future(asyncio.to_thread(func, token))
+
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        token.cancel()
+        try:
+            await future
+        except Exception:
+            pass
+        raise
+
+
+async def with_deadline(awaitable: Awaitable[T], seconds: float | None) -> T:
+    """
+    在截止时间内执行 超时抛出 TimeoutError
+
+    Args:
+        awaitable: 要执行的协程
+        seconds (float | None): 截止时间（秒） None 表示不限时
+    """
+
+    with deadline_scope(seconds):
+        if seconds is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, seconds)
+        except asyncio.TimeoutError as e:
+            # Python 3.10 中 asyncio.TimeoutError 不是内置的 TimeoutError
+            raise TimeoutError("Deadline exceeded.") from e
+
+
+async def run_request(request: Request, awaitable: Awaitable[T], deadline: float | None) -> T:
+    """
+    在 HTTP 请求的生命周期内执行一项工作
+
+    - 超过 `deadline` 秒后取消，抛出 TimeoutError
+    - 客户端断开连接后取消，抛出 ClientDisconnected
+
+    Args:
+        request (Request): FastAPI 请求对象
+        awaitable: 要执行的协程
+        deadline (float | None): 截止时间（秒） None 表示不限时
+    Returns:
+        awaitable 的返回值
+    """
+
+    task = asyncio.ensure_future(with_deadline(awaitable, deadline))
+    disconnected = False
+
+    async def watch_disconnect():
+        nonlocal disconnected
+        while not task.done():
+            if await request.is_disconnected():
+                disconnected = True
+                task.cancel()
+                return
+            await asyncio.sleep(_DISCONNECT_POLL_INTERVAL)
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if disconnected:
+            raise ClientDisconnected()
+        raise
+    finally:
+        watcher.cancel()
+
+
+__all__ = [
+    "CancellationToken",
+    "ClientDisconnected",
+    "deadline_scope",
+    "remaining_time",
+    "check_deadline",
+    "run_cancellable",
+    "with_deadline",
+    "run_request",
+]
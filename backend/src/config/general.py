@@ -19,6 +19,9 @@ OFFLINE_CHAT_MODEL_PATH = OFFLINE_MODEL_DIR / "LFM2.5-1.2B-Instruct-Q4_K_M.gguf"
 # OFFLINE_CHAT_MODEL_PATH = OFFLINE_MODEL_DIR / "qwen2.5-coder-1.5b-instruct-q4_k_m.gguf"
 OFFLINE_REASONING_MODEL_PATH = OFFLINE_MODEL_DIR / "Qwen3-4B-Thinking-2507-Q4_K_M.gguf"
 
+# 离线模型提示词前缀状态缓存的最大条目数（每个条目保存一份模型状态 注意内存占用）
+OFFLINE_PROMPT_CACHE_ENTRIES = 16
+
 # 为本地 llama-cpp-python 服务设置一致的 API Key（如未开启鉴权，可保留占位符）
 OFFLINE_MODEL_API_KEY = "sk-xxx"
 
@@ -37,4 +40,136 @@ ONLINE_MODEL_HOST = "https://api.deepseek.com/v1"
 
 # ========== 图配置 ============
 
+# 也可以指向由 `python -m src.map.binary <地图文件>` 转换出的 `.map.bin` 二进制地图（内存映射加载 多进程共享）
 MAP_PATH = BACKEND_ROOT_DIR / "assets" / "newest.map.json"
+
+# 检查地图文件是否变化的间隔（秒） 变化后自动热更新 0 表示不检查
+MAP_RELOAD_INTERVAL = 5.0
+
+# 边的临时调整（封闭 / 拥堵加权）默认的有效时长（秒） 以及检查过期的间隔（秒）
+EDGE_ADJUSTMENT_DEFAULT_TTL = 1800.0
+EDGE_ADJUSTMENT_SWEEP_INTERVAL = 5.0
+
+# 缓存的小车指令序列条数
+CAR_COMMAND_CACHE_ENTRIES = 256
+
+# 主节点不超过该数量时 加载地图后预先计算所有主节点对之间的小车指令段（见 smart_triager/car/segments.py）
+CAR_SEGMENT_PRECOMPUTE_MAX_MAIN_NODES = 200
+
+# 小车通道：发出的指令批次超过该时长（秒）没有收到 ACK 时重发 以及检查的间隔
+CAR_CHANNEL_RETRANSMIT_TIMEOUT = 2.0
+CAR_CHANNEL_RETRANSMIT_INTERVAL = 1.0
+
+# 小车运动学参数 用于估计执行时间（地图坐标单位按 1 米估计）
+# 最高速度（单位/秒） 加速度与减速度（单位/秒²） 原地 90° 转向的时间（秒）
+CAR_MAX_SPEED = 0.8
+CAR_ACCELERATION = 0.5
+CAR_DECELERATION = 0.8
+CAR_TURN_SECONDS = 2.0
+
+# 多车调度（见 smart_triager/car/fleet.py）
+# 时间展开图的时间步长（秒） 导航节点 / 边的预约在占用时间前后各多留的步数
+FLEET_TIME_STEP = 1.0
+FLEET_RESERVATION_MARGIN = 1
+# 每一段路线最多比不避让时晚到的时间（秒） 以及单段搜索最多展开的状态数 超过则这个任务本轮不分配
+FLEET_MAX_DELAY_SECONDS = 300.0
+FLEET_MAX_EXPANSIONS = 200_000
+
+# 节点数不超过该值时 编译地图会计算所有节点之间的最短路径表，否则只计算到主节点的
+COMPILED_MAP_ALL_PAIRS_MAX_NODES = 2000
+
+# 单次查询最短路径的默认算法
+# - dijkstra: 普通 Dijkstra
+# - astar: 以曼哈顿距离为启发函数的 A*
+# - bidirectional: 双向 Dijkstra
+# - hierarchy: 收缩层次 需要先运行 `python -m src.map.hierarchy <地图文件>` 生成预处理文件，没有时退回 astar
+SEARCH_STRATEGY_TYPES = Literal["dijkstra", "astar", "bidirectional", "hierarchy"]
+MAP_SEARCH_STRATEGY: SEARCH_STRATEGY_TYPES = "astar"
+
+# 路线规划的优化目标
+# - distance: 最短距离
+# - time: 最短执行时间 小车转向比直行慢得多，在（节点, 行进方向）的状态图上把转向也计入代价
+ROUTING_OBJECTIVE_TYPES = Literal["distance", "time"]
+MAP_ROUTING_OBJECTIVE: ROUTING_OBJECTIVE_TYPES = "distance"
+
+# 转向代价 折算为等效的直行距离（掉头在指令中分解为两次 90° 转向）
+CAR_TURN_COST = 2
+CAR_UTURN_COST = 4
+
+# 优化多个停靠点的访问顺序时 停靠点不超过该数量用精确的状态压缩 DP，否则用插入 + 局部搜索的启发式
+VISIT_ORDER_EXACT_MAX_STOPS = 8
+
+# ========== 在线模型限流配置 ==========
+
+# DeepSeek 账户侧的限额 客户端主动限流 留一点余量
+ONLINE_REQUESTS_PER_MINUTE = 60
+
+ONLINE_TOKENS_PER_MINUTE = 120_000
+
+# 429 / 5xx 时的最大重试次数 以及指数退避的基础/上限延迟（秒）
+ONLINE_MAX_RETRIES = 4
+
+ONLINE_BACKOFF_BASE_DELAY = 0.5
+
+ONLINE_BACKOFF_MAX_DELAY = 20.0
+
+# ========== 请求截止时间配置 ==========
+
+# 各个推理接口的默认截止时间（秒） 超时后取消正在进行的生成并返回 504
+REQUEST_DEADLINES: dict[str, float] = {
+    "get_route_patch": 240.0,
+    "collect_conditions": 60.0,
+    "select_clinic": 45.0,
+    "collect_requirement": 60.0,
+    "patch_route": 90.0,
+    "batch_item": 120.0, # 批量分诊中单个患者的截止时间
+    "session": 240.0,
+}
+
+# ========== 批量分诊配置 ==========
+
+# 单次批量请求最多包含的患者数
+BATCH_TRIAGE_MAX_ITEMS = 32
+
+# 使用在线模型时 批量内同时进行的患者数
+BATCH_ONLINE_CONCURRENCY = 4
+
+# 单次批量路线规划请求最多包含的路线数
+BATCH_ROUTES_MAX_ITEMS = 256
+
+# ========== 准入控制配置 ==========
+
+# 推理接口按路径前缀（可以是多个）与请求方法划分通道 每条通道有并发上限与等待队列长度 队列满后直接返回 429
+# service_time 为启动时对平均服务时间（秒）的初始估计 运行后会按实际观测值更新
+# 分诊通道只包含需要模型推理的接口 指令解析、路线优化、ETA 估算与会话查询 / 删除等确定性接口不占用推理名额
+ADMISSION_LIMITS: dict[str, dict] = {
+    "triager": {
+        "prefix": [
+            "/api/triager/get_route_patch/",
+            "/api/triager/collect_conditions/",
+            "/api/triager/select_clinic/",
+            "/api/triager/collect_requirement/",
+            "/api/triager/patch_route/",
+            "/api/triager/batch/",
+            "/api/triager/session/", # 只有 POST（向会话提交输入）需要推理
+        ],
+        "methods": ["POST"],
+        "concurrency": 2,
+        "max_queue": 8,
+        "service_time": 15.0,
+    },
+    "voice": {"prefix": "/api/voice/", "concurrency": 1, "max_queue": 4, "service_time": 5.0},
+    "medical_advice": {"prefix": "/api/medical/generate_advice/", "concurrency": 2, "max_queue": 4, "service_time": 20.0},
+}
+
+# ========== 分诊会话配置 ==========
+
+# 会话的过期时间（秒） 超过该时间没有新的输入则丢弃
+SESSION_TTL_SECONDS = 30 * 60
+
+# 会话持久化的 sqlite 文件路径 None 表示只保存在内存中
+SESSION_SQLITE_PATH: Path | None = None
+
+# 使用在线模型时 会话中症状收集一次调用的 token 预算（按 estimate_tokens 估算 含生成的 max_tokens）
+# 离线模型直接按上下文长度计算 超出预算时丢弃较早的轮次 用最新的症状总结代替
+SESSION_ONLINE_CONTEXT_TOKENS = 16_000
@@ -0,0 +1,166 @@
+# llm/offline/prompt_cache.py
+# 离线模型的提示词前缀状态缓存
+#
+
+import threading
+from collections import OrderedDict
+
+from llama_cpp import Llama, LlamaState
+from llama_cpp.llama_chat_format import format_chatml
+
+from src import metrics
+from src.config import general
+
+
+def prompt_tokens(model: Llama, messages: list[dict]) -> list[int]:
+    """
+    按照 `create_chat_completion` 相同的方式（chatml）把消息列表转成 token
+
+    Args:
+        model (Llama): 离线模型
+        messages (list[dict]): 消息列表
+    Returns:
+        list[int]: token 列表
+    """
+
+    prompt = format_chatml(messages).prompt
+    return model.tokenize(prompt.encode("utf-8"), add_bos=True, special=True)
+
+
+def static_prefix_tokens(model: Llama, messages: list[dict]) -> list[int]:
+    """
+    计算消息列表中 **不随最后一条消息内容变化** 的 token 前缀
+
+    做法是把最后一条消息的内容分别替换成两个不同的占位符，取两者 token 的最长公共前缀，
+    这样无论模板和分词器怎么在边界处切分，得到的前缀都一定是真实提示词的前缀。
+
+    Args:
+        model (Llama): 离线模型
+        messages (list[dict]): 消息列表
+    Returns:
+        list[int]: 静态前缀 token
+    """
+
+    last = messages[-1]
+    tokens_a = prompt_tokens(model, messages[:-1] + [{**last, "content": "0"}])
+    tokens_b = prompt_tokens(model, messages[:-1] + [{**last, "content": "1"}])
+
+    length = 0
+    for a, b in zip(tokens_a, tokens_b):
+        if a != b:
+            break
+        length += 1
+
+    return tokens_a[:length]
+
+
+class PromptStateCache:
+    """
+    按 token 前缀缓存模型求值后的完整状态（KV cache 以及循环层状态）
+
+    直接依赖 llama.cpp 的前缀匹配复用 KV 需要裁剪缓存，对混合结构（带循环层）的模型并不可靠，
+    所以这里保存前缀求值完成那一刻的完整状态，使用时整体恢复，再让 `create_chat_completion`
+    通过前缀匹配只计算后面的增量部分。
+
+    多轮对话时，上一轮保存的前缀正好是这一轮前缀的前缀，恢复它之后只需要求值新增的对话。
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._states: OrderedDict[tuple, LlamaState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _longest_cached_prefix(self, model: Llama, prefix: list[int]) -> tuple[tuple, LlamaState] | None:
+        """
+        在缓存中找到 `prefix` 的最长已缓存前缀
+        """
+
+        with self._lock:
+            best = None
+            for key, state in self._states.items():
+                model_id, tokens = key
+                if model_id != id(model) or len(tokens) > len(prefix):
+                    continue
+                if best is not None and len(tokens) <= len(best[0][1]):
+                    continue
+                if tuple(prefix[:len(tokens)]) == tokens:
+                    best = (key, state)
+
+            if best is not None:
+                self._states.move_to_end(best[0])
+            return best
+
+    def _put(self, key: tuple, state: LlamaState) -> None:
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+
+    def restore(self, model: Llama, prefix: list[int]) -> bool:
+        """
+        让模型进入「刚刚求值完 `prefix`」的状态 代替 `model.reset()` 使用
+
+        Args:
+            model (Llama): 离线模型
+            prefix (list[int]): 前缀 token
+        Returns:
+            bool: 是否命中缓存
+        """
+
+        key = (id(model), tuple(prefix))
+        cached = self._longest_cached_prefix(model, prefix)
+
+        if cached is not None and cached[0] == key:
+            model.load_state(cached[1])
+            metrics.inc("offline_prompt_cache_hits_total")
+            return True
+
+        if cached is not None:
+            # 部分命中：从已缓存的前缀状态继续 只求值增量部分
+            model.load_state(cached[1])
+            model.eval(prefix[len(cached[0][1]):])
+            metrics.inc("offline_prompt_cache_partial_hits_total")
+        else:
+            model.reset()
+            model.eval(prefix)
+            metrics.inc("offline_prompt_cache_misses_total")
+
+        self._put(key, model.save_state())
+        return False
+
+    def prepare(self, model: Llama, messages: list[dict]) -> bool:
+        """
+        为即将进行的 `create_chat_completion(messages=...)` 恢复静态前缀状态
+
+        Args:
+            model (Llama): 离线模型
+            messages (list[dict]): 即将使用的消息列表
+        Returns:
+            bool: 是否命中缓存
+        """
+
+        return self.restore(model, static_prefix_tokens(model, messages))
+
+    def clear(self) -> None:
+        """清空缓存"""
+
+        with self._lock:
+            self._states.clear()
+
+
+prompt_state_cache = PromptStateCache(max_entries = general.OFFLINE_PROMPT_CACHE_ENTRIES)
+
+
+def get_prompt_state_cache() -> PromptStateCache:
+    """获取全局的提示词前缀状态缓存"""
+
+    return prompt_state_cache
+
+
+__all__ = [
+    "prompt_tokens",
+    "static_prefix_tokens",
+    "PromptStateCache",
+    "get_prompt_state_cache",
+]
@@ -1,3 +1,3 @@
-from src.llm.online.client import get_online_client
+from src.llm.online.client import get_online_client, get_online_scheduler, estimate_tokens, OnlinePriority
 from src.llm.online.chat import get_online_chat_model
-from src.llm.online.reason import get_online_chat_model
\ No newline at end of file
+from src.llm.online.reason import get_online_chat_model
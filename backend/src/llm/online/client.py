@@ -1,19 +1,50 @@
 # llm/online/client.py
-# 在线模型的 AsyncOpenAI client
+# 在线模型的 AsyncOpenAI client 以及客户端侧的限流调度器
 #
 
 import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, TypeVar
 from dotenv import load_dotenv
 load_dotenv() # 加载环境变量
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, APIStatusError
 from agents import set_tracing_disabled
 
+from src import logger, metrics
+from src.cancellation import check_deadline, remaining_time
 from src.config import general
 
 
 set_tracing_disabled(True)  # 禁用 tracing 功能
 online_client: AsyncOpenAI | None = None
+online_scheduler: "OnlineRequestScheduler | None" = None
+
+T = TypeVar("T")
+
+_POLL_INTERVAL = 0.05 # 排队时的轮询间隔（秒）
+
+
+def create_online_client() -> AsyncOpenAI:
+    """
+    新建一个在线模型的 AsyncOpenAI client
+
+    client 的连接池绑定在第一次使用它的事件循环上，在工作线程里用 `asyncio.run` 另开事件循环的调用方
+    （例如病历检索）应当自己新建一个 用完后关闭，不能使用 `get_online_client` 返回的共享实例。
+    """
+
+    return AsyncOpenAI(
+        base_url = general.ONLINE_MODEL_HOST,
+        api_key = os.getenv("API_KEY"),
+        timeout=300,
+        max_retries=0, # 重试交给 OnlineRequestScheduler 统一处理 避免 SDK 自己立刻重发
+    )
 
 
 def _build_online_client():
@@ -25,11 +56,7 @@ def _build_online_client():
 
     global online_client
 
-    online_client = AsyncOpenAI(
-        base_url = general.ONLINE_MODEL_HOST,
-        api_key = os.getenv("API_KEY"),
-        timeout=300,
-    )
+    online_client = create_online_client()
 
 
 def get_online_client() -> AsyncOpenAI:
@@ -39,10 +66,311 @@ def get_online_client() -> AsyncOpenAI:
 
     if online_client is None:
         _build_online_client()
-    
+
     return online_client
 
 
+class OnlinePriority(IntEnum):
+    """
+    在线调用的优先级 数值越小越优先
+    """
+
+    TRIAGE = 0 # 分诊（急诊分流）
+    MEDICAL_ADVICE = 1 # 医疗建议
+    RECORDER = 2 # 病历检索
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    余额允许被扣成负数（实际用量超出预估时），之后的请求会等到余额补回来为止。
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self._balance = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._balance = min(self.capacity, self._balance + elapsed * self.rate_per_second)
+        self._updated_at = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """
+        距离余额足够支付 `amount` 还需要等待的秒数 0 表示现在就够
+        """
+
+        self._refill(now)
+        amount = min(amount, self.capacity) # 超过桶容量的请求只要求桶满即可 否则永远等不到
+        if self._balance >= amount:
+            return 0.0
+        return (amount - self._balance) / self.rate_per_second
+
+    def consume(self, amount: float, now: float) -> None:
+        """
+        扣除 `amount` 负数表示退还（实际用量低于预估） 退还后余额不超过桶容量
+        """
+
+        self._refill(now)
+        self._balance = min(self.capacity, self._balance - amount)
+
+
+def estimate_tokens(*texts: str, max_tokens: int = 0) -> int:
+    """
+    粗略估算一次调用消耗的 token 数
+
+    中文基本一字一 token，英文大约四个字符一个 token，这里统一按字符数估算，宁可高估。
+
+    Args:
+        *texts: 请求中的所有文本（系统提示词、用户输入等）
+        max_tokens: 本次调用允许生成的最大 token 数
+    Returns:
+        int: 预估 token 数
+    """
+
+    return sum(len(text) for text in texts) + max_tokens
+
+
+def _usage_tokens(result: Any) -> int | None:
+    """
+    从调用结果中取出实际消耗的 token 数
+    兼容 openai 的 ChatCompletion 与 agents 的 RunResult
+    """
+
+    usage = getattr(result, "usage", None)
+    if usage is None:
+        context_wrapper = getattr(result, "context_wrapper", None)
+        usage = getattr(context_wrapper, "usage", None)
+
+    total_tokens = getattr(usage, "total_tokens", None)
+    return total_tokens if isinstance(total_tokens, int) and total_tokens > 0 else None
+
+
+def _retry_after_seconds(error: APIStatusError) -> float | None:
+    """读取服务端返回的 `Retry-After` 头"""
+
+    try:
+        value = error.response.headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (AttributeError, ValueError):
+        return None
+
+
+class OnlineRequestScheduler:
+    """
+    在线模型的客户端侧调度器
+
+    - 请求数与 token 数两个令牌桶，分别对应 RPM / TPM 限额
+    - 按 `OnlinePriority` 排队，同优先级先来先服务
+    - 429 / 5xx 时带抖动的指数退避重试，429 会让整个调度器冷却一段时间
+    - 排队等待时间记入 `metrics`
+
+    排队状态用线程锁保护，等待时用 `asyncio.sleep` 轮询，
+    因此在 `asyncio.run` 于工作线程中开启的事件循环里同样可以使用。
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float,
+    ):
+        self._request_bucket = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 6))
+        self._token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 6)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._waiters: list[tuple[int, int]] = [] # (优先级, 序号) 小根堆
+        self._sequence = itertools.count()
+        self._cooldown_until = 0.0
+
+    def _try_acquire(self, entry: tuple[int, int], tokens: int) -> float:
+        """
+        尝试获取一次调用额度
+
+        Returns:
+            float: 还需要等待的秒数 0 表示已经获取成功
+        """
+
+        with self._lock:
+            if self._waiters[0] != entry:
+                # 前面还有更高优先级或者更早的请求
+                return _POLL_INTERVAL
+
+            now = time.monotonic()
+            delay = max(
+                self._cooldown_until - now,
+                self._request_bucket.time_until(1, now),
+                self._token_bucket.time_until(tokens, now),
+            )
+            if delay > 0:
+                return delay
+
+            self._request_bucket.consume(1, now)
+            self._token_bucket.consume(tokens, now)
+            heapq.heappop(self._waiters)
+            metrics.set_gauge("llm_online_queue_length", len(self._waiters))
+            return 0.0
+
+    def _remove_waiter(self, entry: tuple[int, int]) -> None:
+        with self._lock:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            metrics.set_gauge("llm_online_queue_length", len(self._waiters))
+
+    async def acquire(self, priority: OnlinePriority, tokens: int) -> float:
+        """
+        排队直到获得一次调用额度
+
+        Args:
+            priority (OnlinePriority): 调用优先级
+            tokens (int): 预估消耗的 token 数
+        Returns:
+            float: 实际排队等待的秒数
+        """
+
+        entry = (int(priority), next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._waiters, entry)
+            metrics.set_gauge("llm_online_queue_length", len(self._waiters))
+
+        start = time.monotonic()
+        try:
+            while True:
+                delay = self._try_acquire(entry, tokens)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(min(delay, _POLL_INTERVAL))
+        except BaseException:
+            # 被取消时把自己从队列中移除 避免堵住后面的请求
+            self._remove_waiter(entry)
+            raise
+
+        waited = time.monotonic() - start
+        metrics.observe("llm_online_queue_wait_seconds", waited, priority=OnlinePriority(priority).name)
+        return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """
+        调用结束后按实际用量修正 token 桶余额
+        """
+
+        with self._lock:
+            self._token_bucket.consume(actual_tokens - estimated_tokens, time.monotonic())
+
+    def backoff_delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """
+        带完全抖动（full jitter）的指数退避时间
+
+        Args:
+            attempt (int): 第几次重试 从0开始
+            retry_after (float | None): 服务端要求的最短等待时间
+        """
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        priority: OnlinePriority,
+        estimated_tokens: int,
+    ) -> T:
+        """
+        在调度器的限流下执行一次在线调用
+
+        Args:
+            call: 无参的协程工厂 每次重试都会重新调用
+            priority (OnlinePriority): 调用优先级
+            estimated_tokens (int): 预估消耗的 token 数 见 `estimate_tokens`
+        Returns:
+            call 的返回值
+        Raises:
+            APIStatusError: 不可重试的错误 或者重试次数用尽
+        """
+
+        # 只对直接在请求上下文中调用的情况生效；经过 single-flight 合并的调用没有截止时间，由取消来中止
+        attempt = 0
+        while True:
+            check_deadline()
+            await self.acquire(priority, estimated_tokens)
+            start = time.monotonic()
+
+            try:
+                result = await call()
+            except APIStatusError as e:
+                if not (e.status_code == 429 or e.status_code >= 500) or attempt >= self.max_retries:
+                    metrics.inc("llm_online_errors_total", status=e.status_code)
+                    raise
+
+                delay = self.backoff_delay(attempt, _retry_after_seconds(e))
+                remaining = remaining_time()
+                if remaining is not None and delay >= remaining:
+                    # 等不到下一次重试就会超过请求的截止时间 直接放弃
+                    metrics.inc("llm_online_errors_total", status=e.status_code)
+                    raise
+
+                if e.status_code == 429:
+                    # 被限流时让所有排队的请求一起冷却 不要继续往上撞
+                    with self._lock:
+                        self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+
+                attempt += 1
+                metrics.inc("llm_online_retries_total", status=e.status_code)
+                logger.warning(f"[Online Scheduler] HTTP {e.status_code}, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            metrics.observe("llm_online_call_seconds", time.monotonic() - start, priority=OnlinePriority(priority).name)
+            actual_tokens = _usage_tokens(result)
+            if actual_tokens is not None:
+                self.settle(estimated_tokens, actual_tokens)
+            return result
+
+
+def _build_online_scheduler():
+    """
+    初始化在线模型调度器
+    """
+
+    global online_scheduler
+
+    online_scheduler = OnlineRequestScheduler(
+        requests_per_minute = general.ONLINE_REQUESTS_PER_MINUTE,
+        tokens_per_minute = general.ONLINE_TOKENS_PER_MINUTE,
+        max_retries = general.ONLINE_MAX_RETRIES,
+        base_delay = general.ONLINE_BACKOFF_BASE_DELAY,
+        max_delay = general.ONLINE_BACKOFF_MAX_DELAY,
+    )
+
+
+def get_online_scheduler() -> OnlineRequestScheduler:
+    """获取在线模型调度器实例"""
+
+    global online_scheduler
+
+    if online_scheduler is None:
+        _build_online_scheduler()
+
+    return online_scheduler
+
+
 __all__ = [
+    "create_online_client",
     "get_online_client",
+    "get_online_scheduler",
+    "estimate_tokens",
+    "OnlinePriority",
+    "OnlineRequestScheduler",
+    "TokenBucket",
 ]
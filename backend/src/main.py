@@ -2,13 +2,22 @@
 # 后端服务器入口
 #
 
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from src import logger
+from src.admission import AdmissionControlMiddleware
+from src.config.general import ADMISSION_LIMITS, MAP_RELOAD_INTERVAL, EDGE_ADJUSTMENT_SWEEP_INTERVAL, CAR_CHANNEL_RETRANSMIT_INTERVAL
 from src.router import api_router
 from src.llm import offline
+from src.llm.offline.prompt_cache import get_prompt_state_cache
+from src.map.registry import get_map_registry
+from src.map.edge_weights import get_edge_weights
+from src.smart_triager.car.segments import get_segment_tables
+from src.smart_triager.car.channel import get_car_channel_manager
 from src.utils import remove_os_environ_proxies
 from src.voice_interaction.voice_interaction import VoiceInteraction
 
@@ -33,17 +42,39 @@ async def lifespan(app: FastAPI):
     # === 3. 语音交互预热 ===
     await VoiceInteraction().warmup()
 
+    # === 4. 地图热更新 ===
+    map_registry = get_map_registry()
+    map_registry.current() # 加载地图
+    get_segment_tables().prepare_snapshot(map_registry.current()) # 预先计算主节点之间的小车指令段 换地图时自动重新构建
+    # 提示词中带有地图信息 换地图后旧的前缀状态不会再被命中 直接释放
+    map_registry.add_listener(lambda snapshot: get_prompt_state_cache().clear())
+    map_watcher = asyncio.create_task(map_registry.watch(MAP_RELOAD_INTERVAL)) if MAP_RELOAD_INTERVAL > 0 else None
+    # 边的临时调整 热更新时带到新地图上 过期后自动恢复
+    edge_sweeper = asyncio.create_task(get_edge_weights().watch(EDGE_ADJUSTMENT_SWEEP_INTERVAL))
+
+    # === 5. 小车通道 ===
+    # 在线小车超时没有确认的指令批次自动重发
+    car_retransmitter = asyncio.create_task(get_car_channel_manager().watch(CAR_CHANNEL_RETRANSMIT_INTERVAL))
+
     logger.info("\n\n========== READY. ==========\n\n")
 
     yield 
 
     # Shutdown
     logger.info("Shutting down backend server...")
+    if map_watcher is not None:
+        map_watcher.cancel()
+    edge_sweeper.cancel()
+    car_retransmitter.cancel()
 
 
 # 创建 FastAPI 应用
 app = FastAPI(lifespan=lifespan)
 
+# 准入控制：限制推理接口的并发与排队长度，过载时快速返回 429
+# 放在 CORS 之前添加，使 CORS 位于外层，429 响应同样带有跨域头
+app.add_middleware(AdmissionControlMiddleware, limits=ADMISSION_LIMITS)
+
 # 配置 CORS 中间件，解决前端跨域访问问题
 # 重要：必须在 include_router 之前添加中间件
 app.add_middleware(
@@ -1,2 +1,5 @@
 from src.map.tools import *
-from src.map.typedef import *
\ No newline at end of file
+from src.map.typedef import *
+from src.map.registry import *
+from src.map.visit_order import *
+from src.map.edge_weights import *
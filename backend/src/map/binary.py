@@ -0,0 +1,334 @@
+# map/binary.py
+# 紧凑的二进制地图格式（`.map.bin`）
+#
+# 文件内容就是编译后的地图：节点坐标数组、CSR 邻接数组、字符串表（节点ID、名称、描述、边名称，去重后只存一份）
+# 以及预先计算好的最短路径表。加载时用 mmap 映射整个文件，所有数组都是文件页面上的只读视图，
+# 不需要解析 JSON 也不需要构造 pydantic 对象，多个 worker 进程加载同一个文件时共享同一份物理内存。
+#
+# 文件布局：
+#     MAGIC (8 字节) | 头部长度 (uint64 小端) | 头部 JSON | 各段数组（按 64 字节对齐）
+# 头部 JSON 记录格式版本、节点数、边数以及每一段数组的偏移、dtype 与形状。
+#
+# 用法：
+#     python -m src.map.binary assets/newest.map.json
+
+import os
+import sys
+import json
+import mmap
+import struct
+from pathlib import Path
+from functools import cached_property
+from collections.abc import Sequence
+
+import numpy as np
+
+from src import logger
+from src.map.typedef import *
+from src.map.compiled import CompiledGraph, CompiledMap, compile_map
+from src.map.tools import load_map_from_str, register_compiled_map
+
+
+MAGIC = b"UFCMAP\0\0"
+FORMAT_VERSION = 1
+
+_PREFIX = struct.Struct("<8sQ") # MAGIC + 头部长度
+_ALIGNMENT = 64
+
+
+def binary_path_for(map_path: Path) -> Path:
+    """
+    二进制地图文件的路径：`xxx.map.json` → `xxx.map.bin`
+    """
+
+    return map_path.with_suffix(".bin")
+
+
+class _StringTable:
+    """写入时使用的字符串表 相同的字符串只保存一次"""
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self._index: dict[str, int] = {}
+
+    def add(self, value: str | None) -> int:
+        """返回字符串的下标 None 为 -1"""
+
+        if value is None:
+            return -1
+        if value not in self._index:
+            self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return self._index[value]
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """(偏移数组, UTF-8 字节数组) 第 i 个字符串为 `blob[offsets[i]:offsets[i + 1]]`"""
+
+        encoded = [value.encode("utf-8") for value in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def write_binary_map(map: Map, path: Path, all_pairs: bool | None = None) -> None:
+    """
+    把地图编译后写入二进制文件
+
+    先写入临时文件再替换，正在映射旧文件的进程不受影响（仍然看到旧文件的内容）。
+
+    Args:
+        map (Map): 地图对象
+        path (Path): 输出文件路径
+        all_pairs (bool | None): 最短路径表是否以所有节点为目标 None 表示按节点数自动决定
+    """
+
+    compiled = compile_map(map, all_pairs)
+    graph = compiled.graph
+
+    strings = _StringTable()
+    node_id_strings = np.array([strings.add(node.id) for node in map.nodes], dtype=np.int32)
+    node_name_strings = np.array([strings.add(node.name) for node in map.nodes], dtype=np.int32)
+    node_description_strings = np.array([strings.add(node.description) for node in map.nodes], dtype=np.int32)
+    edge_u_strings = np.array([strings.add(edge.u_node) for edge in map.edges], dtype=np.int32)
+    edge_v_strings = np.array([strings.add(edge.v_node) for edge in map.edges], dtype=np.int32)
+    edge_name_strings = np.array([strings.add(edge.name) for edge in map.edges], dtype=np.int32)
+    string_offsets, string_blob = strings.arrays()
+
+    sections: dict[str, np.ndarray] = {
+        "xs": graph.xs,
+        "ys": graph.ys,
+        "is_main": graph.is_main.astype(np.uint8),
+        "offsets": graph.offsets,
+        "targets": graph.targets,
+        "costs": graph.costs,
+        "arc_edges": graph.arc_edges,
+        "edge_costs": graph.edge_costs,
+        "node_id_strings": node_id_strings,
+        "node_name_strings": node_name_strings,
+        "node_description_strings": node_description_strings,
+        "edge_u_strings": edge_u_strings,
+        "edge_v_strings": edge_v_strings,
+        "edge_name_strings": edge_name_strings,
+        "string_offsets": string_offsets,
+        "string_blob": string_blob,
+        "path_targets": np.array(list(compiled.target_rows), dtype=np.int32),
+        "path_distances": compiled.distances,
+        "path_next_hop": compiled.next_hop,
+    }
+
+    # 先确定头部 再计算各段的偏移（头部长度变化时重新计算）
+    header = {
+        "format_version": FORMAT_VERSION,
+        "node_count": graph.node_count,
+        "edge_count": len(map.edges),
+        "all_pairs": compiled.all_pairs,
+        "heuristic_scale": graph.heuristic_scale,
+        "sections": {},
+    }
+    header_bytes = b""
+    while True:
+        offset = _align(_PREFIX.size + len(header_bytes))
+        layout = {}
+        for name, array in sections.items():
+            layout[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+            offset = _align(offset + array.nbytes)
+        header["sections"] = layout
+        encoded = json.dumps(header).encode("utf-8")
+        if encoded == header_bytes:
+            break
+        header_bytes = encoded
+
+    temporary_path = path.with_name(path.name + ".tmp")
+    with open(temporary_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in sections.items():
+            f.write(b"\0" * (layout[name]["offset"] - f.tell()))
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(temporary_path, path)
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+class _LazyNodes(Sequence):
+    """按需构造 `Node` 的只读序列 构造过的节点会被缓存"""
+
+    def __init__(self, binary_map: "BinaryMap"):
+        self._binary_map = binary_map
+        self._cache: list[Node | None] = [None] * binary_map.node_count
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        node = self._cache[index]
+        if node is None:
+            node = self._binary_map.node(index % len(self._cache))
+            self._cache[index] = node
+        return node
+
+
+class BinaryMap:
+    """
+    内存映射的二进制地图
+
+    - `graph` / `compiled`：直接由文件中的数组构建的编译图与最短路径表
+    - `nodes`：按需构造 `Node` 的序列
+    - `map`：完整的 `Map` 对象 第一次访问时才构造（例如需要把整个地图序列化返回时）
+
+    Args:
+        path (Path): `.map.bin` 文件路径
+    Raises:
+        ValueError: 文件不是有效的二进制地图 或者格式版本不一致
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, header_length = _PREFIX.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Not a binary map file: {path}")
+            header = json.loads(bytes(self._mmap[_PREFIX.size:_PREFIX.size + header_length]))
+            if header.get("format_version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported binary map format version {header.get('format_version')}: {path}")
+
+            self._arrays: dict[str, np.ndarray] = {}
+            for name, section in header["sections"].items():
+                dtype = np.dtype(section["dtype"])
+                count = int(np.prod(section["shape"], dtype=np.int64))
+                if section["offset"] + count * dtype.itemsize > len(self._mmap):
+                    raise ValueError(f"Truncated binary map file: {path}")
+                self._arrays[name] = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=section["offset"]).reshape(section["shape"])
+
+            self.node_count: int = header["node_count"]
+            self.edge_count: int = header["edge_count"]
+
+            self._string_offsets: list[int] = self._arrays["string_offsets"].tolist()
+            self._string_blob = self._arrays["string_blob"]
+
+            # 节点ID 用于建立 ID → 下标 的索引 加载时一次性解码
+            self.node_ids: list[str] = [self.string(i) for i in self._arrays["node_id_strings"].tolist()]
+            self.nodes = _LazyNodes(self)
+
+            self.graph = CompiledGraph.from_arrays(
+                nodes = self.nodes,
+                node_ids = self.node_ids,
+                xs = self._arrays["xs"],
+                ys = self._arrays["ys"],
+                is_main = self._arrays["is_main"].view(bool),
+                offsets = self._arrays["offsets"],
+                targets = self._arrays["targets"],
+                costs = self._arrays["costs"],
+                arc_edges = self._arrays["arc_edges"],
+                edge_costs = self._arrays["edge_costs"],
+                heuristic_scale = header["heuristic_scale"],
+            )
+            self.compiled = CompiledMap(None, header["all_pairs"], graph=self.graph)
+            self.compiled.set_tables(
+                self._arrays["path_targets"].tolist(),
+                self._arrays["path_distances"],
+                self._arrays["path_next_hop"],
+            )
+        except (struct.error, KeyError, IndexError, TypeError, AttributeError, json.JSONDecodeError) as e:
+            # 头部缺少字段或者字段类型不对 都视为损坏的文件 调用方只需要处理 ValueError
+            raise ValueError(f"Corrupted binary map file {path}: {e}") from e
+
+    def string(self, index: int) -> str | None:
+        """字符串表中的第 `index` 个字符串 -1 为 None"""
+
+        if index < 0:
+            return None
+        return self._string_blob[self._string_offsets[index]:self._string_offsets[index + 1]].tobytes().decode("utf-8")
+
+    def node(self, index: int) -> Node:
+        """构造第 `index` 个节点"""
+
+        return Node.model_construct(
+            id = self.node_ids[index],
+            x = float(self.graph.xs[index]),
+            y = float(self.graph.ys[index]),
+            type = "main" if self.graph.is_main[index] else "nav",
+            name = self.string(int(self._arrays["node_name_strings"][index])),
+            description = self.string(int(self._arrays["node_description_strings"][index])),
+        )
+
+    def edge(self, index: int) -> Edge:
+        """构造第 `index` 条边（费用为编译时计算的曼哈顿距离 端点不存在时为 None）"""
+
+        cost = int(self.graph.edge_costs[index])
+        return Edge.model_construct(
+            u = self.string(int(self._arrays["edge_u_strings"][index])),
+            v = self.string(int(self._arrays["edge_v_strings"][index])),
+            cost = cost if cost >= 0 else None,
+            name = self.string(int(self._arrays["edge_name_strings"][index])),
+        )
+
+    @cached_property
+    def map(self) -> Map:
+        """
+        完整的 `Map` 对象 与加载 JSON 并 `compute_costs` 之后的地图相同
+
+        它的编译结果直接使用文件中的数组，`get_compiled_map(map)` 不会重新编译。
+        """
+
+        map = Map.model_construct(
+            nodes = list(self.nodes),
+            edges = [self.edge(i) for i in range(self.edge_count)],
+        )
+        register_compiled_map(map, self.compiled)
+        return map
+
+
+def load_binary_map(path: Path) -> BinaryMap:
+    """
+    加载二进制地图文件
+
+    Raises:
+        ValueError: 文件不是有效的二进制地图
+        OSError: 文件无法读取
+    """
+
+    return BinaryMap(path)
+
+
+def convert_map_file(map_path: Path, output_path: Path | None = None) -> Path:
+    """
+    把 `.map.json` 转换为二进制地图文件
+
+    Args:
+        map_path (Path): `.map.json` 文件路径
+        output_path (Path | None): 输出路径 默认在地图文件旁边
+    Returns:
+        Path: 输出文件路径
+    """
+
+    map = load_map_from_str(map_path.read_text(encoding="utf-8"))
+    if map is None:
+        raise ValueError(f"Invalid map file: {map_path}")
+
+    output_path = output_path or binary_path_for(map_path)
+    write_binary_map(map, output_path)
+    logger.info(f"Binary map saved to {output_path} ({output_path.stat().st_size} bytes)")
+    return output_path
+
+
+__all__ = [
+    "BinaryMap",
+    "binary_path_for",
+    "write_binary_map",
+    "load_binary_map",
+    "convert_map_file",
+]
+
+
+if __name__ == "__main__":
+    for argument in sys.argv[1:]:
+        convert_map_file(Path(argument))
@@ -0,0 +1,830 @@
+# map/compiled.py
+# 编译后的地图：整数节点下标 + CSR 邻接数组 + 预先计算好的最短路径表
+#
+# pydantic 的 Map / Node / Edge 只作为加载和序列化的格式，
+# 所有图算法都在这里编译出来的数组上运行，每个地图对象只编译一次。
+
+import heapq
+import threading
+from functools import cached_property
+from collections.abc import Sequence
+
+import numpy as np
+
+from src.config.general import COMPILED_MAP_ALL_PAIRS_MAX_NODES, SEARCH_STRATEGY_TYPES
+from src.map.typedef import *
+from src.map.spatial import SpatialIndex, main_node_kind_matches
+
+
+UNREACHABLE = np.iinfo(np.int64).max # 不可达时的距离
+NO_HOP = -1 # 没有下一跳（不可达 或者已经在终点）
+
+# 行进方向 按逆时针排列 相邻两个相差 90°（与小车指令解析中的绝对方向一致）
+HEADINGS = ["east", "north", "west", "south"]
+NO_HEADING = -1 # 还没有方向（起点）或者弧两端坐标相同
+
+
+class CompiledGraph:
+    """
+    数组形式的无向图
+
+    - 节点 ID 被映射为连续的整数下标 `index[node_id]`，`node_ids[i]` 为反向映射
+    - `xs` / `ys`：节点坐标
+    - `is_main`：是否为主节点
+    - CSR 邻接：节点 i 的邻居为 `targets[offsets[i]:offsets[i + 1]]`，对应费用在 `costs` 的相同位置，
+      对应的原始边下标在 `arc_edges` 的相同位置
+    - `edge_costs[e]`：第 e 条原始边的曼哈顿距离费用 端点不存在时为 -1
+
+    每个节点的邻居顺序与按边列表顺序依次加入 u→v、v→u 时的顺序一致。
+
+    Args:
+        map (Map): 地图对象
+    """
+
+    def __init__(self, map: Map):
+        self.nodes: Sequence[Node] = list(map.nodes)
+        self.node_ids: list[str] = [node.id for node in map.nodes]
+        self.index: dict[str, int] = {node_id: i for i, node_id in enumerate(self.node_ids)}
+
+        self.xs = np.array([node.x for node in map.nodes], dtype=np.float64)
+        self.ys = np.array([node.y for node in map.nodes], dtype=np.float64)
+        self.is_main = np.array([node.type == "main" for node in map.nodes], dtype=bool)
+
+        u = np.array([self.index.get(edge.u_node, -1) for edge in map.edges], dtype=np.int64)
+        v = np.array([self.index.get(edge.v_node, -1) for edge in map.edges], dtype=np.int64)
+        valid = (u >= 0) & (v >= 0)
+
+        self.edge_costs = np.full(len(map.edges), -1, dtype=np.int64)
+        self.edge_costs[valid] = (np.abs(self.xs[u[valid]] - self.xs[v[valid]]) + np.abs(self.ys[u[valid]] - self.ys[v[valid]])).astype(np.int64)
+        self.invalid_edge_count = int(np.count_nonzero(~valid))
+
+        # 每条边拆成 u→v、v→u 两条弧 交替排列后按起点稳定排序
+        edge_ids = np.flatnonzero(valid)
+        sources = np.stack([u[edge_ids], v[edge_ids]], axis=1).ravel()
+        arc_targets = np.stack([v[edge_ids], u[edge_ids]], axis=1).ravel()
+        arc_edges = np.repeat(edge_ids, 2)
+        order = np.argsort(sources, kind="stable")
+
+        self.offsets = np.zeros(len(self.node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(self.node_ids)), out=self.offsets[1:])
+        self.targets = arc_targets[order].astype(np.int32)
+        self.arc_edges = arc_edges[order].astype(np.int32)
+        self.costs = self.edge_costs[self.arc_edges]
+
+        # A* 启发函数的缩放系数：所有边 费用 / 端点曼哈顿距离 的最小值（不超过1）
+        # 费用是取整后的曼哈顿距离，坐标带小数时可能略小于真实距离，缩放后启发函数仍然不会高估
+        lengths = np.abs(self.xs[u[valid]] - self.xs[v[valid]]) + np.abs(self.ys[u[valid]] - self.ys[v[valid]])
+        positive = lengths > 0
+        self.heuristic_scale = float(min(1.0, np.min(self.edge_costs[valid][positive] / lengths[positive]))) if positive.any() else 0.0
+
+        self._edge_keys: set[int] | None = None
+
+    @classmethod
+    def from_arrays(
+        cls,
+        nodes: Sequence[Node],
+        node_ids: list[str],
+        xs: np.ndarray,
+        ys: np.ndarray,
+        is_main: np.ndarray,
+        offsets: np.ndarray,
+        targets: np.ndarray,
+        costs: np.ndarray,
+        arc_edges: np.ndarray,
+        edge_costs: np.ndarray,
+        heuristic_scale: float,
+    ) -> "CompiledGraph":
+        """
+        直接由已经编译好的数组构建（见 `map/binary.py`） 数组可以是内存映射的只读视图
+
+        `nodes` 只需要支持按下标访问，可以是按需构造 `Node` 的惰性序列。
+        """
+
+        graph = cls.__new__(cls)
+        graph.nodes = nodes
+        graph.node_ids = node_ids
+        graph.index = {node_id: i for i, node_id in enumerate(node_ids)}
+        graph.xs, graph.ys, graph.is_main = xs, ys, is_main
+        graph.offsets, graph.targets, graph.costs, graph.arc_edges = offsets, targets, costs, arc_edges
+        graph.edge_costs = edge_costs
+        graph.invalid_edge_count = int(np.count_nonzero(edge_costs < 0))
+        graph.heuristic_scale = heuristic_scale
+        graph._edge_keys = None
+        return graph
+
+    # 纯 Python 循环中逐个读取 numpy 标量很慢 遍历时使用列表副本（第一次搜索时生成）
+    @cached_property
+    def _offsets_list(self) -> list[int]:
+        return self.offsets.tolist()
+
+    @cached_property
+    def _targets_list(self) -> list[int]:
+        return self.targets.tolist()
+
+    @cached_property
+    def _costs_list(self) -> list[int]:
+        return self.costs.tolist()
+
+    @cached_property
+    def _xs_list(self) -> list[float]:
+        return self.xs.tolist()
+
+    @cached_property
+    def _ys_list(self) -> list[float]:
+        return self.ys.tolist()
+
+    @cached_property
+    def _arc_headings_list(self) -> list[int]:
+        """
+        每条弧的行进方向（`HEADINGS` 下标） 与指令解析一致：x 有变化时按 x 判断东西，否则按 y 判断南北（y 向下）
+        """
+
+        sources = np.repeat(np.arange(self.node_count), np.diff(self.offsets))
+        dx = self.xs[self.targets] - self.xs[sources]
+        dy = self.ys[self.targets] - self.ys[sources]
+        headings = np.select(
+            [dx > 0, dx < 0, dy > 0, dy < 0],
+            [HEADINGS.index("east"), HEADINGS.index("west"), HEADINGS.index("south"), HEADINGS.index("north")],
+            default=NO_HEADING,
+        )
+        return headings.tolist()
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    @cached_property
+    def _edge_arcs(self) -> dict[int, list[int]]:
+        """原始边下标 → 它拆出的两条弧的下标"""
+
+        edge_arcs: dict[int, list[int]] = {}
+        for arc, edge in enumerate(self.arc_edges.tolist()):
+            edge_arcs.setdefault(edge, []).append(arc)
+        return edge_arcs
+
+    def edge_cost(self, edge: int) -> float:
+        """第 `edge` 条原始边当前的费用（含临时调整） 封闭时为 inf"""
+
+        return self._costs_list[self._edge_arcs[edge][0]]
+
+    def set_edge_cost(self, edge: int, cost: float) -> None:
+        """
+        修改第 `edge` 条原始边当前的费用 只影响搜索使用的列表副本，`costs` / `edge_costs` 保持为地图上的原始费用
+
+        Args:
+            edge (int): 原始边下标
+            cost (float): 新的费用 inf 表示封闭
+        """
+
+        for arc in self._edge_arcs[edge]:
+            self._costs_list[arc] = cost
+
+    def edges_between(self, u: int, v: int) -> list[int]:
+        """u 与 v 之间的所有原始边下标"""
+
+        start, end = self._offsets_list[u], self._offsets_list[u + 1]
+        return [self.arc_edges[arc].item() for arc in range(start, end) if self._targets_list[arc] == v]
+
+    def neighbors(self, node: int) -> list[tuple[int, int]]:
+        """
+        节点的邻居及边的费用
+
+        Args:
+            node (int): 节点下标
+        Returns:
+            list[tuple[int, int]]: (邻居下标, 费用) 列表
+        """
+
+        start, end = self._offsets_list[node], self._offsets_list[node + 1]
+        return list(zip(self._targets_list[start:end], self._costs_list[start:end]))
+
+    @property
+    def edge_keys(self) -> set[int]:
+        """
+        邻接集合：有向弧 u→v 编码为 `u * node_count + v` 第一次使用时构建
+        """
+
+        if self._edge_keys is None:
+            sources = np.repeat(np.arange(self.node_count, dtype=np.int64), np.diff(self.offsets))
+            self._edge_keys = set((sources * self.node_count + self.targets).tolist())
+        return self._edge_keys
+
+    def has_edge(self, u: int, v: int) -> bool:
+        """u 与 v 之间是否有边 O(1)"""
+
+        return u * self.node_count + v in self.edge_keys
+
+    @cached_property
+    def spatial_index(self) -> SpatialIndex:
+        """所有节点坐标的空间索引 第一次使用时构建"""
+
+        return SpatialIndex(np.arange(self.node_count), self.xs, self.ys)
+
+    @cached_property
+    def _main_spatial_indexes(self) -> dict[str | None, SpatialIndex]:
+        return {}
+
+    def main_spatial_index(self, kind: str | None = None) -> SpatialIndex:
+        """
+        主节点的空间索引 每一类第一次使用时构建
+
+        Args:
+            kind (str | None): 只索引这一类主节点（见 `main_node_kind_matches`） None 表示所有主节点
+        """
+
+        index = self._main_spatial_indexes.get(kind)
+        if index is None:
+            main = np.flatnonzero(self.is_main)
+            if kind is not None:
+                main = np.array([i for i in main.tolist() if main_node_kind_matches(self.node_ids[i], kind)], dtype=np.int64)
+            index = self._main_spatial_indexes[kind] = SpatialIndex(main, self.xs, self.ys)
+        return index
+
+    def first_broken_hop(self, path: list[str]) -> int | None:
+        """
+        找到路径中第一个断开的跳
+
+        第 k 跳指 path[k] → path[k + 1]，端点不存在或者两点之间没有边都算断开；
+        只有一个节点的路径，节点不存在时返回 0；空路径返回 0。
+
+        Args:
+            path (list[str]): 节点ID列表
+        Returns:
+            int | None: 第一个断开的跳的下标 路径联通时返回 None
+        """
+
+        if not path:
+            return 0
+
+        index, edge_keys, node_count = self.index, self.edge_keys, self.node_count
+
+        previous = index.get(path[0])
+        if previous is None:
+            return 0
+
+        for hop, node_id in enumerate(path[1:]):
+            current = index.get(node_id)
+            if current is None or previous * node_count + current not in edge_keys:
+                return hop
+            previous = current
+
+        return None
+
+    def dijkstra(self, source: int, target: int | None = None) -> tuple[list[float], list[int]]:
+        """
+        从 `source` 出发的 Dijkstra
+
+        Args:
+            source (int): 起点下标
+            target (int | None): 终点下标 给出时到达终点就提前结束
+        Returns:
+            tuple[list[float], list[int]]: (距离列表, 前驱列表) 不可达距离为 inf 没有前驱为 -1
+        """
+
+        offsets, targets, costs = self._offsets_list, self._targets_list, self._costs_list
+        distances = [float("inf")] * self.node_count
+        previous = [NO_HOP] * self.node_count
+        distances[source] = 0
+
+        min_heap = [(0, source)]
+        while min_heap:
+            current_distance, current = heapq.heappop(min_heap)
+            if current == target:
+                break
+            if current_distance > distances[current]:
+                continue
+            for arc in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[arc]
+                distance = current_distance + costs[arc]
+                if distance < distances[neighbor]:
+                    distances[neighbor] = distance
+                    previous[neighbor] = current
+                    heapq.heappush(min_heap, (distance, neighbor))
+
+        return distances, previous
+
+    def astar(self, source: int, target: int) -> list[int] | None:
+        """
+        以曼哈顿距离为启发函数的 A*
+
+        边的费用就是端点之间的曼哈顿距离，所以曼哈顿距离（乘以 `heuristic_scale`）是一致的启发函数，
+        每个节点最多被展开一次，结果与 Dijkstra 一样是最短路径。
+
+        Returns:
+            list[int] | None: 节点下标列表 不可达时返回 None
+        """
+
+        offsets, targets, costs = self._offsets_list, self._targets_list, self._costs_list
+        xs, ys, scale = self._xs_list, self._ys_list, self.heuristic_scale
+        tx, ty = xs[target], ys[target]
+
+        distances = {source: 0}
+        previous = {source: NO_HOP}
+        closed = set()
+
+        open_heap = [(scale * (abs(xs[source] - tx) + abs(ys[source] - ty)), 0, source)]
+        while open_heap:
+            _, current_distance, current = heapq.heappop(open_heap)
+            if current == target:
+                path = [target]
+                while path[-1] != source:
+                    path.append(previous[path[-1]])
+                return path[::-1]
+            if current in closed:
+                continue
+            closed.add(current)
+
+            for arc in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[arc]
+                distance = current_distance + costs[arc]
+                if distance < distances.get(neighbor, float("inf")):
+                    distances[neighbor] = distance
+                    previous[neighbor] = current
+                    estimate = distance + scale * (abs(xs[neighbor] - tx) + abs(ys[neighbor] - ty))
+                    heapq.heappush(open_heap, (estimate, distance, neighbor))
+
+        return None
+
+    def bidirectional_dijkstra(self, source: int, target: int) -> list[int] | None:
+        """
+        双向 Dijkstra：同时从起点和终点向中间搜索
+
+        每次展开两侧中堆顶较小的一侧，当两侧堆顶之和不小于当前找到的最优路径长度时停止。
+
+        Returns:
+            list[int] | None: 节点下标列表 不可达时返回 None
+        """
+
+        if source == target:
+            return [source]
+
+        offsets, targets, costs = self._offsets_list, self._targets_list, self._costs_list
+
+        inf = float("inf")
+        distances = ([inf] * self.node_count, [inf] * self.node_count)
+        previous = ([NO_HOP] * self.node_count, [NO_HOP] * self.node_count)
+        distances[0][source] = distances[1][target] = 0
+        heaps = ([(0, source)], [(0, target)])
+
+        best = float("inf")
+        meeting = NO_HOP
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            current_distance, current = heapq.heappop(heaps[side])
+            this_distances, other_distances = distances[side], distances[1 - side]
+            if current_distance > this_distances[current]:
+                continue
+
+            for arc in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[arc]
+                distance = current_distance + costs[arc]
+                if distance < this_distances[neighbor]:
+                    this_distances[neighbor] = distance
+                    previous[side][neighbor] = current
+                    heapq.heappush(heaps[side], (distance, neighbor))
+                    if distance + other_distances[neighbor] < best:
+                        best = distance + other_distances[neighbor]
+                        meeting = neighbor
+
+        if meeting == NO_HOP:
+            return None
+
+        forward = [meeting]
+        while forward[-1] != source:
+            forward.append(previous[0][forward[-1]])
+        backward = [meeting]
+        while backward[-1] != target:
+            backward.append(previous[1][backward[-1]])
+
+        return forward[::-1] + backward[1:]
+
+    def turn_aware_path(
+        self,
+        source: int,
+        target: int,
+        turn_cost: float,
+        uturn_cost: float,
+        initial_heading: int = NO_HEADING,
+    ) -> tuple[list[int], int] | None:
+        """
+        考虑转向代价的最短路径：在（节点, 行进方向）的状态图上做 Dijkstra
+
+        沿一条弧前进的代价为它的费用，加上从当前方向转到弧的方向的代价：
+        同向为 0，转 90° 为 `turn_cost`，掉头为 `uturn_cost`；还没有方向时（起点且不知道车头朝向）不计转向代价。
+        两端坐标相同的弧不改变方向。到达终点时朝向任意。
+
+        Args:
+            source (int): 起点下标
+            target (int): 终点下标
+            turn_cost (float): 90° 转向的代价（折算为等效的直行距离）
+            uturn_cost (float): 掉头的代价
+            initial_heading (int): 起点处的车头朝向（`HEADINGS` 下标） 未知时为 `NO_HEADING`
+        Returns:
+            tuple[list[int], int] | None: (节点下标列表, 到达终点时的朝向) 不可达时返回 None
+        """
+
+        if source == target:
+            return [source], initial_heading
+
+        offsets, targets, costs = self._offsets_list, self._targets_list, self._costs_list
+        headings = self._arc_headings_list
+        turn_costs = (0, turn_cost, uturn_cost, turn_cost) # 按逆时针相差的 90° 数
+
+        start = (source, initial_heading)
+        distances = {start: 0}
+        previous: dict[tuple[int, int], tuple[int, int]] = {}
+
+        heap = [(0, source, initial_heading)]
+        while heap:
+            current_distance, node, heading = heapq.heappop(heap)
+            if node == target:
+                path = [node]
+                state = (node, heading)
+                while state != start:
+                    state = previous[state]
+                    path.append(state[0])
+                return path[::-1], heading
+            if current_distance > distances[(node, heading)]:
+                continue
+
+            for arc in range(offsets[node], offsets[node + 1]):
+                arc_heading = headings[arc]
+                if arc_heading == NO_HEADING:
+                    next_heading, turn = heading, 0
+                else:
+                    next_heading = arc_heading
+                    turn = 0 if heading == NO_HEADING else turn_costs[(arc_heading - heading) % 4]
+                distance = current_distance + costs[arc] + turn
+                state = (targets[arc], next_heading)
+                if distance < distances.get(state, float("inf")):
+                    distances[state] = distance
+                    previous[state] = (node, heading)
+                    heapq.heappush(heap, (distance, targets[arc], next_heading))
+
+        return None
+
+    def shortest_path(self, source: int, target: int, strategy: SEARCH_STRATEGY_TYPES = "dijkstra") -> list[int] | None:
+        """
+        按指定算法查询最短路径
+
+        Args:
+            source (int): 起点下标
+            target (int): 终点下标
+            strategy: dijkstra / astar / bidirectional
+        Returns:
+            list[int] | None: 节点下标列表 不可达时返回 None
+        """
+
+        if strategy == "astar":
+            return self.astar(source, target)
+        if strategy == "bidirectional":
+            return self.bidirectional_dijkstra(source, target)
+        if strategy == "dijkstra":
+            _, previous = self.dijkstra(source, target)
+            return self.path_to(previous, source, target)
+        if strategy == "hierarchy":
+            # 图本身没有预处理结果 由 `search_path` 在有收缩层次时直接使用它
+            return self.astar(source, target)
+        raise ValueError(f"Unknown search strategy: {strategy}")
+
+    def path_to(self, previous: list[int], source: int, target: int) -> list[int] | None:
+        """
+        根据前驱列表还原从 `source` 到 `target` 的路径
+
+        Returns:
+            list[int] | None: 节点下标列表 不可达时返回 None
+        """
+
+        if target != source and previous[target] == NO_HOP:
+            return None
+
+        path = [target]
+        while path[-1] != source:
+            path.append(previous[path[-1]])
+        return path[::-1]
+
+
+class CompiledMap:
+    """
+    编译后的地图
+
+    在 `CompiledGraph` 之上预先计算最短路径表：
+    - `distances[row, v]`：节点 v 到第 row 个「目标节点」的最短距离
+    - `next_hop[row, v]`：从节点 v 出发去第 row 个目标节点时 下一步应该走到的节点下标
+
+    地图是无向图，以目标为根的最短路径树中每个节点的父节点，正好就是它朝目标走的下一跳，
+    所以每个目标只需要跑一次 Dijkstra。
+    节点数不超过 `COMPILED_MAP_ALL_PAIRS_MAX_NODES` 时所有节点都是目标（全源最短路），
+    否则只以主节点为目标（路线中的 LocationLink 都在主节点之间）。
+
+    最短路径表在第一次查询时才计算，只需要图结构的调用（例如 `compute_costs`）不会为它付出代价。
+
+    Args:
+        map (Map | None): 地图对象
+        all_pairs (bool | None): 是否以所有节点为目标 None 表示按节点数自动决定
+        graph (CompiledGraph | None): 已经编译好的图 给出时不再从 `map` 编译
+    """
+
+    def __init__(self, map: Map | None, all_pairs: bool | None = None, graph: CompiledGraph | None = None):
+        self.graph = graph if graph is not None else CompiledGraph(map)
+
+        if all_pairs is None:
+            all_pairs = self.graph.node_count <= COMPILED_MAP_ALL_PAIRS_MAX_NODES
+        self.all_pairs = all_pairs
+
+        # 收缩层次预处理结果（见 `map/hierarchy.py`） 由加载地图的一方挂上
+        self.hierarchy = None
+
+        # 费用被临时调整过的原始边（见 `map/edge_weights.py`） 非空时收缩层次的预处理结果不再适用
+        self.adjusted_edges: set[int] = set()
+
+        # 最短路径表 (目标 → 行号, 距离, 下一跳) 作为一个整体替换：边的费用变化时在副本上修复后整体换上去（写时复制），
+        # 正在读旧表的线程（路线展开、调度等）不会读到修改了一半的行
+        self._tables: tuple[dict[int, int], np.ndarray, np.ndarray] | None = None
+        self._update_lock = threading.Lock()
+
+    # 与图结构相关的属性直接转发
+    @property
+    def nodes(self) -> Sequence[Node]:
+        return self.graph.nodes
+
+    @property
+    def node_ids(self) -> list[str]:
+        return self.graph.node_ids
+
+    @property
+    def index(self) -> dict[str, int]:
+        return self.graph.index
+
+    def _build_tables(self) -> None:
+        """以每个目标为根跑一次 Dijkstra 填充距离与下一跳"""
+
+        if self.all_pairs:
+            targets = range(self.graph.node_count)
+        else:
+            targets = np.flatnonzero(self.graph.is_main).tolist()
+
+        target_rows = {target: row for row, target in enumerate(targets)}
+        distances = np.full((len(target_rows), self.graph.node_count), UNREACHABLE, dtype=np.int64)
+        next_hop = np.full((len(target_rows), self.graph.node_count), NO_HOP, dtype=np.int32)
+
+        for target, row in target_rows.items():
+            row_distances, previous = self.graph.dijkstra(target)
+            reachable = [i for i, d in enumerate(row_distances) if d != float("inf")]
+            distances[row, reachable] = [row_distances[i] for i in reachable]
+            next_hop[row] = previous # 从 v 朝 target 走 下一步是 v 在以 target 为根的树中的父节点
+
+        self._tables = (target_rows, distances, next_hop)
+
+    def set_tables(self, targets: list[int], distances: np.ndarray, next_hop: np.ndarray) -> None:
+        """
+        使用预先计算好的最短路径表（例如从二进制地图文件中读出） 不再运行 Dijkstra
+
+        Args:
+            targets (list[int]): 每一行对应的目标节点下标
+            distances (np.ndarray): 距离表 形状为 (len(targets), node_count)
+            next_hop (np.ndarray): 下一跳表 形状与 `distances` 相同
+        """
+
+        self._tables = ({target: row for row, target in enumerate(targets)}, distances, next_hop)
+
+    @property
+    def tables(self) -> tuple[dict[int, int], np.ndarray, np.ndarray]:
+        """
+        (目标 → 行号, 距离, 下一跳) 同时需要距离与下一跳时取一次这个元组 保证两者属于同一版本
+        """
+
+        if self._tables is None:
+            self._build_tables()
+        return self._tables
+
+    @property
+    def target_rows(self) -> dict[int, int]:
+        return self.tables[0]
+
+    @property
+    def distances(self) -> np.ndarray:
+        return self.tables[1]
+
+    @property
+    def next_hop(self) -> np.ndarray:
+        return self.tables[2]
+
+    def update_edge_cost(self, edge: int, cost: float) -> int:
+        """
+        修改一条边的费用 并增量更新最短路径表
+
+        - 费用变大（拥堵、封闭）：只有最短路径树中经过这条边的行受影响，
+          在这些行中找出经过它的子树，只对子树中的节点重新计算（子树以外的最短路径不经过这条边，距离不变）
+        - 费用变小（恢复）：只有端点因此变近的行受影响，从端点开始向外传播变短的距离
+
+        最短路径表还没有构建时只修改费用，之后构建时自然会使用新的费用。
+        受影响的行在副本上修复，全部修复完后整张表一次性替换（写时复制），读者拿到的总是完整的某一版本。
+
+        Args:
+            edge (int): 原始边下标
+            cost (float): 新的费用 inf 表示封闭
+        Returns:
+            int: 重新计算的最短路径表行数
+        """
+
+        with self._update_lock:
+            old_cost = self.graph.edge_cost(edge)
+            self.graph.set_edge_cost(edge, cost)
+            if cost == self.graph.edge_costs[edge]:
+                self.adjusted_edges.discard(edge)
+            else:
+                self.adjusted_edges.add(edge)
+            if self._tables is None or cost == old_cost:
+                return 0
+
+            target_rows, distances, next_hop = self._tables
+            arc = self.graph._edge_arcs[edge][0]
+            v = self.graph._targets_list[arc]
+            u = int(np.searchsorted(self.graph.offsets, arc, side="right")) - 1
+
+            # 受影响的行在副本上修复 原表（可能是只读的内存映射）不修改
+            repaired: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+            def row_copy(row: int) -> tuple[np.ndarray, np.ndarray]:
+                if row not in repaired:
+                    repaired[row] = (distances[row].copy(), next_hop[row].copy())
+                return repaired[row]
+
+            if cost > old_cost:
+                for a, b in ((u, v), (v, u)):
+                    rows = set(np.flatnonzero(next_hop[:, a] == b).tolist()) - repaired.keys()
+                    rows.update(row for row, (_, hops) in repaired.items() if hops[a] == b)
+                    for row in sorted(rows):
+                        self._repair_subtree(row, a, *row_copy(row))
+            else:
+                for a, b in ((u, v), (v, u)):
+                    reachable = distances[:, b] != UNREACHABLE
+                    rows = set(np.flatnonzero(reachable & (distances[:, b] + np.where(reachable, cost, 0) < distances[:, a])).tolist()) - repaired.keys()
+                    rows.update(
+                        row for row, (row_distances, _) in repaired.items()
+                        if row_distances[b] != UNREACHABLE and row_distances[b] + cost < row_distances[a]
+                    )
+                    for row in sorted(rows):
+                        self._propagate_decrease(a, b, cost, *row_copy(row))
+
+            if repaired:
+                distances, next_hop = distances.copy(), next_hop.copy()
+                for row, (row_distances, row_hops) in repaired.items():
+                    distances[row], next_hop[row] = row_distances, row_hops
+                self._tables = (target_rows, distances, next_hop)
+
+            return len(repaired)
+
+    def _repair_subtree(self, row: int, a: int, distances: np.ndarray, next_hop: np.ndarray) -> None:
+        """
+        第 `row` 行中 a 朝目标走的第一条边变长了：重新计算以 a 为根的子树（路径经过 a 的节点）
+        """
+
+        node_count = self.graph.node_count
+
+        # 倍增：flag[v] 表示 v 沿下一跳向上若干步内会经过 a
+        ancestors = np.where(next_hop >= 0, next_hop, np.arange(node_count)).astype(np.int64)
+        flag = np.zeros(node_count, dtype=bool)
+        flag[a] = True
+        while True:
+            flag |= flag[ancestors]
+            jumped = ancestors[ancestors]
+            if np.array_equal(jumped, ancestors):
+                break
+            ancestors = jumped
+        subtree = np.flatnonzero(flag).tolist()
+        in_subtree = set(subtree)
+
+        offsets, targets, costs = self.graph._offsets_list, self.graph._targets_list, self.graph._costs_list
+        inf = float("inf")
+        best = {v: inf for v in subtree}
+        hop = {v: NO_HOP for v in subtree}
+
+        # 子树中的每个节点先尝试直接走到子树外的邻居
+        heap = []
+        for v in subtree:
+            for arc in range(offsets[v], offsets[v + 1]):
+                w = targets[arc]
+                if w in in_subtree or distances[w] == UNREACHABLE:
+                    continue
+                distance = int(distances[w]) + costs[arc]
+                if distance < best[v]:
+                    best[v], hop[v] = distance, w
+            if best[v] != inf:
+                heap.append((best[v], v))
+        heapq.heapify(heap)
+
+        # 再只在子树内做 Dijkstra
+        while heap:
+            distance, v = heapq.heappop(heap)
+            if distance > best[v]:
+                continue
+            for arc in range(offsets[v], offsets[v + 1]):
+                w = targets[arc]
+                if w not in in_subtree:
+                    continue
+                candidate = distance + costs[arc]
+                if candidate < best[w]:
+                    best[w], hop[w] = candidate, v
+                    heapq.heappush(heap, (candidate, w))
+
+        distances[subtree] = [UNREACHABLE if best[v] == inf else int(best[v]) for v in subtree]
+        next_hop[subtree] = [hop[v] for v in subtree]
+
+    def _propagate_decrease(self, a: int, b: int, cost: float, distances: np.ndarray, next_hop: np.ndarray) -> None:
+        """
+        边 a-b 变短后 a 经过 b 朝目标走更近：从 a 开始向外传播变短的距离
+        """
+
+        offsets, targets, costs = self.graph._offsets_list, self.graph._targets_list, self.graph._costs_list
+
+        improved = {a: int(distances[b]) + cost}
+        next_hop[a] = b
+        heap = [(improved[a], a)]
+        while heap:
+            distance, v = heapq.heappop(heap)
+            if distance > improved[v]:
+                continue
+            for arc in range(offsets[v], offsets[v + 1]):
+                w = targets[arc]
+                candidate = distance + costs[arc]
+                if candidate < improved.get(w, distances[w]):
+                    improved[w] = candidate
+                    next_hop[w] = v
+                    heapq.heappush(heap, (candidate, w))
+
+        nodes = list(improved)
+        distances[nodes] = [int(improved[v]) for v in nodes]
+
+    def has_target(self, node_id: str) -> bool:
+        """`node_id` 是否在最短路径表中（可以作为查询的终点）"""
+
+        return node_id in self.index and self.index[node_id] in self.target_rows
+
+    def distance(self, start_node_id: str, end_node_id: str) -> int | None:
+        """
+        查询两点之间的最短距离
+
+        Returns:
+            int | None: 最短距离 不可达时返回 None
+        Raises:
+            KeyError: 节点不存在 或者终点不在最短路径表中
+        """
+
+        target_rows, distances, _ = self.tables
+        value = distances[target_rows[self.index[end_node_id]], self.index[start_node_id]]
+        return None if value == UNREACHABLE else int(value)
+
+    def path(self, start_node_id: str, end_node_id: str) -> list[str] | None:
+        """
+        查询两点之间的最短路径 复杂度与路径长度成正比 最多走节点数那么多步
+
+        Returns:
+            list[str] | None: 最短路径上的节点ID列表 不可达（或者下一跳表损坏）时返回 None
+        Raises:
+            KeyError: 节点不存在 或者终点不在最短路径表中
+        """
+
+        target_rows, _, next_hop = self.tables
+        target = self.index[end_node_id]
+        row = next_hop[target_rows[target]]
+        current = self.index[start_node_id]
+
+        # 最短路径最多经过所有节点一次 超过时说明下一跳表中有环（不应当出现） 按不可达处理
+        path = [start_node_id]
+        for _ in range(self.graph.node_count):
+            if current == target:
+                return path
+            current = int(row[current])
+            if current == NO_HOP:
+                return None
+            path.append(self.node_ids[current])
+        return path if current == target else None
+
+
+def compile_map(map: Map, all_pairs: bool | None = None) -> CompiledMap:
+    """
+    编译地图
+
+    Args:
+        map (Map): 地图对象
+        all_pairs (bool | None): 是否计算所有节点之间的最短路径 None 表示按节点数自动决定
+    Returns:
+        CompiledMap: 编译后的地图
+    """
+
+    return CompiledMap(map, all_pairs)
+
+
+__all__ = [
+    "HEADINGS",
+    "NO_HEADING",
+    "CompiledGraph",
+    "CompiledMap",
+    "compile_map",
+]
@@ -0,0 +1,232 @@
+# map/edge_weights.py
+# 边的临时调整：清洁时封闭走廊、高峰时给拥堵的走廊加权
+#
+# 调整按端点ID保存，带有效期；生效时直接修改当前快照编译图中的费用，并增量更新最短路径表（见
+# `CompiledMap.update_edge_cost`），不重新构建整张表。地图热更新时，新快照在替换上去之前会先应用所有仍然有效的调整；
+# 修改调整时持有地图注册表的重新加载锁，保证不会有调整夹在这一步与替换之间而丢失。
+# 调整发生变化时通知监听者（例如让经过这些边的小车指令缓存失效）：
+# 费用变大只影响经过这些边的路线；费用变小（解除封闭、降低加权）时任何路线都可能因此变短。
+
+import time
+import asyncio
+import threading
+from typing import Callable
+
+from src import logger, metrics
+from src.config.general import EDGE_ADJUSTMENT_DEFAULT_TTL
+from src.map.typedef import *
+from src.map.registry import MapSnapshot, get_map_registry
+
+
+EdgeKey = tuple[str, str]
+
+
+def edge_key(u: str, v: str) -> EdgeKey:
+    """无向边的键 与端点顺序无关"""
+
+    return (u, v) if u <= v else (v, u)
+
+
+class EdgeWeights:
+    """
+    边的临时调整
+    """
+
+    def __init__(self):
+        self._adjustments: dict[EdgeKey, EdgeAdjustment] = {}
+        self._lock = threading.Lock()
+        self._listeners: list[Callable[[set[EdgeKey], bool], None]] = []
+
+    def add_listener(self, callback: Callable[[set[EdgeKey], bool], None]) -> None:
+        """
+        注册调整变化后的回调 参数为 (发生变化的边, 是否有边的费用变小)
+        """
+
+        self._listeners.append(callback)
+
+    def _notify(self, keys: set[EdgeKey], relaxed: bool) -> None:
+        for callback in self._listeners:
+            try:
+                callback(keys, relaxed)
+            except Exception as e:
+                logger.error(f"Edge weight listener failed: {e}")
+
+    def _apply(self, snapshot: MapSnapshot, keys: set[EdgeKey]) -> int:
+        """
+        把 `keys` 这些边当前的调整（没有调整时恢复原费用）应用到快照上
+
+        Returns:
+            int: 重新计算的最短路径表行数
+        """
+
+        compiled = snapshot.compiled
+        graph = compiled.graph
+        rows = 0
+
+        for key in keys:
+            u, v = graph.index.get(key[0]), graph.index.get(key[1])
+            if u is None or v is None:
+                continue
+            adjustment = self._adjustments.get(key)
+            for edge in graph.edges_between(u, v):
+                if adjustment is None:
+                    cost = int(graph.edge_costs[edge])
+                elif adjustment.closed:
+                    cost = float("inf")
+                else:
+                    cost = int(graph.edge_costs[edge]) + adjustment.penalty
+                rows += compiled.update_edge_cost(edge, cost)
+
+        return rows
+
+    def adjust(
+        self,
+        u: str,
+        v: str,
+        penalty: int = 0,
+        closed: bool = False,
+        ttl_seconds: float | None = EDGE_ADJUSTMENT_DEFAULT_TTL
+    ) -> EdgeAdjustment:
+        """
+        设置一条边的临时调整 覆盖之前的调整
+
+        Args:
+            u (str): 边的一个端点ID
+            v (str): 边的另一个端点ID
+            penalty (int): 在原费用上增加的费用
+            closed (bool): 是否封闭
+            ttl_seconds (float | None): 有效时长（秒） None 表示一直有效直到被清除
+        Returns:
+            EdgeAdjustment: 生效的调整
+        Raises:
+            KeyError: 地图中没有这条边
+        """
+
+        key = edge_key(u, v)
+        adjustment = EdgeAdjustment(
+            u = key[0],
+            v = key[1],
+            penalty = penalty,
+            closed = closed,
+            expires_at = time.time() + ttl_seconds if ttl_seconds is not None else None,
+        )
+
+        # 持有重新加载锁 避免调整落在正在被替换掉的旧快照上而没有带到新快照
+        with get_map_registry().hold() as snapshot, self._lock:
+            graph = snapshot.compiled.graph
+            if u not in graph.index or v not in graph.index or not graph.edges_between(graph.index[u], graph.index[v]):
+                raise KeyError(f"Edge not found: {u} - {v}")
+            previous = self._adjustments.get(key)
+            self._adjustments[key] = adjustment
+            rows = self._apply(snapshot, {key})
+        relaxed = previous is not None and (previous.closed and not closed or not closed and penalty < previous.penalty)
+
+        metrics.inc("edge_adjustments_total", closed=closed)
+        metrics.set_gauge("edge_adjustments_active", len(self._adjustments))
+        logger.info(f"Edge {u} - {v} adjusted (penalty {penalty}, closed {closed}), {rows} shortest-path rows updated")
+        self._notify({key}, relaxed)
+        return adjustment
+
+    def clear(self, u: str, v: str) -> bool:
+        """
+        清除一条边的调整 恢复原费用
+
+        Returns:
+            bool: 这条边之前是否有调整
+        """
+
+        key = edge_key(u, v)
+        with get_map_registry().hold() as snapshot, self._lock:
+            if self._adjustments.pop(key, None) is None:
+                return False
+            self._apply(snapshot, {key})
+
+        metrics.set_gauge("edge_adjustments_active", len(self._adjustments))
+        self._notify({key}, True)
+        return True
+
+    def purge_expired(self) -> int:
+        """
+        清除所有过期的调整
+
+        Returns:
+            int: 清除的数量
+        """
+
+        now = time.time()
+        with get_map_registry().hold() as snapshot, self._lock:
+            expired = {
+                key for key, adjustment in self._adjustments.items()
+                if adjustment.expires_at is not None and adjustment.expires_at <= now
+            }
+            if not expired:
+                return 0
+            for key in expired:
+                del self._adjustments[key]
+            self._apply(snapshot, expired)
+
+        metrics.set_gauge("edge_adjustments_active", len(self._adjustments))
+        logger.info(f"{len(expired)} edge adjustments expired")
+        self._notify(expired, True)
+        return len(expired)
+
+    def active(self) -> list[EdgeAdjustment]:
+        """当前有效的所有调整"""
+
+        self.purge_expired()
+        with self._lock:
+            return list(self._adjustments.values())
+
+    def prepare_snapshot(self, snapshot: MapSnapshot) -> None:
+        """
+        地图热更新时 在新快照替换上去之前应用所有有效的调整（新地图中已经不存在的边被忽略）
+        """
+
+        with self._lock:
+            rows = self._apply(snapshot, set(self._adjustments))
+        if rows:
+            logger.info(f"Edge adjustments re-applied to map version {snapshot.version}, {rows} shortest-path rows updated")
+
+    async def watch(self, interval: float) -> None:
+        """
+        定期清除过期的调整
+
+        Args:
+            interval (float): 检查间隔（秒）
+        """
+
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.purge_expired)
+
+
+edge_weights: EdgeWeights | None = None
+
+
+def _build_edge_weights():
+    """
+    初始化边的临时调整 并挂到地图注册表上
+    """
+
+    global edge_weights
+
+    edge_weights = EdgeWeights()
+    get_map_registry().add_preparer(edge_weights.prepare_snapshot)
+
+
+def get_edge_weights() -> EdgeWeights:
+    """获取边的临时调整实例"""
+
+    global edge_weights
+
+    if edge_weights is None:
+        _build_edge_weights()
+
+    return edge_weights
+
+
+__all__ = [
+    "EdgeWeights",
+    "edge_key",
+    "get_edge_weights",
+]
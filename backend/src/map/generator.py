@@ -0,0 +1,210 @@
+# map/generator.py
+# 合成医院地图生成器
+#
+# 生成与真实医院布局相近的地图，用于在远大于 15 个节点的规模上测试路由相关代码：
+# - 每层楼是一张曼哈顿网格走廊，路口为导航节点，部分走廊被墙隔断（保证整层仍然联通）
+# - 房间（主节点）开在走廊中段：走廊上加一个门口导航节点，房间在门口旁边一格
+# - 一层有入口、出口、挂号处、缴费处、药房；各层分布不同科室的诊室与卫生间
+# - 楼层在 y 方向上依次排开，电梯 / 楼梯作为跨层的连接走廊，长度即跨层的代价
+#
+# 标准流程用到的地点（entrance / registration_center / payment_center / pharmacy / quit）与每种诊室的第一间
+# 使用与真实地图相同的 ID，生成的地图可以直接用于 `generate_route`。
+#
+# 用法：
+#     python -m src.map.generator --nodes 1000 --seed 0 -o assets/synthetic.map.json
+
+import sys
+import math
+import random
+import argparse
+from pathlib import Path
+
+from src.map.typedef import *
+
+
+# 一层必须有的地点
+_GROUND_FLOOR_ROOMS = [
+    ("entrance", "入口", "医院主入口。"),
+    ("quit", "出口", "离开医院的出口。"),
+    ("registration_center", "挂号处", "负责登记个人信息、安排就诊科室与医生。"),
+    ("payment_center", "缴费处", "处理各项医疗费用的收款、结算业务。"),
+    ("pharmacy", "药房", "依据医生处方为患者调配、发放药品。"),
+]
+
+# 各层随机分布的房间
+_CLINIC_KINDS = [
+    ("internal", "内科"),
+    ("surgery", "外科"),
+    ("pediatric", "儿科"),
+    ("emergency", "急诊"),
+    ("dermatology", "皮肤科"),
+    ("ophthalmology", "眼科"),
+    ("dental", "口腔科"),
+    ("gynecology", "妇科"),
+]
+_TOILET_RATIO = 0.15 # 房间中卫生间所占的比例
+
+
+def _corridor_edges(rows: int, cols: int, drop_rate: float, rng: random.Random) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+    """
+    一层走廊网格中保留的走廊段：先随机生成一棵生成树保证联通，其余走廊段以 1 - drop_rate 的概率保留
+    """
+
+    segments = []
+    for r in range(rows):
+        for c in range(cols):
+            if c + 1 < cols:
+                segments.append(((r, c), (r, c + 1)))
+            if r + 1 < rows:
+                segments.append(((r, c), (r + 1, c)))
+    rng.shuffle(segments)
+
+    parent = {(r, c): (r, c) for r in range(rows) for c in range(cols)}
+
+    def find(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    kept = []
+    for a, b in segments:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_a] = root_b
+            kept.append((a, b))
+        elif rng.random() >= drop_rate:
+            kept.append((a, b))
+    return kept
+
+
+def generate_hospital_map(
+    floors: int = 1,
+    rows: int = 4,
+    cols: int = 4,
+    spacing: int = 4,
+    room_ratio: float = 0.5,
+    drop_rate: float = 0.2,
+    floor_gap: int = 10,
+    seed: int = 0,
+) -> Map:
+    """
+    生成合成的医院地图
+
+    Args:
+        floors (int): 楼层数
+        rows (int): 每层走廊网格的行数（路口数）
+        cols (int): 每层走廊网格的列数
+        spacing (int): 相邻路口之间的距离 至少为 2（门口在走廊中段）
+        room_ratio (float): 开有房间的走廊段比例
+        drop_rate (float): 生成树之外的走廊段被墙隔断的概率
+        floor_gap (int): 跨层连接走廊的长度（跨层的代价）
+        seed (int): 随机种子
+    Returns:
+        Map: 生成的地图
+    """
+
+    if spacing < 2 or rows < 2 or cols < 2:
+        raise ValueError("rows / cols must be at least 2 and spacing at least 2.")
+
+    rng = random.Random(seed)
+    nodes: list[Node] = []
+    edges: list[Edge] = []
+    floor_height = (rows - 1) * spacing + floor_gap
+    clinic_counts: dict[str, int] = {}
+    toilet_count = 0
+
+    def crossing_id(floor: int, r: int, c: int) -> str:
+        return f"f{floor}_r{r}_c{c}"
+
+    for floor in range(floors):
+        y0 = floor * floor_height
+
+        for r in range(rows):
+            for c in range(cols):
+                nodes.append(Node(id=crossing_id(floor, r, c), x=c * spacing, y=y0 + r * spacing, type="nav"))
+
+        segments = _corridor_edges(rows, cols, drop_rate, rng)
+        room_segments = set(rng.sample(range(len(segments)), max(1, round(len(segments) * room_ratio))))
+
+        # 一层的固定地点优先分配到前几个开有房间的走廊段
+        ground_rooms = list(_GROUND_FLOOR_ROOMS) if floor == 0 else []
+        room_segments |= set(range(len(ground_rooms)))
+
+        for i, ((r1, c1), (r2, c2)) in enumerate(segments):
+            a, b = crossing_id(floor, r1, c1), crossing_id(floor, r2, c2)
+            if i not in room_segments:
+                edges.append(Edge(u=a, v=b))
+                continue
+
+            # 走廊中段的门口 房间开在走廊的一侧
+            door_id = f"f{floor}_door{i}"
+            door_x = (c1 + c2) * spacing // 2
+            door_y = y0 + (r1 + r2) * spacing // 2
+            nodes.append(Node(id=door_id, x=door_x, y=door_y, type="nav"))
+            edges.append(Edge(u=a, v=door_id))
+            edges.append(Edge(u=door_id, v=b))
+
+            if ground_rooms:
+                room_id, name, description = ground_rooms.pop(0)
+            elif rng.random() < _TOILET_RATIO:
+                toilet_count += 1
+                room_id = "toilet" if toilet_count == 1 else f"toilet_{toilet_count}"
+                name, description = "卫生间", "为患者、家属及医护人员提供必要的卫生设施。"
+            else:
+                kind, kind_name = rng.choice(_CLINIC_KINDS)
+                clinic_counts[kind] = clinic_counts.get(kind, 0) + 1
+                count = clinic_counts[kind]
+                room_id = f"{kind}_clinic" if count == 1 else f"{kind}_clinic_{count}"
+                name, description = f"{kind_name}诊室", f"{floor + 1}楼{kind_name}诊室。"
+
+            # 横向走廊的房间开在上下两侧 纵向走廊的房间开在左右两侧
+            side = rng.choice((-1, 1))
+            room_x, room_y = (door_x, door_y + side) if r1 == r2 else (door_x + side, door_y)
+            nodes.append(Node(id=room_id, x=room_x, y=room_y, type="main", name=name, description=description))
+            edges.append(Edge(u=door_id, v=room_id))
+
+        # 电梯 / 楼梯：下一层同一列的路口之间 沿 y 方向连接
+        if floor + 1 < floors:
+            connector_columns = {0, cols - 1} if cols > 2 else {0}
+            connector_columns.add(cols // 2)
+            for c in sorted(connector_columns):
+                edges.append(Edge(u=crossing_id(floor, rows - 1, c), v=crossing_id(floor + 1, 0, c), name="elevator"))
+
+    return Map(nodes=nodes, edges=edges)
+
+
+def generate_hospital_map_of_size(node_count: int, floors: int | None = None, seed: int = 0, **kwargs) -> Map:
+    """
+    生成节点数大约为 `node_count` 的医院地图
+
+    按每个路口平均带来 1 + 2 × room_ratio 个节点估算每层的网格大小；楼层数默认随规模增长。
+    """
+
+    room_ratio = kwargs.get("room_ratio", 0.5)
+    if floors is None:
+        floors = max(1, min(10, round(math.log10(max(node_count, 10))) - 1))
+
+    # 每个路口约有两条走廊段 每条开有房间的走廊段增加门口与房间两个节点
+    per_crossing = 1 + 2 * 2 * room_ratio
+    side = max(2, round(math.sqrt(node_count / floors / per_crossing)))
+    return generate_hospital_map(floors=floors, rows=side, cols=side, seed=seed, **kwargs)
+
+
+__all__ = [
+    "generate_hospital_map",
+    "generate_hospital_map_of_size",
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成合成的医院地图")
+    parser.add_argument("--nodes", type=int, default=1000, help="大约的节点数")
+    parser.add_argument("--floors", type=int, default=None, help="楼层数 默认随规模增长")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("-o", "--output", type=Path, required=True, help="输出的 .map.json 文件路径")
+    args = parser.parse_args()
+
+    generated = generate_hospital_map_of_size(args.nodes, args.floors, args.seed)
+    args.output.write_text(generated.model_dump_json(by_alias=True, indent=4), encoding="utf-8")
+    print(f"{len(generated.nodes)} nodes, {len(generated.edges)} edges -> {args.output}", file=sys.stderr)
@@ -0,0 +1,361 @@
+# map/hierarchy.py
+# 收缩层次（Contraction Hierarchies）路由
+#
+# 离线预处理：按重要性从低到高依次「收缩」节点，收缩某个节点时如果它的两个邻居之间
+# 只有经过它的路径最短，就在这两个邻居之间加一条捷径（shortcut）。
+# 查询：从起点和终点分别只沿「通向更高层节点」的边做 Dijkstra，两侧搜索空间都很小，
+# 相遇点给出最短距离，再把捷径递归展开成原始路径。
+#
+# 预处理结果以 `.ch.npz` 文件保存在 `.map.json` 旁边，加载时通过指纹校验是否与地图一致。
+#
+# 用法：
+#     python -m src.map.hierarchy assets/newest.map.json
+
+import sys
+import heapq
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+from src import logger
+from src.map.compiled import CompiledGraph, NO_HOP
+from src.map.typedef import *
+
+
+_WITNESS_SETTLE_LIMIT = 64 # 见证搜索最多展开的节点数 超过后保守地认为没有见证路径（多加一条捷径不影响正确性）
+
+
+def graph_fingerprint(graph: CompiledGraph) -> str:
+    """
+    图结构的指纹 节点、坐标与边任何一项变化都会改变指纹
+    """
+
+    digest = hashlib.sha256()
+    digest.update("\0".join(graph.node_ids).encode("utf-8"))
+    for array in (graph.xs, graph.ys, graph.offsets, graph.targets, graph.costs):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def hierarchy_path_for(map_path: Path) -> Path:
+    """
+    预处理文件的路径：`xxx.map.json` → `xxx.map.ch.npz`
+    """
+
+    return map_path.with_suffix(".ch.npz")
+
+
+class ContractionHierarchy:
+    """
+    收缩层次
+
+    - `rank[v]`：节点 v 被收缩的次序 越大越「重要」
+    - 向上图（CSR）：节点 v 的 `up_targets[up_offsets[v]:up_offsets[v + 1]]` 都是比 v 层次更高的邻居，
+      `up_costs` 为费用，`up_middles` 为捷径经过的中间节点（原始边为 -1）
+
+    地图是无向图，同一份向上图同时用于正向和反向搜索。
+    """
+
+    def __init__(
+        self,
+        fingerprint: str,
+        rank: np.ndarray,
+        up_offsets: np.ndarray,
+        up_targets: np.ndarray,
+        up_costs: np.ndarray,
+        up_middles: np.ndarray,
+    ):
+        self.fingerprint = fingerprint
+        self.rank = rank
+        self.up_offsets = up_offsets
+        self.up_targets = up_targets
+        self.up_costs = up_costs
+        self.up_middles = up_middles
+
+        self._offsets_list: list[int] = up_offsets.tolist()
+        self._targets_list: list[int] = up_targets.tolist()
+        self._costs_list: list[int] = up_costs.tolist()
+
+        # 展开捷径时按 (低层节点, 高层节点) 查找中间节点
+        self._middles: dict[tuple[int, int], int] = {}
+        middles = up_middles.tolist()
+        for node in range(len(self._offsets_list) - 1):
+            for arc in range(self._offsets_list[node], self._offsets_list[node + 1]):
+                self._middles[(node, self._targets_list[arc])] = middles[arc]
+
+    @property
+    def shortcut_count(self) -> int:
+        return int(np.count_nonzero(self.up_middles != NO_HOP))
+
+    @classmethod
+    def build(cls, graph: CompiledGraph) -> "ContractionHierarchy":
+        """
+        预处理：按「边差」（新增捷径数 - 删除的边数 + 已收缩的邻居数）从小到大收缩节点
+
+        优先级使用懒更新：弹出堆顶时重新计算，如果变大了并且不再是最小的就放回去。
+
+        Args:
+            graph (CompiledGraph): 编译后的图
+        Returns:
+            ContractionHierarchy: 收缩层次
+        """
+
+        node_count = graph.node_count
+
+        # 当前（尚未收缩部分）的图 adjacency[v][w] = (费用, 中间节点)
+        adjacency: list[dict[int, tuple[int, int]]] = [{} for _ in range(node_count)]
+        for v in range(node_count):
+            for w, cost in graph.neighbors(v):
+                if w != v and (w not in adjacency[v] or cost < adjacency[v][w][0]):
+                    adjacency[v][w] = (cost, NO_HOP)
+
+        contracted = [False] * node_count
+        contracted_neighbors = [0] * node_count
+        rank = np.zeros(node_count, dtype=np.int32)
+        upward: list[dict[int, tuple[int, int]]] = [{} for _ in range(node_count)]
+
+        def witness_distances(source: int, excluded: int, limit: float) -> dict[int, float]:
+            """不经过 `excluded` 的有界 Dijkstra"""
+
+            distances = {source: 0}
+            min_heap = [(0, source)]
+            settled = 0
+            while min_heap and settled < _WITNESS_SETTLE_LIMIT:
+                distance, current = heapq.heappop(min_heap)
+                if distance > distances[current]:
+                    continue
+                if distance > limit:
+                    break
+                settled += 1
+                for neighbor, (cost, _) in adjacency[current].items():
+                    if neighbor == excluded:
+                        continue
+                    candidate = distance + cost
+                    if candidate < distances.get(neighbor, float("inf")):
+                        distances[neighbor] = candidate
+                        heapq.heappush(min_heap, (candidate, neighbor))
+            return distances
+
+        def shortcuts_for(v: int) -> list[tuple[int, int, int]]:
+            """收缩 v 需要新增的捷径 (u, w, 费用)"""
+
+            neighbors = list(adjacency[v].items())
+            shortcuts = []
+            for i, (u, (cost_uv, _)) in enumerate(neighbors):
+                others = neighbors[i + 1:]
+                if not others:
+                    continue
+                limit = cost_uv + max(cost_vw for _, (cost_vw, _) in others)
+                distances = witness_distances(u, v, limit)
+                for w, (cost_vw, _) in others:
+                    via = cost_uv + cost_vw
+                    if distances.get(w, float("inf")) > via:
+                        shortcuts.append((u, w, via))
+            return shortcuts
+
+        def priority(v: int) -> int:
+            return len(shortcuts_for(v)) - len(adjacency[v]) + contracted_neighbors[v]
+
+        queue = [(priority(v), v) for v in range(node_count)]
+        heapq.heapify(queue)
+
+        order = 0
+        while queue:
+            _, v = heapq.heappop(queue)
+            if contracted[v]:
+                continue
+
+            # 懒更新
+            current = priority(v)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, v))
+                continue
+
+            for u, w, cost in shortcuts_for(v):
+                if w not in adjacency[u] or cost < adjacency[u][w][0]:
+                    adjacency[u][w] = (cost, v)
+                    adjacency[w][u] = (cost, v)
+
+            # v 此时剩下的邻居都会在它之后收缩 这些边就是 v 的向上边
+            upward[v] = dict(adjacency[v])
+            for neighbor in adjacency[v]:
+                del adjacency[neighbor][v]
+                contracted_neighbors[neighbor] += 1
+            adjacency[v] = {}
+
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+        up_offsets = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum([len(edges) for edges in upward], out=up_offsets[1:])
+        up_targets = np.array([w for edges in upward for w in edges], dtype=np.int32)
+        up_costs = np.array([cost for edges in upward for cost, _ in edges.values()], dtype=np.int64)
+        up_middles = np.array([middle for edges in upward for _, middle in edges.values()], dtype=np.int32)
+
+        return cls(graph_fingerprint(graph), rank, up_offsets, up_targets, up_costs, up_middles)
+
+    def _unpack(self, a: int, b: int, out: list[int]) -> None:
+        """把 a→b（相邻两层节点之间的边）展开成原始路径 追加除 a 以外的节点到 out"""
+
+        stack = [(a, b)]
+        while stack:
+            x, y = stack.pop()
+            key = (x, y) if (x, y) in self._middles else (y, x)
+            middle = self._middles[key]
+            if middle == NO_HOP:
+                out.append(y)
+            else:
+                # 先展开 x→middle 再展开 middle→y
+                stack.append((middle, y))
+                stack.append((x, middle))
+
+    def query(self, source: int, target: int) -> tuple[int, list[int]] | None:
+        """
+        查询最短路径
+
+        Args:
+            source (int): 起点下标
+            target (int): 终点下标
+        Returns:
+            tuple[int, list[int]] | None: (最短距离, 节点下标列表) 不可达时返回 None
+        """
+
+        if source == target:
+            return 0, [source]
+
+        offsets, targets, costs = self._offsets_list, self._targets_list, self._costs_list
+
+        distances = ({source: 0}, {target: 0})
+        previous = ({source: NO_HOP}, {target: NO_HOP})
+        heaps = ([(0, source)], [(0, target)])
+        best = float("inf")
+        meeting = NO_HOP
+
+        while heaps[0] or heaps[1]:
+            # 两侧各自的堆顶都不小于当前最优值时 这一侧就不用再搜索了
+            for side in (0, 1):
+                if heaps[side] and heaps[side][0][0] >= best:
+                    heaps[side].clear()
+
+            if not heaps[0] and not heaps[1]:
+                break
+
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            distance, current = heapq.heappop(heaps[side])
+            this_distances, other_distances = distances[side], distances[1 - side]
+            if distance > this_distances[current]:
+                continue
+
+            if current in other_distances and distance + other_distances[current] < best:
+                best = distance + other_distances[current]
+                meeting = current
+
+            for arc in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[arc]
+                candidate = distance + costs[arc]
+                if candidate < this_distances.get(neighbor, float("inf")):
+                    this_distances[neighbor] = candidate
+                    previous[side][neighbor] = current
+                    heapq.heappush(heaps[side], (candidate, neighbor))
+
+        if meeting == NO_HOP:
+            return None
+
+        # 两侧在向上图中的路径：source ↗ meeting ↖ target
+        up_from_source = [meeting]
+        while up_from_source[-1] != source:
+            up_from_source.append(previous[0][up_from_source[-1]])
+        up_from_source.reverse()
+
+        up_from_target = [meeting]
+        while up_from_target[-1] != target:
+            up_from_target.append(previous[1][up_from_target[-1]])
+
+        path = [source]
+        for a, b in zip(up_from_source, up_from_source[1:]):
+            self._unpack(a, b, path)
+        for a, b in zip(up_from_target, up_from_target[1:]):
+            self._unpack(a, b, path)
+
+        return int(best), path
+
+    def save(self, path: Path) -> None:
+        """保存到 `.ch.npz` 文件"""
+
+        np.savez_compressed(
+            path,
+            fingerprint = np.array(self.fingerprint),
+            rank = self.rank,
+            up_offsets = self.up_offsets,
+            up_targets = self.up_targets,
+            up_costs = self.up_costs,
+            up_middles = self.up_middles,
+        )
+
+    @classmethod
+    def load(cls, path: Path, graph: CompiledGraph) -> "ContractionHierarchy | None":
+        """
+        从 `.ch.npz` 文件加载
+
+        Returns:
+            ContractionHierarchy | None: 文件不存在、损坏或者与当前地图不一致时返回 None
+        """
+
+        if not path.exists():
+            return None
+
+        try:
+            with np.load(path) as data:
+                fingerprint = str(data["fingerprint"])
+                if fingerprint != graph_fingerprint(graph):
+                    logger.warning(f"Contraction hierarchy {path} is stale, ignored.")
+                    return None
+                return cls(
+                    fingerprint,
+                    data["rank"],
+                    data["up_offsets"],
+                    data["up_targets"],
+                    data["up_costs"],
+                    data["up_middles"],
+                )
+        except (OSError, KeyError, ValueError) as e:
+            logger.error(f"Failed to load contraction hierarchy {path}: {e}")
+            return None
+
+
+def preprocess_map_file(map_path: Path) -> Path:
+    """
+    对地图文件做收缩层次预处理 结果保存在地图文件旁边
+
+    Args:
+        map_path (Path): `.map.json` 文件路径
+    Returns:
+        Path: 预处理文件路径
+    """
+
+    from src.map.tools import load_map_from_str
+
+    map = load_map_from_str(map_path.read_text(encoding="utf-8"))
+    if map is None:
+        raise ValueError(f"Invalid map file: {map_path}")
+
+    hierarchy = ContractionHierarchy.build(CompiledGraph(map))
+    output_path = hierarchy_path_for(map_path)
+    hierarchy.save(output_path)
+    logger.info(f"Contraction hierarchy saved to {output_path} ({hierarchy.shortcut_count} shortcuts)")
+    return output_path
+
+
+__all__ = [
+    "ContractionHierarchy",
+    "graph_fingerprint",
+    "hierarchy_path_for",
+    "preprocess_map_file",
+]
+
+
+if __name__ == "__main__":
+    for argument in sys.argv[1:]:
+        preprocess_map_file(Path(argument))
@@ -0,0 +1,316 @@
+# map/registry.py
+# 可热更新的地图注册表
+#
+# 地图文件变化后在后台线程中重新读取、校验、构建所有派生索引（编译图、最短路径表、收缩层次、
+# 主节点与诊室列表），全部就绪后一次性替换当前快照，正在处理的请求继续使用它拿到的旧快照。
+# 依赖地图的缓存（提示词、KV 前缀、路线指令等）按版本号失效。
+
+import os
+import asyncio
+import threading
+import functools
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, TypeVar
+
+import numpy as np
+
+from src import logger, metrics
+from src.config.general import MAP_PATH
+from src.map.typedef import *
+from src.map.compiled import CompiledMap, compile_map
+from src.map.binary import BinaryMap, load_binary_map
+from src.map.hierarchy import ContractionHierarchy, hierarchy_path_for
+from src.map.tools import (
+    load_map_from_str,
+    compute_costs,
+    check_map_validity,
+    register_compiled_map,
+)
+
+
+T = TypeVar("T")
+
+
+class MapSnapshot:
+    """
+    某一版本的地图及其所有派生索引 构建完成后不再修改
+    （边的临时调整会改变编译图中的费用，最短路径表以写时复制的方式整体替换，见 `CompiledMap.update_edge_cost`）
+
+    主节点与诊室列表直接由编译图得到，二进制地图只会构造用到的那几个 `Node`；
+    完整的 `Map` 对象（`map`）对二进制地图是第一次访问时才构造的。
+
+    Args:
+        version (int): 版本号
+        path (Path): 地图文件路径
+        mtime (float): 地图文件修改时间
+        compiled (CompiledMap): 编译后的地图
+        map (Map | None): 地图对象 二进制地图为 None
+        binary (BinaryMap | None): 内存映射的二进制地图
+    """
+
+    def __init__(
+        self,
+        version: int,
+        path: Path,
+        mtime: float,
+        compiled: CompiledMap,
+        map: Map | None = None,
+        binary: BinaryMap | None = None,
+    ):
+        self.version = version
+        self.path = path
+        self.mtime = mtime
+        self._map = map
+        self.binary = binary
+        if map is not None:
+            # 旧代码按地图对象查找编译结果时得到的就是这个快照的（带有边的临时调整与收缩层次）
+            register_compiled_map(map, compiled)
+
+        self.compiled = compiled
+        self.compiled.next_hop # 构建最短路径表（二进制地图已经带有）
+        # 地图文件旁边有收缩层次预处理结果时一并加载
+        self.compiled.hierarchy = ContractionHierarchy.load(hierarchy_path_for(path), self.compiled.graph)
+
+        graph = self.compiled.graph
+        main_nodes = np.flatnonzero(graph.is_main).tolist()
+        self.main_node_ids = [graph.node_ids[i] for i in main_nodes]
+        self.main_node_id_to_name_and_description = {
+            graph.node_ids[i]: {"name": graph.nodes[i].name or "", "description": graph.nodes[i].description or ""}
+            for i in main_nodes
+        }
+        self.clinic_id_to_name_and_description = {
+            node_id: {"name": graph.nodes[i].name or "", "description": graph.nodes[i].description or ""}
+            for i, node_id in enumerate(graph.node_ids) if node_id.find("clinic") != -1
+        }
+
+    @property
+    def map(self) -> Map:
+        if self._map is None:
+            self._map = self.binary.map
+        return self._map
+
+
+class MapRegistry:
+    """
+    地图注册表
+
+    Args:
+        path (Path): 地图文件路径
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._snapshot: MapSnapshot | None = None
+        self._reload_lock = threading.Lock()
+        self._listeners: list[Callable[[MapSnapshot], None]] = []
+        self._preparers: list[Callable[[MapSnapshot], None]] = []
+        self._failed_mtime: float | None = None # 上一次加载失败的文件的修改时间 文件没有再变化时不重试
+
+    def _read(self, version: int, mtime: float) -> MapSnapshot:
+        """
+        读取并校验地图文件 构建新快照
+
+        `.bin` 结尾的文件按二进制地图格式（见 `map/binary.py`）内存映射加载，否则按 JSON 加载。
+
+        Args:
+            version (int): 新快照的版本号
+            mtime (float): 读取之前地图文件的修改时间
+        Raises:
+            ValueError: 地图文件无效
+        """
+
+        if self.path.suffix == ".bin":
+            binary = load_binary_map(self.path)
+            graph = binary.graph
+            if graph.invalid_edge_count > 0 or np.any(graph.edge_costs <= 0):
+                raise ValueError(f"Map validation failed: {self.path}")
+            if not graph.is_main.any():
+                raise ValueError(f"Map has no main node: {self.path}")
+            return MapSnapshot(version, self.path, mtime, binary.compiled, binary=binary)
+
+        map = load_map_from_str(self.path.read_text(encoding="utf-8"))
+        if map is None:
+            raise ValueError(f"Invalid map file: {self.path}")
+
+        # 候选地图单独编译 不经过 `get_compiled_map` 的共享缓存（无效的候选会把当前快照的编译结果挤出去）
+        compiled = compile_map(map)
+        compute_costs(map, compiled)
+        if not check_map_validity(map, compiled):
+            raise ValueError(f"Map validation failed: {self.path}")
+        if not any(node.type == "main" for node in map.nodes):
+            raise ValueError(f"Map has no main node: {self.path}")
+
+        return MapSnapshot(version, self.path, mtime, compiled, map=map)
+
+    def current(self) -> MapSnapshot:
+        """
+        当前快照 第一次调用时加载地图
+
+        同一个请求内应当只取一次快照并一直使用它，避免处理过程中地图被替换导致前后不一致。
+        """
+
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.reload(force=True)
+            snapshot = self._snapshot
+        return snapshot
+
+    @contextmanager
+    def hold(self) -> Iterator[MapSnapshot]:
+        """
+        持有重新加载锁 期间当前快照不会被替换
+
+        用于修改当前快照的运行时状态（例如边的临时调整）：
+        这样修改要么发生在新快照的 preparer 执行之前（随后被带到新快照上），要么发生在替换之后。
+
+        Yields:
+            MapSnapshot: 当前快照
+        """
+
+        self.current() # 第一次使用时先加载 reload 本身也要获取这把锁
+        with self._reload_lock:
+            yield self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self.current().version
+
+    def add_listener(self, callback: Callable[[MapSnapshot], None]) -> None:
+        """
+        注册地图替换后的回调 用于清理依赖地图的缓存
+        """
+
+        self._listeners.append(callback)
+
+    def add_preparer(self, callback: Callable[[MapSnapshot], None]) -> None:
+        """
+        注册在新快照替换上去之前对它执行的回调 用于把运行时状态（例如临时封闭的边）带到新地图上
+        """
+
+        self._preparers.append(callback)
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        重新加载地图文件
+
+        文件没有变化时（按修改时间判断）直接返回；新地图无效时保留当前快照，并且在文件再次变化之前不再重试。
+
+        Args:
+            force (bool): 即使文件没有变化也重新加载
+        Returns:
+            bool: 是否替换了新的快照
+        Raises:
+            ValueError: 首次加载时地图无效（此时没有可以保留的旧快照）
+        """
+
+        with self._reload_lock:
+            old = self._snapshot
+            mtime = None
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if not force and old is not None and mtime in (old.mtime, self._failed_mtime):
+                    return False
+                snapshot = self._read(old.version + 1 if old is not None else 1, mtime)
+            except Exception as e:
+                # 任何原因读不出新地图都保留旧快照 不能让后台的 watch 任务因此退出
+                metrics.inc("map_reload_failures_total")
+                self._failed_mtime = mtime
+                if old is None:
+                    raise
+                logger.error(f"Map reload failed, keep version {old.version}: {e}")
+                return False
+
+            for callback in self._preparers:
+                try:
+                    callback(snapshot)
+                except Exception as e:
+                    logger.error(f"Map snapshot preparer failed: {e}")
+
+            # 引用赋值是原子的 读者要么拿到旧快照 要么拿到完整构建好的新快照
+            self._snapshot = snapshot
+            self._failed_mtime = None
+            metrics.set_gauge("map_version", snapshot.version)
+            logger.info(f"Map version {snapshot.version} loaded from {self.path}")
+
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Map reload listener failed: {e}")
+
+        return True
+
+    async def watch(self, interval: float) -> None:
+        """
+        定期检查地图文件 变化后在线程中重新加载 不阻塞事件循环
+
+        Args:
+            interval (float): 检查间隔（秒）
+        """
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception as e:
+                logger.error(f"Map watcher failed: {e}")
+
+
+map_registry: MapRegistry | None = None
+
+
+def _build_map_registry():
+    """
+    初始化地图注册表
+    """
+
+    global map_registry
+
+    map_registry = MapRegistry(MAP_PATH)
+
+
+def get_map_registry() -> MapRegistry:
+    """获取地图注册表实例"""
+
+    global map_registry
+
+    if map_registry is None:
+        _build_map_registry()
+
+    return map_registry
+
+
+def current_map() -> MapSnapshot:
+    """当前地图快照"""
+
+    return get_map_registry().current()
+
+
+def cached_per_map_version(func: Callable[[], T]) -> Callable[[], T]:
+    """
+    装饰器：无参函数的结果按地图版本缓存 地图替换后下一次调用重新计算
+
+    用于由地图派生出的提示词、logit bias 等。
+    """
+
+    cache: dict[str, object] = {}
+
+    @functools.wraps(func)
+    def wrapper() -> T:
+        version = current_map().version
+        if cache.get("version") != version:
+            cache["value"] = func()
+            cache["version"] = version
+        return cache["value"]
+
+    return wrapper
+
+
+__all__ = [
+    "MapSnapshot",
+    "MapRegistry",
+    "get_map_registry",
+    "current_map",
+    "cached_per_map_version",
+]
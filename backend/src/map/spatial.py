@@ -0,0 +1,159 @@
+# map/spatial.py
+# 节点坐标的空间索引
+#
+# 小车和自助机上报的位置是坐标，需要先吸附到地图上的节点才能规划路线。
+# 这里按固定大小的网格把节点分桶：查询时从所在的格子开始一圈一圈向外找，
+# 找到的最近距离不超过下一圈的最小可能距离时就可以停止，不再扫描所有节点。
+#
+# 距离为欧氏距离（位置吸附看的是实际离得多近，与走廊上的曼哈顿费用无关）。
+
+import math
+
+import numpy as np
+
+
+_POINTS_PER_CELL = 2 # 平均每个格子大约放多少个节点
+
+
+def main_node_kind_matches(node_id: str, kind: str) -> bool:
+    """
+    主节点是否属于某一类
+
+    主节点的类别写在 ID 里：`toilet`、`toilet_2`、`internal_clinic`、`internal_clinic_3`……
+    去掉末尾的序号后与 `kind` 相同、或者以 `_kind` 结尾即属于这一类（例如 `clinic` 匹配所有诊室）。
+    """
+
+    base, _, suffix = node_id.rpartition("_")
+    if not base or not suffix.isdigit():
+        base = node_id
+    return base == kind or base.endswith("_" + kind)
+
+
+class SpatialIndex:
+    """
+    网格分桶的空间索引
+
+    Args:
+        indices (np.ndarray): 参与索引的节点下标
+        xs (np.ndarray): 所有节点的 X 坐标（按节点下标）
+        ys (np.ndarray): 所有节点的 Y 坐标
+    """
+
+    def __init__(self, indices: np.ndarray, xs: np.ndarray, ys: np.ndarray):
+        indices = np.asarray(indices, dtype=np.int64)
+        self.size = len(indices)
+        self._buckets: dict[tuple[int, int], list[tuple[float, float, int]]] = {}
+
+        if self.size == 0:
+            self.cell_size = 1.0
+            self._bounds = (0, 0, -1, -1)
+            return
+
+        px, py = xs[indices], ys[indices]
+        min_x, min_y = float(px.min()), float(py.min())
+        area = max(float(px.max()) - min_x, 1.0) * max(float(py.max()) - min_y, 1.0)
+        self.cell_size = max(math.sqrt(area / self.size * _POINTS_PER_CELL), 1e-9)
+
+        cx = np.floor(px / self.cell_size).astype(np.int64)
+        cy = np.floor(py / self.cell_size).astype(np.int64)
+        for x, y, i, bx, by in zip(px.tolist(), py.tolist(), indices.tolist(), cx.tolist(), cy.tolist()):
+            self._buckets.setdefault((bx, by), []).append((x, y, i))
+
+        self._bounds = (int(cx.min()), int(cy.min()), int(cx.max()), int(cy.max()))
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        cx, cy = x / self.cell_size, y / self.cell_size
+        if not (math.isfinite(cx) and math.isfinite(cy)):
+            # nan / inf 无法落到任何格子上（`math.floor` 会直接抛出 OverflowError / ValueError）
+            raise ValueError(f"Coordinate out of range: ({x}, {y})")
+        return math.floor(cx), math.floor(cy)
+
+    def _ring(self, cx: int, cy: int, r: int):
+        """与 (cx, cy) 切比雪夫距离为 r 的格子中 落在索引范围内的那些"""
+
+        min_x, min_y, max_x, max_y = self._bounds
+        if r == 0:
+            cells = [(cx, cy)]
+        else:
+            # 只枚举与索引范围相交的部分（查询点离得很远时 r 可能非常大）
+            xs = range(max(cx - r, min_x), min(cx + r, max_x) + 1)
+            ys = range(max(cy - r + 1, min_y), min(cy + r - 1, max_y) + 1)
+            cells = [(x, y) for y in (cy - r, cy + r) if min_y <= y <= max_y for x in xs]
+            cells += [(x, y) for x in (cx - r, cx + r) if min_x <= x <= max_x for y in ys]
+        for cell in cells:
+            if min_x <= cell[0] <= max_x and min_y <= cell[1] <= max_y:
+                bucket = self._buckets.get(cell)
+                if bucket:
+                    yield bucket
+
+    def nearest(self, x: float, y: float) -> tuple[int, float] | None:
+        """
+        离 (x, y) 最近的节点
+
+        Returns:
+            tuple[int, float] | None: (节点下标, 距离) 距离相同时取下标最小的 索引为空时返回None
+        Raises:
+            ValueError: 坐标不是有限数 或者离索引范围太远（距离超出浮点数范围）
+        """
+
+        if not (math.isfinite(x) and math.isfinite(y)):
+            raise ValueError(f"Coordinate must be finite: ({x}, {y})")
+        if self.size == 0:
+            return None
+
+        cx, cy = self._cell(x, y)
+        min_x, min_y, max_x, max_y = self._bounds
+        # 查询点在索引范围外时 从第一圈碰到范围的格子开始
+        first = max(min_x - cx, cx - max_x, min_y - cy, cy - max_y, 0)
+        last = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+
+        best: tuple[float, int] | None = None
+        for r in range(first, last + 1):
+            # 第 r 圈之外的格子离查询点至少 r × cell_size
+            if best is not None and best[0] <= r * self.cell_size - self.cell_size:
+                break
+            for bucket in self._ring(cx, cy, r):
+                for px, py, i in bucket:
+                    candidate = (math.hypot(px - x, py - y), i)
+                    if best is None or candidate < best:
+                        best = candidate
+
+        if best is not None and not math.isfinite(best[0]):
+            raise ValueError(f"Coordinate out of range: ({x}, {y})")
+        return (best[1], best[0]) if best is not None else None
+
+    def within(self, x: float, y: float, radius: float) -> list[tuple[int, float]]:
+        """
+        离 (x, y) 不超过 `radius` 的所有节点
+
+        Returns:
+            list[tuple[int, float]]: (节点下标, 距离) 按距离从近到远排列
+        Raises:
+            ValueError: 坐标或半径不是有限数
+        """
+
+        if not (math.isfinite(x) and math.isfinite(y) and math.isfinite(radius)):
+            raise ValueError(f"Coordinate and radius must be finite: ({x}, {y}), {radius}")
+        if self.size == 0 or radius < 0:
+            return []
+
+        min_x, min_y, max_x, max_y = self._bounds
+        low_x, low_y = self._cell(x - radius, y - radius)
+        high_x, high_y = self._cell(x + radius, y + radius)
+
+        found = []
+        for bx in range(max(low_x, min_x), min(high_x, max_x) + 1):
+            for by in range(max(low_y, min_y), min(high_y, max_y) + 1):
+                for px, py, i in self._buckets.get((bx, by), ()):
+                    distance = math.hypot(px - x, py - y)
+                    if distance <= radius:
+                        found.append((distance, i))
+
+        found.sort()
+        return [(i, distance) for distance, i in found]
+
+
+__all__ = [
+    "SpatialIndex",
+    "main_node_kind_matches",
+]
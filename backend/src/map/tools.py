@@ -3,11 +3,97 @@
 #
 
 import json
-import heapq
+import weakref
+import threading
 from pydantic import ValidationError
 
-from src.config.general import MAP_PATH
+from src.config.general import MAP_SEARCH_STRATEGY, SEARCH_STRATEGY_TYPES, CAR_TURN_COST, CAR_UTURN_COST
 from src.map.typedef import *
+from src.map.compiled import CompiledMap, compile_map, HEADINGS, NO_HEADING
+
+
+# 编译结果缓存 键为地图对象的 id（同时保存地图对象本身 防止 id 被复用）
+# 以及编译时节点 / 边列表的指纹（列表被替换或者增删了元素时重新编译）
+_compiled_maps: dict[int, tuple[Map, tuple[int, int, int, int], CompiledMap]] = {}
+_COMPILED_MAPS_MAX_ENTRIES = 4
+
+# 登记过的编译结果（地图快照的 带有边的临时调整与收缩层次） 不参与上面的淘汰 地图对象被回收时移除
+_registered_maps: dict[int, tuple[weakref.ref, CompiledMap]] = {}
+_compiled_maps_lock = threading.RLock() # 可重入：弱引用的回调可能在持有锁时由垃圾回收触发
+
+
+def _fingerprint(map: Map) -> tuple[int, int, int, int]:
+    return (id(map.nodes), len(map.nodes), id(map.edges), len(map.edges))
+
+
+def get_compiled_map(map: Map) -> CompiledMap:
+    """
+    获取地图的编译结果 同一个地图对象只编译一次
+
+    节点或边的列表被替换、增删元素后会重新编译；直接修改已有节点 / 边的属性不会被发现，需要构造新的地图对象。
+    登记过的地图（`register_compiled_map`）总是返回登记的编译结果。
+
+    Args:
+        map (Map): 地图对象
+    Returns:
+        CompiledMap: 编译后的地图
+    """
+
+    registered = _registered_maps.get(id(map))
+    if registered is not None and registered[0]() is map:
+        return registered[1]
+
+    fingerprint = _fingerprint(map)
+    cached = _compiled_maps.get(id(map))
+    if cached is not None and cached[0] is map and cached[1] == fingerprint:
+        return cached[2]
+
+    compiled = compile_map(map)
+    with _compiled_maps_lock:
+        _compiled_maps.pop(id(map), None)
+        if len(_compiled_maps) >= _COMPILED_MAPS_MAX_ENTRIES:
+            _compiled_maps.pop(next(iter(_compiled_maps)))
+        _compiled_maps[id(map)] = (map, fingerprint, compiled)
+    return compiled
+
+
+def as_compiled_map(map: Map | CompiledMap) -> CompiledMap:
+    """
+    地图对象或者编译结果 → 编译结果
+
+    请求路径上应当直接传入快照的编译结果（`snapshot.compiled`）：它带有边的临时调整与收缩层次，
+    也不需要按 `id(map)` 在缓存中查找（二进制地图也不用为此构造完整的 `Map`）。
+
+    Args:
+        map (Map | CompiledMap): 地图对象或者编译结果
+    Returns:
+        CompiledMap: 编译后的地图
+    """
+
+    return map if isinstance(map, CompiledMap) else get_compiled_map(map)
+
+
+def register_compiled_map(map: Map, compiled: CompiledMap) -> None:
+    """
+    登记地图对象对应的编译结果（地图快照、从二进制地图文件直接读出的）
+    之后 `get_compiled_map` 总是返回它：不会被其它地图的编译结果挤出缓存，也不会重新编译；
+    地图对象被回收时自动移除。
+
+    Args:
+        map (Map): 地图对象
+        compiled (CompiledMap): 编译后的地图
+    """
+
+    key = id(map)
+
+    def _forget(ref: weakref.ref) -> None:
+        with _compiled_maps_lock:
+            if key in _registered_maps and _registered_maps[key][0] is ref:
+                del _registered_maps[key]
+
+    with _compiled_maps_lock:
+        _compiled_maps.pop(key, None)
+        _registered_maps[key] = (weakref.ref(map, _forget), compiled)
 
 
 def load_map_from_str(json_str: str) -> Map | None:
@@ -36,7 +122,7 @@ def load_map_from_str(json_str: str) -> Map | None:
         return None
 
 
-def compute_costs(map: Map) -> None:
+def compute_costs(map: Map, compiled: CompiledMap | None = None) -> None:
     """
     计算地图中每条边的费用（cost）
     TIPS:
@@ -44,44 +130,35 @@ def compute_costs(map: Map) -> None:
 
     Args:
         map (Map): 地图对象
+        compiled (CompiledMap | None): 这个地图对象的编译结果 为空时通过 `get_compiled_map` 获取
     """
 
-    for edge in map.edges:
-        u_node = next((node for node in map.nodes if node.id == edge.u_node), None)
-        v_node = next((node for node in map.nodes if node.id == edge.v_node), None)
-
-        if u_node and v_node:
-            dx = u_node.x - v_node.x
-            dy = u_node.y - v_node.y
+    edge_costs = (compiled or get_compiled_map(map)).graph.edge_costs.tolist()
 
-            # Manhattan Distance
-            edge.cost = int(abs(dx) + abs(dy))
+    for edge, cost in zip(map.edges, edge_costs):
+        if cost >= 0:
+            # Manhattan Distance（端点不存在的边保持不变）
+            edge.cost = cost
 
 
-def check_map_validity(map: Map) -> bool:
+def check_map_validity(map: Map, compiled: CompiledMap | None = None) -> bool:
     """
     检查地图数据的有效性
 
     Args:
         map (Map): 地图对象
+        compiled (CompiledMap | None): 这个地图对象的编译结果 为空时通过 `get_compiled_map` 获取
 
     Returns:
         bool: 如果地图数据有效则返回True，否则返回False
     """
 
-    node_ids = {node.id for node in map.nodes}
-
-    for edge in map.edges:
-
-        # 1. 边的节点必须存在于节点列表中
-        if edge.u_node not in node_ids or edge.v_node not in node_ids:
-            return False
-        
-        # 2. 边的费用必须为正整数 (假设费用已经计算过) 不能有 None Cost
-        if edge.cost is None or edge.cost <= 0:
-            return False
+    # 1. 边的节点必须存在于节点列表中
+    if (compiled or get_compiled_map(map)).graph.invalid_edge_count > 0:
+        return False
 
-    return True
+    # 2. 边的费用必须为正整数 (假设费用已经计算过) 不能有 None Cost
+    return all(edge.cost is not None and edge.cost > 0 for edge in map.edges)
 
 
 def get_all_main_node_ids(map: Map) -> list[str] | None:
@@ -119,7 +196,7 @@ def get_all_main_node_id_to_name_and_description(map: Map) -> dict[str, dict[str
 def dijkstra_search(
     start_node_id: str,
     end_node_id: str,
-    map: Map
+    map: Map | CompiledMap
 ) -> list[str] | None:
     """
     使用Dijkstra算法在地图中查找从起始节点到结束节点的最短路径
@@ -127,93 +204,274 @@ def dijkstra_search(
     Args:
         start_node_id (str): 起始节点ID
         end_node_id (str): 结束节点ID
-        map (Map): 地图对象
+        map (Map | CompiledMap): 地图对象或者编译结果
+
+    Returns:
+        list[str] | None: 最短路径上的节点ID列表，如果没有路径则返回None
+    """
+
+    graph = as_compiled_map(map).graph
+
+    if start_node_id not in graph.index or end_node_id not in graph.index:
+        return None
+
+    start, end = graph.index[start_node_id], graph.index[end_node_id]
+    _, previous = graph.dijkstra(start, end)
+    path = graph.path_to(previous, start, end)
+
+    return [graph.node_ids[i] for i in path] if path is not None else None
+
+
+def search_path(
+    start_node_id: str,
+    end_node_id: str,
+    map: Map | CompiledMap,
+    strategy: SEARCH_STRATEGY_TYPES | None = None
+) -> list[str] | None:
+    """
+    按指定的搜索算法在地图中查找从起始节点到结束节点的最短路径
+
+    大地图上 A* 和双向搜索展开的节点远少于普通 Dijkstra，结果同样是最短路径
+    （费用相同的多条路径之间可能选择不同的一条）。
+
+    Args:
+        start_node_id (str): 起始节点ID
+        end_node_id (str): 结束节点ID
+        map (Map | CompiledMap): 地图对象或者编译结果
+        strategy: 搜索算法 dijkstra / astar / bidirectional / hierarchy，None 表示使用配置中的 `MAP_SEARCH_STRATEGY`
 
     Returns:
         list[str] | None: 最短路径上的节点ID列表，如果没有路径则返回None
     """
 
-    # 构建节点坐标字典
-    node_coords = {node.id: (node.x, node.y) for node in map.nodes}
+    compiled = as_compiled_map(map)
+    graph = compiled.graph
+    strategy = strategy or MAP_SEARCH_STRATEGY
+
+    if start_node_id not in graph.index or end_node_id not in graph.index:
+        return None
+
+    start, end = graph.index[start_node_id], graph.index[end_node_id]
+    # 有临时调整过费用的边时 预处理结果已经过时
+    if strategy == "hierarchy" and compiled.hierarchy is not None and not compiled.adjusted_edges:
+        result = compiled.hierarchy.query(start, end)
+        path = result[1] if result is not None else None
+    else:
+        path = graph.shortest_path(start, end, strategy)
+
+    return [graph.node_ids[i] for i in path] if path is not None else None
+
+
+def search_path_with_turns(
+    start_node_id: str,
+    end_node_id: str,
+    map: Map | CompiledMap,
+    initial_heading: str | None = None,
+    turn_cost: float = CAR_TURN_COST,
+    uturn_cost: float = CAR_UTURN_COST
+) -> tuple[list[str], str | None] | None:
+    """
+    考虑转向代价的最短路径（执行时间最短 而不是距离最短）
+
+    Args:
+        start_node_id (str): 起始节点ID
+        end_node_id (str): 结束节点ID
+        map (Map | CompiledMap): 地图对象或者编译结果
+        initial_heading (str | None): 起点处的车头朝向 east / north / west / south，None 表示未知
+        turn_cost (float): 90° 转向的代价（等效直行距离）
+        uturn_cost (float): 掉头的代价
+
+    Returns:
+        tuple[list[str], str | None] | None: (路径上的节点ID列表, 到达终点时的朝向)，如果没有路径则返回None
+    """
+
+    graph = as_compiled_map(map).graph
 
-    # 构建邻接表，动态计算曼哈顿距离
-    adjacency_list = {}
-    for edge in map.edges:
-        # 获取节点坐标
-        x1, y1 = node_coords.get(edge.u_node, (0, 0))
-        x2, y2 = node_coords.get(edge.v_node, (0, 0))
+    if start_node_id not in graph.index or end_node_id not in graph.index:
+        return None
 
-        # 计算曼哈顿距离
-        cost = int(abs(x2 - x1) + abs(y2 - y1))
+    heading = HEADINGS.index(initial_heading) if initial_heading is not None else NO_HEADING
+    result = graph.turn_aware_path(graph.index[start_node_id], graph.index[end_node_id], turn_cost, uturn_cost, heading)
+    if result is None:
+        return None
 
-        adjacency_list.setdefault(edge.u_node, []).append((edge.v_node, cost))
-        adjacency_list.setdefault(edge.v_node, []).append((edge.u_node, cost))
+    path, final_heading = result
+    return [graph.node_ids[i] for i in path], HEADINGS[final_heading] if final_heading != NO_HEADING else initial_heading
 
-    # 初始化Dijkstra算法的数据结构
-    min_heap = [(0, start_node_id)]  # (累计费用, 节点ID)
-    distances = {node.id: float("inf") for node in map.nodes}
-    distances[start_node_id] = 0
-    previous_nodes: dict[str, str | None] = {node.id: None for node in map.nodes}
 
-    while min_heap:
-        current_distance, current_node_id = heapq.heappop(min_heap)
+def count_path_turns(map: Map | CompiledMap, path: list[str]) -> tuple[int, int, int]:
+    """
+    统计路径的距离与转向次数（转向的判断与小车指令解析一致）
+
+    Args:
+        map (Map | CompiledMap): 地图对象或者编译结果
+        path (list[str]): 节点ID列表
 
-        # 如果到达终点，构建路径
-        if current_node_id == end_node_id:
-            path = []
-            while current_node_id is not None:
-                path.append(current_node_id)
-                current_node_id = previous_nodes[current_node_id]
-            return path[::-1]  # 反转路径
+    Returns:
+        tuple[int, int, int]: (曼哈顿距离之和, 90° 转向次数, 掉头次数)
+    """
 
-        # 跳过已经找到更短路径的节点
-        if current_distance > distances[current_node_id]:
+    graph = as_compiled_map(map).graph
+
+    distance, turns, uturns = 0, 0, 0
+    heading = NO_HEADING
+    for a, b in zip(path, path[1:]):
+        u, v = graph.index[a], graph.index[b]
+        dx, dy = graph.xs[v] - graph.xs[u], graph.ys[v] - graph.ys[u]
+        distance += int(abs(dx) + abs(dy))
+        if dx > 0:
+            next_heading = HEADINGS.index("east")
+        elif dx < 0:
+            next_heading = HEADINGS.index("west")
+        elif dy > 0:
+            next_heading = HEADINGS.index("south")
+        elif dy < 0:
+            next_heading = HEADINGS.index("north")
+        else:
             continue
+        if heading != NO_HEADING:
+            difference = (next_heading - heading) % 4
+            turns += difference in (1, 3)
+            uturns += difference == 2
+        heading = next_heading
+
+    return distance, turns, uturns
+
 
-        # 遍历邻居节点
-        for neighbor_id, cost in adjacency_list.get(current_node_id, []):
-            distance = current_distance + cost
+def nearest_node(map: Map | CompiledMap, x: float, y: float) -> tuple[str, float] | None:
+    """
+    离坐标最近的节点（把小车、自助机上报的位置吸附到地图上）
+
+    Args:
+        map (Map | CompiledMap): 地图对象或者编译结果
+        x (float): X坐标
+        y (float): Y坐标
 
-            # 如果找到更短路径，更新数据结构
-            if distance < distances[neighbor_id]:
-                distances[neighbor_id] = distance
-                previous_nodes[neighbor_id] = current_node_id
-                heapq.heappush(min_heap, (distance, neighbor_id))
+    Returns:
+        tuple[str, float] | None: (节点ID, 欧氏距离) 地图为空时返回None
+    Raises:
+        ValueError: 坐标不是有限数
+    """
 
-    return None  # 如果没有路径则返回None
+    graph = as_compiled_map(map).graph
+    result = graph.spatial_index.nearest(x, y)
+    return (graph.node_ids[result[0]], result[1]) if result is not None else None
 
 
-def translate_graph_to_tree(map: Map, root_node_id: str) -> TreeNode | None:
+def nearest_main_node(map: Map | CompiledMap, x: float, y: float, kind: str | None = None) -> tuple[str, float] | None:
+    """
+    离坐标最近的主节点 可以只在某一类中找（例如最近的卫生间）
+
+    Args:
+        map (Map | CompiledMap): 地图对象或者编译结果
+        x (float): X坐标
+        y (float): Y坐标
+        kind (str | None): 主节点的类别 例如 toilet / clinic / internal_clinic，None 表示任意主节点
+
+    Returns:
+        tuple[str, float] | None: (节点ID, 欧氏距离) 没有这一类主节点时返回None
+    Raises:
+        ValueError: 坐标不是有限数
+    """
+
+    graph = as_compiled_map(map).graph
+    result = graph.main_spatial_index(kind).nearest(x, y)
+    return (graph.node_ids[result[0]], result[1]) if result is not None else None
+
+
+def nodes_within_radius(map: Map | CompiledMap, x: float, y: float, radius: float, main_only: bool = False) -> list[tuple[str, float]]:
+    """
+    离坐标不超过 `radius` 的所有节点
+
+    Args:
+        map (Map | CompiledMap): 地图对象或者编译结果
+        x (float): X坐标
+        y (float): Y坐标
+        radius (float): 半径（欧氏距离）
+        main_only (bool): 是否只返回主节点
+
+    Returns:
+        list[tuple[str, float]]: (节点ID, 欧氏距离) 按距离从近到远排列
+    Raises:
+        ValueError: 坐标或半径不是有限数
+    """
+
+    graph = as_compiled_map(map).graph
+    index = graph.main_spatial_index() if main_only else graph.spatial_index
+    return [(graph.node_ids[i], distance) for i, distance in index.within(x, y, radius)]
+
+
+def search_path_from_position(
+    x: float,
+    y: float,
+    end_node_id: str,
+    map: Map | CompiledMap,
+    strategy: SEARCH_STRATEGY_TYPES | None = None
+) -> list[str] | None:
+    """
+    从任意坐标出发的最短路径：先吸附到最近的节点 再从该节点开始搜索
+
+    Args:
+        x (float): 起点X坐标
+        y (float): 起点Y坐标
+        end_node_id (str): 结束节点ID
+        map (Map | CompiledMap): 地图对象或者编译结果
+        strategy: 搜索算法 None 表示使用配置中的 `MAP_SEARCH_STRATEGY`
+
+    Returns:
+        list[str] | None: 从吸附节点开始的节点ID列表，如果没有路径则返回None
+    """
+
+    start = nearest_node(map, x, y)
+    if start is None:
+        return None
+    return search_path(start[0], end_node_id, map, strategy)
+
+
+def translate_graph_to_tree(map: Map | CompiledMap, root_node_id: str) -> TreeNode | None:
     """
     将地图图结构转换为树结构
 
     Args:
-        map (Map): 地图对象
+        map (Map | CompiledMap): 地图对象或者编译结果
         root_node_id (str): 树的根节点ID
 
     Returns:
         TreeNode | None: 转换后的树的根节点 如果根节点不存在则返回None
     """
 
-    node_dict = {node.id: node for node in map.nodes}
-    edge_dict = {}
-    for edge in map.edges:
-        edge_dict.setdefault(edge.u_node, []).append(edge.v_node)
-        edge_dict.setdefault(edge.v_node, []).append(edge.u_node)
+    graph = as_compiled_map(map).graph
 
-    if root_node_id not in node_dict:
+    if root_node_id not in graph.index:
         return None
 
     visited = set()
-    def build_tree(node_id: str) -> TreeNode:
-        visited.add(node_id)
-        tree_node = TreeNode(**node_dict[node_id].dict())
-        for neighbor_id in edge_dict.get(node_id, []):
-            if neighbor_id not in visited:
-                tree_node.children.append(build_tree(neighbor_id))
+    def build_tree(node: int) -> TreeNode:
+        visited.add(node)
+        tree_node = TreeNode(**graph.nodes[node].model_dump())
+        for neighbor, _ in graph.neighbors(node):
+            if neighbor not in visited:
+                tree_node.children.append(build_tree(neighbor))
         return tree_node
 
-    return build_tree(root_node_id)
+    return build_tree(graph.index[root_node_id])
+
+
+def find_broken_hop(map: Map | CompiledMap, path: list[str]) -> int | None:
+    """
+    找到路径中第一个断开的跳（第 k 跳指 path[k] → path[k + 1]）
+
+    使用编译地图中预先构建的邻接集合，每一跳 O(1)，整体与路径长度成线性关系。
+
+    Args:
+        map (Map | CompiledMap): 地图对象或者编译结果
+        path (list[str]): 节点ID列表，表示路径
+
+    Returns:
+        int | None: 第一个断开的跳的下标（端点不存在或者两点之间没有边） 路径联通时返回None
+    """
+
+    return as_compiled_map(map).graph.first_broken_hop(path)
 
 
 def validate_path(map: Map, path: list[str]) -> bool:
@@ -231,47 +489,64 @@ def validate_path(map: Map, path: list[str]) -> bool:
     if not path or check_map_validity(map) is False:
         # 路径为空或地图无效 则路径无效
         return False
-    
-    root_node = translate_graph_to_tree(map, path[0])
 
-    if root_node is None:
-        # 根节点不存在 则路径无效
-        return False
+    return find_broken_hop(map, path) is None
 
-    current_node = root_node
-    for node_id in path[1:]:
-        # 在当前节点的子节点中查找下一个节点
-        next_node = next((child for child in current_node.children if child.id == node_id), None)
-        if next_node is None:
-            # 如果当前节点没有下一个节点 则路径无效
-            return False
-        current_node = next_node
-    
-    return True
 
+def validate_paths(map: Map, paths: list[list[str]]) -> list[int | None]:
+    """
+    批量验证多条路径 地图有效性只检查一次
 
-# 直接在这里加载
-with open(MAP_PATH, "r", encoding="utf-8") as f:
-    map_json_str = f.read()
-    map = load_map_from_str(map_json_str)
-    if map:
-        compute_costs(map)
+    Args:
+        map (Map): 地图对象
+        paths (list[list[str]]): 多条路径
 
-main_node_ids = get_all_main_node_ids(map) if map else None
-main_node_id_to_name_and_description = get_all_main_node_id_to_name_and_description(map) if map else None
-clinic_id_to_name_and_description = {node.id: {"name": node.name or "", "description": node.description or ""} for node in map.nodes if node.id.find("clinic") != -1} if map else None
+    Returns:
+        list[int | None]: 每条路径第一个断开的跳的下标 联通时为None；地图无效时每条路径都为0
+    """
 
+    if check_map_validity(map) is False:
+        return [0 for _ in paths]
 
-__all__ = [
+    graph = as_compiled_map(map).graph
+    return [graph.first_broken_hop(path) for path in paths]
+
+
+# 地图由 `src.map.registry` 加载并支持热更新
+# 以下旧的模块级名字保留为兼容入口，每次访问都返回当前版本的值（不要 `from ... import` 后长期持有）
+_LEGACY_SNAPSHOT_ATTRIBUTES = {
     "map",
     "main_node_ids",
     "main_node_id_to_name_and_description",
     "clinic_id_to_name_and_description",
+}
+
+
+def __getattr__(name: str):
+    if name in _LEGACY_SNAPSHOT_ATTRIBUTES:
+        from src.map.registry import current_map
+        return getattr(current_map(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
     "load_map_from_str",
     "compute_costs",
     "check_map_validity",
     "get_all_main_node_ids",
     "dijkstra_search",
+    "search_path",
+    "get_compiled_map",
+    "as_compiled_map",
+    "register_compiled_map",
+    "search_path_with_turns",
+    "count_path_turns",
+    "nearest_node",
+    "nearest_main_node",
+    "nodes_within_radius",
+    "search_path_from_position",
     "translate_graph_to_tree",
     "validate_path",
+    "validate_paths",
+    "find_broken_hop",
 ]
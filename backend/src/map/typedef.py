@@ -56,6 +56,46 @@ class Map(BaseModel):
     edges: list[Edge] = Field(..., description="地图中的边列表")
 
 
+class VisitStop(BaseModel):
+    """
+    访问顺序优化中的可调整停靠点
+
+    必须在第 `after` 个固定点之后、第 `before` 个固定点之前访问（固定点按路线顺序编号）。
+    """
+
+    node_id: str = Field(..., description="停靠点的节点ID")
+
+    after: int = Field(0, description="必须在该下标的固定点之后访问", ge=0)
+
+    before: int | None = Field(None, description="必须在该下标的固定点之前访问 None 表示最后一个固定点")
+
+
+class EdgeAdjustment(BaseModel):
+    """
+    边的临时调整（清洁封闭、高峰拥堵等）
+    """
+
+    u: str = Field(..., description="边的一个端点ID")
+
+    v: str = Field(..., description="边的另一个端点ID")
+
+    penalty: int = Field(0, description="在原费用上增加的费用", ge=0)
+
+    closed: bool = Field(False, description="是否封闭 封闭时不可通行")
+
+    expires_at: float | None = Field(None, description="失效时间戳 None 表示一直有效直到被清除")
+
+
+class Position(BaseModel):
+    """
+    地图上的任意坐标（小车、自助机上报的位置）
+    """
+
+    x: float = Field(..., description="X坐标", allow_inf_nan=False)
+
+    y: float = Field(..., description="Y坐标", allow_inf_nan=False)
+
+
 class TreeNode(Node):
     """
     地图树 节点
@@ -68,5 +108,8 @@ __all__ = [
     "Node",
     "Edge",
     "Map",
+    "VisitStop",
+    "EdgeAdjustment",
+    "Position",
     "TreeNode",
 ]
@@ -0,0 +1,226 @@
+# map/visit_order.py
+# 多停靠点的访问顺序优化
+#
+# 路线由按顺序访问的固定点（入口、挂号处、诊室、缴费处、药房、出口）和若干可调整的停靠点组成，
+# 每个停靠点只能插在某两个固定点之间。在满足这些约束的前提下，选出总步行距离最短的访问顺序。
+#
+# - 停靠点不多时（`VISIT_ORDER_EXACT_MAX_STOPS`）用状态压缩 DP 求精确解：
+#   状态为（已经过的固定点、已访问的停靠点集合、当前所在位置）
+# - 更多时先按最小增量逐个插入，再反复把每个停靠点移到代价最小的可行位置，直到无法改进
+#
+# 点与点之间的距离直接查编译地图中预先计算好的最短路径表。
+
+import math
+
+from src.config.general import VISIT_ORDER_EXACT_MAX_STOPS
+from src.map.typedef import *
+from src.map.compiled import CompiledMap
+
+
+def _distance_matrix(compiled: CompiledMap, node_ids: list[str]) -> list[list[float]]:
+    """
+    两两之间的最短距离 不可达为 inf
+
+    终点在最短路径表中时直接查表；地图是无向图，起点在表中时反过来查；都不在时从起点跑一次 Dijkstra。
+    """
+
+    for node_id in node_ids:
+        if node_id not in compiled.index:
+            raise ValueError(f"Node not found: {node_id}")
+
+    matrix = [[0.0] * len(node_ids) for _ in node_ids]
+    for i, source in enumerate(node_ids):
+        source_distances = None
+        for j, target in enumerate(node_ids):
+            if i == j:
+                continue
+            if compiled.has_target(target):
+                distance = compiled.distance(source, target)
+            elif compiled.has_target(source):
+                distance = compiled.distance(target, source)
+            else:
+                if source_distances is None:
+                    source_distances, _ = compiled.graph.dijkstra(compiled.index[source])
+                distance = source_distances[compiled.index[target]]
+            matrix[i][j] = math.inf if distance is None else distance
+    return matrix
+
+
+def _exact_order(
+    matrix: list[list[float]],
+    anchor_count: int,
+    windows: list[tuple[int, int]],
+) -> tuple[float, list[int]]:
+    """
+    状态压缩 DP
+
+    点的编号：固定点为 0 ~ anchor_count - 1，停靠点 s 为 anchor_count + s。
+    在第 j 个与第 j + 1 个固定点之间，按已访问停靠点数从少到多扩展状态 (mask, last)，
+    last 为 -1 表示还站在第 j 个固定点上；走到第 j + 1 个固定点前，必须访问完所有截止于它的停靠点。
+
+    Returns:
+        tuple[float, list[int]]: (总距离, 点编号序列)
+    """
+
+    stop_count = len(windows)
+    # 截止于每个固定点的停靠点集合
+    due = [0] * anchor_count
+    for s, (_, before) in enumerate(windows):
+        due[before] |= 1 << s
+
+    # parents[(j, mask, last)] = 上一个状态
+    parents: dict[tuple[int, int, int], tuple[int, int, int] | None] = {(0, 0, -1): None}
+    anchor_states: dict[int, float] = {0: 0.0} # 站在第 j 个固定点上的状态 mask → 距离
+
+    for j in range(anchor_count - 1):
+        allowed = [s for s, (after, before) in enumerate(windows) if after <= j < before]
+
+        states: dict[tuple[int, int], float] = {(mask, -1): cost for mask, cost in anchor_states.items()}
+        frontier = dict(states)
+        while frontier:
+            next_frontier: dict[tuple[int, int], float] = {}
+            for (mask, last), cost in frontier.items():
+                position = j if last == -1 else anchor_count + last
+                for s in allowed:
+                    if mask & (1 << s):
+                        continue
+                    new_cost = cost + matrix[position][anchor_count + s]
+                    key = (mask | (1 << s), s)
+                    if new_cost < next_frontier.get(key, math.inf) and new_cost < states.get(key, math.inf):
+                        next_frontier[key] = new_cost
+                        parents[(j, key[0], s)] = (j, mask, last)
+            states.update(next_frontier)
+            frontier = next_frontier
+
+        anchor_states = {}
+        for (mask, last), cost in states.items():
+            if mask & due[j + 1] != due[j + 1] or cost == math.inf:
+                continue
+            position = j if last == -1 else anchor_count + last
+            new_cost = cost + matrix[position][j + 1]
+            if new_cost < anchor_states.get(mask, math.inf):
+                anchor_states[mask] = new_cost
+                parents[(j + 1, mask, -1)] = (j, mask, last)
+
+    full = (1 << stop_count) - 1
+    total = anchor_states.get(full, math.inf)
+    if total == math.inf:
+        return total, []
+
+    sequence = []
+    state = (anchor_count - 1, full, -1)
+    while state is not None:
+        j, _, last = state
+        sequence.append(j if last == -1 else anchor_count + last)
+        state = parents[state]
+    return total, sequence[::-1]
+
+
+def _sequence_cost(matrix: list[list[float]], sequence: list[int]) -> float:
+    return sum(matrix[a][b] for a, b in zip(sequence, sequence[1:]))
+
+
+def _best_insertion(
+    matrix: list[list[float]],
+    sequence: list[int],
+    point: int,
+    after: int,
+    before: int,
+) -> tuple[float, int]:
+    """
+    停靠点 `point` 在第 `after` 与第 `before` 个固定点之间代价最小的插入位置
+
+    Returns:
+        tuple[float, int]: (增加的距离, 插入下标)
+    """
+
+    start, end = sequence.index(after), sequence.index(before)
+    best = (math.inf, -1)
+    for i in range(start, end):
+        a, b = sequence[i], sequence[i + 1]
+        delta = matrix[a][point] + matrix[point][b] - matrix[a][b]
+        if delta < best[0]:
+            best = (delta, i + 1)
+    return best
+
+
+def _heuristic_order(
+    matrix: list[list[float]],
+    anchor_count: int,
+    windows: list[tuple[int, int]],
+) -> tuple[float, list[int]]:
+    """
+    最小增量插入 + 重定位局部搜索
+
+    窗口越窄的停靠点越先插入；之后依次把每个停靠点取出、重新插入到代价最小的可行位置，
+    直到一整轮都没有改进为止。
+    """
+
+    sequence = list(range(anchor_count))
+    for s in sorted(range(len(windows)), key=lambda s: windows[s][1] - windows[s][0]):
+        delta, position = _best_insertion(matrix, sequence, anchor_count + s, *windows[s])
+        if delta == math.inf:
+            return math.inf, []
+        sequence.insert(position, anchor_count + s)
+
+    improved = True
+    while improved:
+        improved = False
+        for s in range(len(windows)):
+            point = anchor_count + s
+            i = sequence.index(point)
+            removed_saving = matrix[sequence[i - 1]][point] + matrix[point][sequence[i + 1]] - matrix[sequence[i - 1]][sequence[i + 1]]
+            candidate = sequence[:i] + sequence[i + 1:]
+            delta, position = _best_insertion(matrix, candidate, point, *windows[s])
+            if delta < removed_saving - 1e-9:
+                sequence = candidate[:position] + [point] + candidate[position:]
+                improved = True
+
+    return _sequence_cost(matrix, sequence), sequence
+
+
+def optimize_visit_order(
+    compiled: CompiledMap,
+    anchors: list[str],
+    stops: list[VisitStop],
+) -> tuple[list[str], int]:
+    """
+    在固定点之间安排停靠点 使总步行距离最短
+
+    Args:
+        compiled (CompiledMap): 编译后的地图
+        anchors (list[str]): 按顺序访问的固定点ID 至少两个（起点和终点）
+        stops (list[VisitStop]): 可调整的停靠点及其时间窗口
+    Returns:
+        tuple[list[str], int]: (完整的访问顺序, 总距离)
+    Raises:
+        ValueError: 节点不存在、时间窗口无效 或者没有可行的顺序（有点不可达）
+    """
+
+    if len(anchors) < 2:
+        raise ValueError("At least two anchors are required.")
+
+    windows = []
+    for stop in stops:
+        before = len(anchors) - 1 if stop.before is None else stop.before
+        if not stop.after < before < len(anchors):
+            raise ValueError(f"Invalid window for {stop.node_id}: after {stop.after}, before {before}")
+        windows.append((stop.after, before))
+
+    points = anchors + [stop.node_id for stop in stops]
+    matrix = _distance_matrix(compiled, points)
+
+    if len(stops) <= VISIT_ORDER_EXACT_MAX_STOPS:
+        total, sequence = _exact_order(matrix, len(anchors), windows)
+    else:
+        total, sequence = _heuristic_order(matrix, len(anchors), windows)
+
+    if total == math.inf:
+        raise ValueError("No feasible visit order: some locations are unreachable.")
+
+    return [points[i] for i in sequence], int(total)
+
+
+__all__ = [
+    "optimize_visit_order",
+]
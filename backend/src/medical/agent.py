@@ -5,7 +5,7 @@ backend/src/medical/agent.py
 """
 
 from typing import Optional
-from src.llm.online.client import get_online_client
+from src.llm.online.client import create_online_client, get_online_scheduler, estimate_tokens, OnlinePriority
 from src.config import general
 import json
 import asyncio
@@ -54,18 +54,25 @@ def generate_patient_advice(diagnosis_text: str, patient_info: Optional[dict] =
     """
     if online_model:
         try:
-            client = get_online_client()
             # 使用简单的 chat completion 调用
             prompt = _build_prompt(diagnosis_text, patient_info, matched_records)
+
+            async def request_advice():
+                # client 的连接池绑定在创建它的事件循环上 这里的事件循环用完即关闭 所以每次调用单独新建
+                async with create_online_client() as client:
+                    return await get_online_scheduler().run(
+                        lambda: client.chat.completions.create(
+                            model=general.ONLINE_CHAT_MODEL,
+                            messages=[{"role": "user", "content": prompt}],
+                            temperature=0.2,
+                            max_tokens=800,
+                        ),
+                        priority=OnlinePriority.MEDICAL_ADVICE,
+                        estimated_tokens=estimate_tokens(prompt, max_tokens=800),
+                    )
+
             # 以同步方式调用（外层 router 会在线程池中调用此函数）
-            response = asyncio.run(
-                client.chat.completions.create(
-                    model=general.ONLINE_CHAT_MODEL,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.2,
-                    max_tokens=800,
-                )
-            )
+            response = asyncio.run(request_advice())
 
             # 提取文本内容
             assistant = response.choices[0].message
@@ -0,0 +1,120 @@
+# metrics.py
+# 进程内的简单指标统计（计数器 / 仪表盘 / 耗时汇总）
+#
+# 不依赖 prometheus 之类的外部库，所有数据都保存在内存里，
+# 通过 `/api/metrics/` 路由直接以 JSON 形式查看。
+
+import threading
+
+
+_lock = threading.Lock()
+
+_counters: dict[str, float] = {}
+_gauges: dict[str, float] = {}
+_summaries: dict[str, dict[str, float]] = {}
+
+
+def _key(name: str, labels: dict[str, object]) -> str:
+    """
+    把指标名与标签拼成唯一键，例如 `llm_online_queue_wait_seconds{priority=TRIAGE}`
+    """
+
+    if not labels:
+        return name
+
+    label_text = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{label_text}}}"
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """
+    计数器累加
+
+    Args:
+        name (str): 指标名
+        value (float): 累加值 默认为1
+        **labels: 标签
+    """
+
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """
+    设置仪表盘的当前值
+    """
+
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def add_gauge(name: str, delta: float, **labels) -> None:
+    """
+    仪表盘增减（用于 in-flight / 排队数量这类随进出变化的值）
+    """
+
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + delta
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """
+    记录一次观测值（例如耗时），汇总为 count / sum / max / last
+
+    Args:
+        name (str): 指标名
+        value (float): 观测值
+        **labels: 标签
+    """
+
+    key = _key(name, labels)
+    with _lock:
+        summary = _summaries.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0, "last": 0.0})
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["max"] = max(summary["max"], value)
+        summary["last"] = value
+
+
+def snapshot() -> dict[str, dict]:
+    """
+    获取当前所有指标的快照
+
+    Returns:
+        dict[str, dict]: 包含 counters / gauges / summaries 三类指标
+    """
+
+    with _lock:
+        summaries = {}
+        for key, summary in _summaries.items():
+            summaries[key] = dict(summary)
+            summaries[key]["avg"] = summary["sum"] / summary["count"] if summary["count"] else 0.0
+
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "summaries": summaries,
+        }
+
+
+def reset() -> None:
+    """清空所有指标"""
+
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
+
+
+__all__ = [
+    "inc",
+    "set_gauge",
+    "add_gauge",
+    "observe",
+    "snapshot",
+    "reset",
+]
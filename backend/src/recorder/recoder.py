@@ -1,19 +1,15 @@
 import json
+import asyncio
 from typing import Any, Callable
 
 from src.IntegratedSystem.integrated_system import IntegratedSystem
 from src.config import general
-from src.llm.online.client import get_online_client
+from src.llm.online.client import create_online_client, get_online_scheduler, estimate_tokens, OnlinePriority
 from src import utils
 from dotenv import load_dotenv
 
 load_dotenv()
 
-try:
-    client = get_online_client()
-except Exception:
-    client = None
-
 system = IntegratedSystem()
 
 
@@ -268,40 +264,50 @@ class RecorderAgent:
         return messages
 
     def run(self, query: str, context: dict | None = None, max_iterations: int = 10) -> dict:
+        # 在同步上下文中（外层在线程池中调用）整个工具调用循环只开一个事件循环
+        return asyncio.run(self._run(query, context, max_iterations))
+
+    async def _run(self, query: str, context: dict | None, max_iterations: int) -> dict:
         messages = self._build_messages(query, context)
 
-        for _ in range(max_iterations):
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=TOOLS,
-                tool_choice="auto",
-                temperature=0,
-            )
-
-            assistant_message = response.choices[0].message
-            messages.append(assistant_message.model_dump(exclude_none=True))
-
-            if not assistant_message.tool_calls:
-                self._messages = messages[1:]
-                return {
-                    "success": True,
-                    "response": assistant_message.content or "",
-                }
-
-            for tool_call in assistant_message.tool_calls:
-                func_name = tool_call.function.name
-                func_args = json.loads(tool_call.function.arguments)
-                result = self._execute_tool(func_name, func_args)
-
-                messages.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": json.dumps(result, ensure_ascii=False) if result is not None else "null",
-                    }
+        # client 的连接池绑定在创建它的事件循环上 这里的事件循环用完即关闭 所以每次运行单独新建
+        async with create_online_client() as client:
+            for _ in range(max_iterations):
+                response = await get_online_scheduler().run(
+                    lambda: client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        tools=TOOLS,
+                        tool_choice="auto",
+                        temperature=0,
+                    ),
+                    priority=OnlinePriority.RECORDER,
+                    estimated_tokens=estimate_tokens(json.dumps(messages, ensure_ascii=False, default=str)),
                 )
 
+                assistant_message = response.choices[0].message
+                messages.append(assistant_message.model_dump(exclude_none=True))
+
+                if not assistant_message.tool_calls:
+                    self._messages = messages[1:]
+                    return {
+                        "success": True,
+                        "response": assistant_message.content or "",
+                    }
+
+                for tool_call in assistant_message.tool_calls:
+                    func_name = tool_call.function.name
+                    func_args = json.loads(tool_call.function.arguments)
+                    result = self._execute_tool(func_name, func_args)
+
+                    messages.append(
+                        {
+                            "role": "tool",
+                            "tool_call_id": tool_call.id,
+                            "content": json.dumps(result, ensure_ascii=False) if result is not None else "null",
+                        }
+                    )
+
         return {"success": False, "response": "达到最大迭代次数"}
 
     def clear_history(self):
@@ -3,9 +3,13 @@ from src.router.triager import triager_router
 from src.router.voice import voice_router
 from src.router.mapping import map_router
 from src.router.medical_system import medical_system_router
+from src.router.metrics import metrics_router
+from src.router.car import car_router
 
 api_router = APIRouter(prefix="/api")
 api_router.include_router(triager_router)
 api_router.include_router(voice_router)
 api_router.include_router(map_router)
 api_router.include_router(medical_system_router)
+api_router.include_router(metrics_router)
+api_router.include_router(car_router)
@@ -0,0 +1,221 @@
+"""
+router/car.py
+小车通道 路由
+"""
+
+import asyncio
+
+from pydantic import BaseModel, Field
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+
+from src.config.general import ROUTING_OBJECTIVE_TYPES
+from src.map.typedef import Position
+from src.map.registry import current_map
+from src.map.tools import nearest_node
+from src.smart_triager.typedef import LocationLink
+from src.smart_triager.car.parser import get_route_commands
+from src.smart_triager.car.protocol import encode_commands
+from src.smart_triager.car.kinematics import estimate_seconds, format_eta
+from src.smart_triager.car.channel import get_car_channel_manager
+from src.smart_triager.car.fleet import get_fleet_dispatcher
+from src.smart_triager.car.typedef import FleetTask, KinematicProfile
+
+
+car_router = APIRouter(prefix="/car")
+
+
+class CarRouteRequest(BaseModel):
+    """
+    给小车下发路线的请求体
+    """
+
+    origin_route: list[LocationLink] = Field(..., description="路线列表")
+    objective: ROUTING_OBJECTIVE_TYPES | None = Field(default=None, description="优化目标 为空时使用服务端配置")
+    position: Position | None = Field(default=None, description="小车当前的坐标 给出时从离它最近的节点出发")
+
+
+class FleetCarRequest(BaseModel):
+    """
+    把小车加入调度（或者重新放置）的请求体 节点与坐标二选一
+    """
+
+    car_id: str = Field(..., description="小车ID")
+    node: str | None = Field(default=None, description="小车所在的节点ID")
+    position: Position | None = Field(default=None, description="小车所在的坐标 吸附到最近的节点")
+
+
+class FleetDispatchRequest(BaseModel):
+    """
+    多车调度的请求体
+    """
+
+    tasks: list[FleetTask] = Field(..., min_length=1, description="待分配的任务")
+    profile: KinematicProfile | None = Field(default=None, description="小车运动学参数 为空时使用服务端配置")
+    send: bool = Field(default=True, description="是否把指令排入各辆小车的通道")
+
+
+@car_router.websocket("/ws/")
+async def car_channel(websocket: WebSocket):
+    """
+    小车控制器的二进制通道（协议见 `smart_triager/car/protocol.py`） 第一帧必须是 HELLO
+    """
+
+    await websocket.accept()
+
+    async def receive() -> bytes | None:
+        try:
+            message = await websocket.receive()
+        except WebSocketDisconnect:
+            return None
+        if message["type"] == "websocket.disconnect":
+            return None
+        return message.get("bytes") or (message.get("text") or "").encode("utf-8")
+
+    await get_car_channel_manager().handle_connection(receive, websocket.send_bytes)
+
+
+@car_router.get("/fleet/")
+async def get_fleet_status():
+    """
+    获取调度中所有小车的状态
+    """
+
+    return JSONResponse(
+        content={ "success": True, "data": get_fleet_dispatcher().status() },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@car_router.post("/fleet/cars/")
+async def add_fleet_car(request: FleetCarRequest):
+    """
+    把一辆空闲小车加入调度
+    """
+
+    node = request.node
+    if node is None and request.position is not None:
+        nearest = nearest_node(current_map().compiled, request.position.x, request.position.y)
+        node = nearest[0] if nearest is not None else None
+    if node is None:
+        return JSONResponse(
+            content={ "success": False, "error": "Either node or position is required." },
+            status_code=400,
+            media_type="application/json"
+        )
+
+    try:
+        get_fleet_dispatcher().add_car(request.car_id, node)
+    except ValueError as e:
+        return JSONResponse(
+            content={ "success": False, "error": str(e) },
+            status_code=400,
+            media_type="application/json"
+        )
+
+    return JSONResponse(
+        content={ "success": True, "data": { "car_id": request.car_id, "node": node } },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@car_router.delete("/fleet/cars/{car_id}/")
+async def remove_fleet_car(car_id: str):
+    """
+    把小车移出调度
+    """
+
+    if not get_fleet_dispatcher().remove_car(car_id):
+        return JSONResponse(
+            content={ "success": False, "error": f"Car not found: {car_id}" },
+            status_code=404,
+            media_type="application/json"
+        )
+
+    return JSONResponse(
+        content={ "success": True, "data": None },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@car_router.post("/fleet/dispatch/")
+async def dispatch_fleet(request: FleetDispatchRequest):
+    """
+    按预计到达时间把任务分配给空闲小车 规划互不冲突的路线（需要避让的地方带等待时间）并下发指令
+    """
+
+    # 大地图上规划几十辆小车需要一些时间 放到线程里 不阻塞事件循环
+    result = await asyncio.to_thread(get_fleet_dispatcher().dispatch, request.tasks, request.profile)
+
+    seqs = {}
+    if request.send:
+        manager = get_car_channel_manager()
+        for assignment in result.assignments:
+            seqs[assignment.car_id] = await manager.channel(assignment.car_id).enqueue(assignment.commands.actions)
+
+    return JSONResponse(
+        content={ "success": True, "data": { **result.model_dump(mode="json"), "seqs": seqs } },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@car_router.post("/{car_id}/route/")
+async def send_route(car_id: str, request: CarRouteRequest):
+    """
+    把路线转换为移动指令并排入小车的队列 小车离线时在重新连上后发出
+    """
+
+    try:
+        # 缓存未命中时需要在地图上搜索 放到线程里 不阻塞事件循环（小车通道的重传也在这个循环上）
+        commands = await asyncio.to_thread(get_route_commands, request.origin_route, request.objective, request.position)
+    except ValueError as e:
+        return JSONResponse(
+            content={ "success": False, "error": str(e) },
+            status_code=400,
+            media_type="application/json"
+        )
+
+    channel = get_car_channel_manager().channel(car_id)
+    seq = await channel.enqueue(commands.actions)
+    eta = estimate_seconds(commands)
+
+    return JSONResponse(
+        content={
+            "success": True,
+            "data": {
+                "seq": seq,
+                "actions": len(commands.actions),
+                "payload_bytes": len(encode_commands(commands.actions)),
+                "connected": channel.connected,
+                "eta_seconds": eta,
+                "eta_message": format_eta(eta),
+            }
+        },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@car_router.get("/{car_id}/")
+async def get_car_status(car_id: str):
+    """
+    获取小车通道的状态（是否在线 没执行完的批次）
+    """
+
+    channel = get_car_channel_manager().find(car_id)
+    if channel is None:
+        return JSONResponse(
+            content={ "success": False, "error": f"Car not found: {car_id}" },
+            status_code=404,
+            media_type="application/json"
+        )
+
+    return JSONResponse(
+        content={ "success": True, "data": channel.status() },
+        status_code=200,
+        media_type="application/json"
+    )
@@ -3,19 +3,201 @@ router/mapping.py
 地图功能 路由
 """
 
+import math
+import asyncio
+
+from pydantic import BaseModel, Field
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 
-from src.map.tools import map
+from src.config.general import EDGE_ADJUSTMENT_DEFAULT_TTL
+from src.map.registry import current_map, get_map_registry
+from src.map.edge_weights import get_edge_weights
+from src.map.tools import nearest_node, nearest_main_node, nodes_within_radius
 
 
 map_router = APIRouter(prefix="/map")
 
 
+class EdgeAdjustmentRequest(BaseModel):
+    """
+    临时调整一条边的请求体
+    """
+
+    u: str = Field(..., description="边的一个端点ID")
+    v: str = Field(..., description="边的另一个端点ID")
+    penalty: int = Field(default=0, description="在原费用上增加的费用（拥堵）", ge=0)
+    closed: bool = Field(default=False, description="是否封闭（清洁等）")
+    ttl_seconds: float | None = Field(default=EDGE_ADJUSTMENT_DEFAULT_TTL, description="有效时长（秒） 为空表示直到手动清除", gt=0)
+
+
+class EdgeRequest(BaseModel):
+    """
+    指定一条边的请求体
+    """
+
+    u: str = Field(..., description="边的一个端点ID")
+    v: str = Field(..., description="边的另一个端点ID")
+
+
 @map_router.get("/")
 async def get_map():
     """
-    获取地图数据
+    获取地图数据 响应头 `X-Map-Version` 为地图版本号
+    """
+
+    snapshot = current_map()
+
+    return JSONResponse(
+        content=snapshot.map.model_dump(),
+        status_code=200,
+        media_type="application/json",
+        headers={"X-Map-Version": str(snapshot.version)},
+    )
+
+
+@map_router.get("/version/")
+async def get_map_version():
+    """
+    获取当前地图版本号
+    """
+
+    return JSONResponse( content={ "success": True, "data": { "version": current_map().version } }, status_code=200, media_type="application/json" )
+
+
+@map_router.post("/reload/")
+async def reload_map():
+    """
+    立即重新加载地图文件（在后台线程中构建 新地图无效时保留当前版本）
+    """
+
+    swapped = await asyncio.to_thread(get_map_registry().reload, True)
+
+    return JSONResponse(
+        content={ "success": swapped, "data": { "version": current_map().version } },
+        status_code=200 if swapped else 500,
+        media_type="application/json"
+    )
+
+
+@map_router.get("/nearest/")
+async def get_nearest_node(x: float, y: float, kind: str | None = None, main_only: bool = False):
+    """
+    离坐标最近的节点 给出 `kind`（例如 toilet / clinic）时只在这一类主节点中找
     """
 
-    return JSONResponse( content=map.model_dump(), status_code=200, media_type="application/json" )
+    if not (math.isfinite(x) and math.isfinite(y)):
+        return JSONResponse(
+            content={ "success": False, "error": "x and y must be finite numbers." },
+            status_code=400,
+            media_type="application/json"
+        )
+
+    # 只用到编译图 不需要构造完整的地图对象（二进制地图）
+    compiled = current_map().compiled
+    try:
+        result = nearest_main_node(compiled, x, y, kind) if kind is not None or main_only else nearest_node(compiled, x, y)
+    except ValueError as e:
+        return JSONResponse(
+            content={ "success": False, "error": str(e) },
+            status_code=400,
+            media_type="application/json"
+        )
+
+    if result is None:
+        return JSONResponse(
+            content={ "success": False, "error": "No matching node." },
+            status_code=404,
+            media_type="application/json"
+        )
+
+    return JSONResponse(
+        content={ "success": True, "data": { "id": result[0], "distance": result[1] } },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@map_router.get("/within/")
+async def get_nodes_within(x: float, y: float, radius: float, main_only: bool = False):
+    """
+    离坐标不超过 `radius` 的所有节点 按距离从近到远排列
+    """
+
+    if not (math.isfinite(x) and math.isfinite(y) and math.isfinite(radius)):
+        return JSONResponse(
+            content={ "success": False, "error": "x, y and radius must be finite numbers." },
+            status_code=400,
+            media_type="application/json"
+        )
+
+    try:
+        found = nodes_within_radius(current_map().compiled, x, y, radius, main_only)
+    except ValueError as e:
+        return JSONResponse(
+            content={ "success": False, "error": str(e) },
+            status_code=400,
+            media_type="application/json"
+        )
+
+    return JSONResponse(
+        content={ "success": True, "data": [{ "id": node_id, "distance": distance } for node_id, distance in found] },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@map_router.get("/edges/")
+async def get_edge_adjustments():
+    """
+    获取当前有效的边的临时调整
+    """
+
+    # 会顺带清除过期的调整（增量更新最短路径表） 放到线程里 不阻塞事件循环
+    adjustments = await asyncio.to_thread(get_edge_weights().active)
+
+    return JSONResponse(
+        content={ "success": True, "data": [adjustment.model_dump() for adjustment in adjustments] },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@map_router.post("/edges/")
+async def adjust_edge(request: EdgeAdjustmentRequest):
+    """
+    临时封闭一条边或者增加它的费用 最短路径增量更新 经过它的小车指令缓存失效
+    """
+
+    try:
+        # 最短路径表的增量更新在线程中进行 不阻塞事件循环
+        adjustment = await asyncio.to_thread(
+            get_edge_weights().adjust, request.u, request.v, request.penalty, request.closed, request.ttl_seconds
+        )
+    except KeyError as e:
+        return JSONResponse(
+            content={ "success": False, "error": str(e) },
+            status_code=404,
+            media_type="application/json"
+        )
+
+    return JSONResponse(
+        content={ "success": True, "data": adjustment.model_dump() },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@map_router.post("/edges/clear/")
+async def clear_edge_adjustment(request: EdgeRequest):
+    """
+    清除一条边的临时调整 恢复原费用
+    """
+
+    cleared = await asyncio.to_thread(get_edge_weights().clear, request.u, request.v)
+
+    return JSONResponse(
+        content={ "success": cleared, "data": None } if cleared else { "success": False, "error": "No adjustment on this edge." },
+        status_code=200 if cleared else 404,
+        media_type="application/json"
+    )
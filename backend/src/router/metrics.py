@@ -0,0 +1,21 @@
+"""
+router/metrics.py
+运行指标 路由
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from src import metrics
+
+
+metrics_router = APIRouter(prefix="/metrics")
+
+
+@metrics_router.get("/")
+async def get_metrics():
+    """
+    获取进程内的运行指标快照
+    """
+
+    return JSONResponse( content={ "success": True, "data": metrics.snapshot() }, status_code=200, media_type="application/json" )
@@ -3,10 +3,14 @@ router/triager.py
 智能分诊功能 路由
 """
 
-from pydantic import BaseModel, Field
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+import asyncio
 
+from pydantic import BaseModel, Field, ValidationError
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from src.cancellation import ClientDisconnected, run_request
+from src.config.general import BATCH_TRIAGE_MAX_ITEMS, BATCH_ROUTES_MAX_ITEMS, REQUEST_DEADLINES, ROUTING_OBJECTIVE_TYPES
 from src.smart_triager.typedef import *
 from src.smart_triager.triager.workflow import (
     collect_conditions as collect_conditions_workflow,
@@ -14,14 +18,40 @@ from src.smart_triager.triager.workflow import (
     collect_requirement as collect_requirement_workflow,
     patch_route as patch_route_workflow,
     modify_route as modify_route_workflow,
+    advance_session as advance_session_workflow,
+    triage_batch as triage_batch_workflow,
 )
-from src.map.tools import map
-from src.smart_triager.car.parser import parse_route_to_commands
+from src.smart_triager.triager.route_optimizer import optimize_route
+from src.smart_triager.session_store import get_session_store
+from src.smart_triager.car.parser import get_route_commands, stream_route_commands
+from src.smart_triager.car.kinematics import simulate_commands, plan_routes, format_eta
+from src.smart_triager.car.typedef import KinematicProfile
+from src.map.typedef import Position
 
 
 triager_router = APIRouter(prefix="/triager")
 
 
+def _deadline_exceeded_response() -> JSONResponse:
+    """超过截止时间 正在进行的生成已被取消"""
+
+    return JSONResponse(
+        content={ "success": False, "error": "Deadline exceeded." },
+        status_code=504,
+        media_type="application/json"
+    )
+
+
+def _client_disconnected_response() -> JSONResponse:
+    """客户端已经断开 这个响应实际上不会被收到 仅用于结束请求处理"""
+
+    return JSONResponse(
+        content={ "success": False, "error": "Client disconnected." },
+        status_code=499,
+        media_type="application/json"
+    )
+
+
 class GetRoutePatchRequest(BaseModel):
     """
     获取路线修改方案的请求体
@@ -72,17 +102,75 @@ class PatchRouteRequest(BaseModel):
     online_model: bool = Field(default=True, description="是否使用在线模型进行路线修改")
 
 
+class BatchTriageRequest(BaseModel):
+    """
+    批量分诊的请求体
+    """
+
+    user_inputs: list[str] = Field(..., description="多位患者的病症描述", min_length=1, max_length=BATCH_TRIAGE_MAX_ITEMS)
+    online_model: bool = Field(default=True, description="是否使用在线模型")
+
+
+class SessionTurnRequest(BaseModel):
+    """
+    多轮分诊会话中一轮输入的请求体
+    """
+
+    session_id: str | None = Field(default=None, description="会话ID 为空时新建会话")
+
+    user_input: str = Field(..., description="患者这一轮说的话")
+
+    origin_route: list[LocationLink] | None = Field(default=None, description="原路线列表 新建会话时必填")
+
+    online_model: bool = Field(default=True, description="是否使用在线模型 只在新建会话时生效")
+
+
+class OptimizeRouteRequest(BaseModel):
+    """
+    优化路线访问顺序的请求体
+    """
+
+    origin_route: list[LocationLink] = Field(..., description="原路线列表")
+    patches: list[LocationLinkPatch] = Field(default_factory=list, description="路线修改方案")
+    requirement_summary: list[Requirement] = Field(default_factory=list, description="用户需求摘要列表")
+
+
 class ParseCommandsRequest(BaseModel):
     """
     解析路线为小车移动指令的请求体
     """
     origin_route: list[LocationLink] = Field(..., description="原始路线列表")
+    objective: ROUTING_OBJECTIVE_TYPES | None = Field(default=None, description="优化目标 distance: 距离最短 / time: 考虑转向代价的执行时间最短 为空时使用服务端配置")
+    position: Position | None = Field(default=None, description="小车当前的坐标 给出时从离它最近的节点出发")
     # 注意：与现有API保持一致，可能添加online_model参数，但当前不需要
 
 
+class EstimateEtaRequest(BaseModel):
+    """
+    估计小车走完路线所需时间的请求体
+    """
+
+    origin_route: list[LocationLink] = Field(..., description="路线列表")
+    objective: ROUTING_OBJECTIVE_TYPES | None = Field(default=None, description="优化目标 为空时使用服务端配置")
+    position: Position | None = Field(default=None, description="小车当前的坐标 给出时从离它最近的节点出发")
+    profile: KinematicProfile | None = Field(default=None, description="小车运动学参数 为空时使用服务端配置")
+
+
+class PlanRoutesRequest(BaseModel):
+    """
+    批量规划候选路线的请求体
+    """
+
+    routes: list[list[LocationLink]] = Field(..., description="候选路线列表", min_length=1, max_length=BATCH_ROUTES_MAX_ITEMS)
+    objective: ROUTING_OBJECTIVE_TYPES | None = Field(default=None, description="优化目标 为空时使用服务端配置")
+    position: Position | None = Field(default=None, description="小车当前的坐标 给出时每条路线都从离它最近的节点出发")
+    profile: KinematicProfile | None = Field(default=None, description="小车运动学参数 为空时使用服务端配置")
+
+
 @triager_router.post("/get_route_patch/")
 async def get_route_patch(
-    request: GetRoutePatchRequest
+    request: GetRoutePatchRequest,
+    raw_request: Request
 ):
     """
     根据用户输入的需求，生成对原路线的修改方案
@@ -94,7 +182,12 @@ async def get_route_patch(
     online_model = request.online_model
 
     # 调用工作流函数 获取路线修改方案
-    rsp = await modify_route_workflow(user_input, origin_route, online_model)
+    try:
+        rsp = await run_request(raw_request, modify_route_workflow(user_input, origin_route, online_model), REQUEST_DEADLINES["get_route_patch"])
+    except TimeoutError:
+        return _deadline_exceeded_response()
+    except ClientDisconnected:
+        return _client_disconnected_response()
 
     if rsp:
         # 能够**正常**获取返回值 直接退出返回
@@ -114,7 +207,8 @@ async def get_route_patch(
 
 @triager_router.post("/collect_conditions/")
 async def collect_conditions(
-    request: CollectConditionsRequest
+    request: CollectConditionsRequest,
+    raw_request: Request
 ):
     """
     从用户输入中提取结构化症状信息
@@ -123,7 +217,12 @@ async def collect_conditions(
     user_input = request.user_input
     online_model = request.online_model
 
-    rsp = await collect_conditions_workflow(user_input, online_model)
+    try:
+        rsp = await run_request(raw_request, collect_conditions_workflow(user_input, online_model), REQUEST_DEADLINES["collect_conditions"])
+    except TimeoutError:
+        return _deadline_exceeded_response()
+    except ClientDisconnected:
+        return _client_disconnected_response()
 
     if rsp:
         return JSONResponse(
@@ -141,7 +240,8 @@ async def collect_conditions(
 
 @triager_router.post("/select_clinic/")
 async def select_clinic(
-    request: SelectClinicRequest
+    request: SelectClinicRequest,
+    raw_request: Request
 ):
     """
     根据结构化症状信息选择诊室
@@ -150,7 +250,12 @@ async def select_clinic(
     conditions = request.conditions
     online_model = request.online_model
 
-    rsp = await select_clinic_workflow(conditions, online_model)
+    try:
+        rsp = await run_request(raw_request, select_clinic_workflow(conditions, online_model), REQUEST_DEADLINES["select_clinic"])
+    except TimeoutError:
+        return _deadline_exceeded_response()
+    except ClientDisconnected:
+        return _client_disconnected_response()
 
     if rsp:
         return JSONResponse(
@@ -168,7 +273,8 @@ async def select_clinic(
 
 @triager_router.post("/collect_requirement/")
 async def collect_requirement(
-    request: CollectRequirementRequest
+    request: CollectRequirementRequest,
+    raw_request: Request
 ):
     """
     从用户输入中提取个性化需求
@@ -177,7 +283,12 @@ async def collect_requirement(
     user_input = request.user_input
     online_model = request.online_model
 
-    rsp = await collect_requirement_workflow(user_input, online_model)
+    try:
+        rsp = await run_request(raw_request, collect_requirement_workflow(user_input, online_model), REQUEST_DEADLINES["collect_requirement"])
+    except TimeoutError:
+        return _deadline_exceeded_response()
+    except ClientDisconnected:
+        return _client_disconnected_response()
 
     if rsp:
         return JSONResponse(
@@ -195,7 +306,8 @@ async def collect_requirement(
 
 @triager_router.post("/patch_route/")
 async def patch_route(
-    request: PatchRouteRequest
+    request: PatchRouteRequest,
+    raw_request: Request
 ):
     """
     根据目的地诊室和需求摘要修改原路线
@@ -206,7 +318,12 @@ async def patch_route(
     origin_route = request.origin_route
     online_model = request.online_model
 
-    rsp = await patch_route_workflow(destination_clinic_id, requirement_summary, origin_route, online_model)
+    try:
+        rsp = await run_request(raw_request, patch_route_workflow(destination_clinic_id, requirement_summary, origin_route, online_model), REQUEST_DEADLINES["patch_route"])
+    except TimeoutError:
+        return _deadline_exceeded_response()
+    except ClientDisconnected:
+        return _client_disconnected_response()
 
     if rsp:
         return JSONResponse(
@@ -222,6 +339,148 @@ async def patch_route(
         )
 
 
+@triager_router.post("/batch/")
+async def batch_triage(
+    request: BatchTriageRequest
+):
+    """
+    批量分诊：对每位患者收集症状并选择诊室
+
+    以 NDJSON 流式返回，每完成一位患者输出一行，`index` 对应请求中的下标，
+    单个患者失败只体现在该行的 `success` / `error` 中。
+    """
+
+    async def generate():
+        async for item in triage_batch_workflow(request.user_inputs, request.online_model):
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(generate(), status_code=200, media_type="application/x-ndjson")
+
+
+def _session_not_found_response() -> JSONResponse:
+    """会话不存在或者已经过期"""
+
+    return JSONResponse(
+        content={ "success": False, "error": "Session not found or expired." },
+        status_code=404,
+        media_type="application/json"
+    )
+
+
+@triager_router.post("/session/")
+async def session_turn(
+    request: SessionTurnRequest,
+    raw_request: Request
+):
+    """
+    多轮分诊会话：提交患者的一句话
+
+    不带 `session_id` 时新建会话；之后患者补充的信息（例如“哦对了，我还发烧了”）只需要发送这一句，
+    服务端只重新执行受影响的阶段。失败时会话保持在这一轮之前的状态。
+    """
+
+    store = get_session_store()
+
+    if request.session_id is None:
+        if request.origin_route is None:
+            return JSONResponse(
+                content={ "success": False, "error": "origin_route is required when creating a session." },
+                status_code=400,
+                media_type="application/json"
+            )
+        session = await asyncio.to_thread(store.create, request.origin_route, request.online_model)
+    else:
+        session = await asyncio.to_thread(store.get, request.session_id)
+        if session is None:
+            return _session_not_found_response()
+
+    async with store.lock(session.session_id):
+        if request.session_id is not None:
+            # 拿到锁之后重新读取 前一轮可能刚刚更新过会话
+            session = await asyncio.to_thread(store.get, session.session_id)
+            if session is None:
+                return _session_not_found_response()
+
+        try:
+            rerun = await run_request(raw_request, advance_session_workflow(session, request.user_input), REQUEST_DEADLINES["session"])
+        except TimeoutError:
+            return _deadline_exceeded_response()
+        except ClientDisconnected:
+            return _client_disconnected_response()
+        except ValueError as e:
+            return JSONResponse(
+                content={ "success": False, "error": str(e) },
+                status_code=500,
+                media_type="application/json"
+            )
+
+        # 启用 sqlite 时需要写盘 放到线程里 不阻塞事件循环
+        await asyncio.to_thread(store.put, session)
+
+    return JSONResponse(
+        content={ "success": True, "data": { "session": session.model_dump(), "rerun_stages": rerun } },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@triager_router.get("/session/{session_id}/")
+async def get_session(session_id: str):
+    """
+    获取会话的当前状态
+    """
+
+    session = await asyncio.to_thread(get_session_store().get, session_id)
+    if session is None:
+        return _session_not_found_response()
+
+    return JSONResponse(
+        content={ "success": True, "data": session.model_dump() },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@triager_router.delete("/session/{session_id}/")
+async def delete_session(session_id: str):
+    """
+    结束会话
+    """
+
+    if not await asyncio.to_thread(get_session_store().delete, session_id):
+        return _session_not_found_response()
+
+    return JSONResponse(
+        content={ "success": True, "data": None },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@triager_router.post("/optimize_route/")
+async def optimize_route_order(
+    request: OptimizeRouteRequest
+):
+    """
+    应用路线修改方案 并按需求的时机重新安排额外停靠点的访问顺序 使总步行距离最短
+    """
+
+    try:
+        optimized = optimize_route(request.origin_route, request.patches, request.requirement_summary)
+    except ValueError as e:
+        return JSONResponse(
+            content={ "success": False, "error": str(e) },
+            status_code=400,
+            media_type="application/json"
+        )
+
+    return JSONResponse(
+        content={ "success": True, "data": optimized.model_dump() },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
 @triager_router.post("/parse_commands/")
 async def parse_commands(
     request: ParseCommandsRequest
@@ -232,8 +491,8 @@ async def parse_commands(
     origin_route = request.origin_route
 
     try:
-        # 调用路径解析器
-        commands = parse_route_to_commands(origin_route, map)
+        # 调用路径解析器 缓存未命中时需要在地图上搜索 放到线程里 不阻塞事件循环
+        commands = await asyncio.to_thread(get_route_commands, origin_route, request.objective, request.position)
 
         return JSONResponse(
             content={"success": True, "data": commands.model_dump()},
@@ -255,3 +514,102 @@ async def parse_commands(
             media_type="application/json"
         )
 
+
+@triager_router.post("/estimate_eta/")
+async def estimate_eta(
+    request: EstimateEtaRequest
+):
+    """
+    估计小车走完路线所需的时间 返回逐个动作的时间线、总用时与给患者看的提示（例如「预计 3 分钟到达」）
+    """
+
+    try:
+        commands = await asyncio.to_thread(get_route_commands, request.origin_route, request.objective, request.position)
+    except ValueError as e:
+        return JSONResponse(
+            content={ "success": False, "error": str(e) },
+            status_code=400,
+            media_type="application/json"
+        )
+
+    estimate = simulate_commands(commands, request.profile)
+
+    return JSONResponse(
+        content={
+            "success": True,
+            "data": { **estimate.model_dump(mode="json"), "message": format_eta(estimate.total_seconds) }
+        },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@triager_router.post("/plan_routes/")
+async def plan_routes_batch(
+    request: PlanRoutesRequest
+):
+    """
+    批量把候选路线转换为小车移动指令 返回每条路线的指令、总距离、转向次数与预计用时
+
+    所有路线在同一版本的地图上计算，共有的路段只展开一次；
+    结果与请求中的路线一一对应，单条路线失败（例如无法到达）只体现在该项的 `success` / `error` 中。
+    """
+
+    # 路线很多时需要一些时间 放到线程里 不阻塞事件循环
+    plans = await asyncio.to_thread(plan_routes, request.routes, request.objective, request.profile, request.position)
+
+    return JSONResponse(
+        content={ "success": True, "data": [plan.model_dump(mode="json") for plan in plans] },
+        status_code=200,
+        media_type="application/json"
+    )
+
+
+@triager_router.websocket("/commands/ws/")
+async def stream_commands(websocket: WebSocket):
+    """
+    向小车控制器推送移动指令 每展开一段路线就推送其中已经确定的动作
+
+    客户端发送与 `/parse_commands/` 相同的请求体（JSON 文本帧或二进制帧），服务端依次推送：
+    - `{"type": "action", "index": i, "data": CarAction}`
+    - 结束时 `{"type": "done", "count": 动作总数}`
+    - 出错时 `{"type": "error", "error": 错误信息}`（之前已经推送的动作仍然有效）
+
+    一个连接上可以依次发送多条路线。
+    """
+
+    await websocket.accept()
+
+    try:
+        while True:
+            # 文本帧与二进制帧都按 JSON 解析（`receive_json` 收到二进制帧时会抛出 KeyError 直接断开连接）
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            data = message.get("text")
+            if data is None:
+                data = message.get("bytes") or b""
+
+            try:
+                request = ParseCommandsRequest.model_validate_json(data)
+            except (ValidationError, ValueError) as e:
+                await websocket.send_json({ "type": "error", "error": f"Invalid request: {e}" })
+                continue
+
+            count = 0
+            try:
+                actions = stream_route_commands(request.origin_route, request.objective, request.position)
+                while True:
+                    # 大地图上展开一段路线可能需要跑搜索 放到线程里 不阻塞事件循环
+                    action = await asyncio.to_thread(next, actions, None)
+                    if action is None:
+                        break
+                    await websocket.send_json({ "type": "action", "index": count, "data": action.model_dump(mode="json") })
+                    count += 1
+            except ValueError as e:
+                await websocket.send_json({ "type": "error", "error": str(e) })
+                continue
+
+            await websocket.send_json({ "type": "done", "count": count })
+    except WebSocketDisconnect:
+        pass
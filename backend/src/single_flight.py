@@ -0,0 +1,153 @@
+# single_flight.py
+# 相同请求合并（single-flight）
+#
+# 同一时刻有多个完全相同的调用（例如患者连点两次按钮、前端超时重发）时，
+# 只真正执行一次，其余调用等待同一个结果。
+
+import json
+import asyncio
+import inspect
+import functools
+import unicodedata
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from pydantic import BaseModel
+
+from src import metrics
+from src.cancellation import deadline_scope
+
+
+T = TypeVar("T")
+
+
+def normalize_input(value: Any) -> str:
+    """
+    把调用参数规整成稳定的字符串 用作合并的键
+
+    - 字符串做 NFKC 规整（全角/半角统一）并压缩空白
+    - pydantic 模型、列表、字典递归处理后按键排序序列化
+
+    Args:
+        value: 任意参数
+    Returns:
+        str: 规整后的字符串
+    """
+
+    def _normalize(v: Any) -> Any:
+        if isinstance(v, BaseModel):
+            return _normalize(v.model_dump())
+        if isinstance(v, str):
+            return " ".join(unicodedata.normalize("NFKC", v).split())
+        if isinstance(v, dict):
+            return {str(k): _normalize(item) for k, item in v.items()}
+        if isinstance(v, (list, tuple)):
+            return [_normalize(item) for item in v]
+        return v
+
+    return json.dumps(_normalize(value), ensure_ascii=False, sort_keys=True, default=str)
+
+
+class _Call:
+    """
+    一次正在进行中的调用
+    """
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    按键合并进行中的相同调用
+
+    真正的工作放在独立的 Task 中执行，每个调用者通过 `asyncio.shield` 等待它；
+    某个调用者被取消（例如 HTTP 连接断开）不会影响其他调用者，
+    只有当所有调用者都离开时才会取消这项工作。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, _Call] = {}
+
+    @staticmethod
+    async def _detached(func: Callable[[], Awaitable[T]]) -> T:
+        """
+        共享的工作不继承发起者的截止时间 每个调用者各自的截止时间由自己的等待来保证
+
+        因此共享任务内部的 `check_deadline` / `remaining_time` 看不到任何截止时间；
+        截止时间完全依靠取消来执行：所有调用者都因超时或断开离开后，共享任务被取消。
+        """
+
+        with deadline_scope(None):
+            return await func()
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行 `func`，如果已有相同 `key` 的调用正在进行，则等待它的结果
+
+        Args:
+            key (Hashable): 合并键
+            func: 无参的协程工厂
+        Returns:
+            func 的返回值
+        """
+
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(self._detached(func)))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            metrics.inc("single_flight_calls_total", group=self.name)
+        else:
+            metrics.inc("single_flight_coalesced_total", group=self.name)
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # 所有调用者都已经离开 没必要继续算下去
+                call.task.cancel()
+
+    def in_flight(self) -> int:
+        """当前进行中的（去重后）调用数量"""
+
+        return len(self._calls)
+
+
+def coalesced(group: SingleFlight, key_func: Callable[[dict[str, Any]], Hashable]):
+    """
+    装饰器：让一个 async 函数的相同调用被合并
+
+    Args:
+        group (SingleFlight): 使用的合并组
+        key_func: 接收绑定后的参数字典（含默认值） 返回合并键
+    """
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> T:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return await group.do(key_func(dict(bound.arguments)), lambda: func(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+__all__ = [
+    "SingleFlight",
+    "coalesced",
+    "normalize_input",
+]
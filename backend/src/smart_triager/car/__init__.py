@@ -4,12 +4,28 @@
 将智能分诊模块生成的路线转换为小车移动指令。
 """
 
-from .parser import parse_route_to_commands
-from .typedef import CarAction, CarCommandsOutput, Orientation
+from .parser import parse_route_to_commands, get_route_commands, route_from_position, stream_route_commands
+from .typedef import CarAction, CarCommandsOutput, Orientation, KinematicProfile, ActionTiming, CarExecutionEstimate, RoutePlan, FleetTask, FleetAssignment, FleetDispatchOutput
+from .kinematics import simulate_commands, estimate_seconds, score_routes, plan_routes, format_eta
 
 __all__ = [
     "parse_route_to_commands",
+    "get_route_commands",
+    "route_from_position",
+    "stream_route_commands",
     "CarAction",
     "CarCommandsOutput",
     "Orientation",
+    "KinematicProfile",
+    "ActionTiming",
+    "CarExecutionEstimate",
+    "RoutePlan",
+    "FleetTask",
+    "FleetAssignment",
+    "FleetDispatchOutput",
+    "simulate_commands",
+    "estimate_seconds",
+    "score_routes",
+    "plan_routes",
+    "format_eta",
 ]
\ No newline at end of file
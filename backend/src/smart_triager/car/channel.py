@@ -0,0 +1,320 @@
+# smart_triager/car/channel.py
+# 与小车控制器之间的持久通道
+#
+# 每辆小车一个通道，按顺序保存还没执行完的指令批次（每批一个序号，见 `protocol.py`）：
+# - 小车在线时新批次立即发出；离线时排队，重新连上（HELLO）后从每批已执行到的位置开始重发
+# - 小车收到指令后立即回 ACK，之后每执行完一个动作再回一次 ACK（带已执行的动作数），整批执行完后从队列中移除
+# - 在线但一段时间内没有收到某批的 ACK（帧丢失）时重发
+#
+# 通道与传输方式无关：连接只需要提供「发送一段字节」与「接收一段字节」两个协程，
+# WebSocket 与 TCP 都可以接入（见 `handle_connection`）。
+
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from src import logger, metrics
+from src.config.general import CAR_CHANNEL_RETRANSMIT_TIMEOUT
+from .typedef import CarAction
+from .protocol import FrameType, Frame, FrameDecoder, decode_varint, encode_varint, encode_commands, encode_frame
+
+
+SendBytes = Callable[[bytes], Awaitable[None]]
+ReceiveBytes = Callable[[], Awaitable[bytes | None]]
+
+
+class CommandBatch:
+    """
+    一批指令
+
+    - `executed`：小车确认已经执行完的动作数
+    - `sent_at`：最近一次发出的时间 `acknowledged`：那次发出之后是否收到过 ACK
+    """
+
+    __slots__ = ("seq", "actions", "executed", "sent_at", "acknowledged", "done")
+
+    def __init__(self, seq: int, actions: list[CarAction]):
+        self.seq = seq
+        self.actions = actions
+        self.executed = 0
+        self.sent_at: float | None = None
+        self.acknowledged = False
+        self.done = asyncio.Event()
+
+
+class CarChannel:
+    """
+    一辆小车的指令通道
+
+    Args:
+        car_id (str): 小车ID
+    """
+
+    def __init__(self, car_id: str):
+        self.car_id = car_id
+        self._batches: OrderedDict[int, CommandBatch] = OrderedDict()
+        self._next_seq = 1
+        self._send: SendBytes | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._send is not None
+
+    async def _send_batch(self, batch: CommandBatch) -> None:
+        """从已执行到的位置开始发出一批指令 发送失败视为断线"""
+
+        if self._send is None:
+            return
+
+        previous = 0
+        for seq in self._batches:
+            if seq == batch.seq:
+                break
+            previous = seq
+        payload = encode_commands(batch.actions[batch.executed:], batch.executed, previous)
+        frame = encode_frame(FrameType.COMMANDS, batch.seq, payload)
+        try:
+            await self._send(frame)
+        except Exception as e:
+            logger.warning(f"Car {self.car_id} send failed, waiting for reconnect: {e}")
+            self._send = None
+            return
+
+        batch.sent_at = time.monotonic()
+        batch.acknowledged = False
+        metrics.inc("car_channel_frames_sent_total")
+        metrics.inc("car_channel_bytes_sent_total", len(frame))
+
+    async def enqueue(self, actions: list[CarAction]) -> int:
+        """
+        追加一批指令 在线时立即发出
+
+        Returns:
+            int: 这一批的序号
+        """
+
+        async with self._lock:
+            batch = CommandBatch(self._next_seq, [action.model_copy() for action in actions])
+            self._next_seq += 1
+            self._batches[batch.seq] = batch
+            if not batch.actions:
+                batch.done.set()
+                del self._batches[batch.seq]
+                return batch.seq
+            await self._send_batch(batch)
+        return batch.seq
+
+    async def attach(self, send: SendBytes) -> None:
+        """小车连上（或重新连上） 重发所有没执行完的批次"""
+
+        async with self._lock:
+            self._send = send
+            for batch in list(self._batches.values()):
+                await self._send_batch(batch)
+        logger.info(f"Car {self.car_id} connected, {len(self._batches)} pending batches resent")
+
+    def detach(self, send: SendBytes) -> None:
+        """连接断开（只在仍然是当前连接时生效 新连接可能已经替换了它）"""
+
+        if self._send is send:
+            self._send = None
+            logger.info(f"Car {self.car_id} disconnected, {len(self._batches)} batches pending")
+
+    def on_ack(self, seq: int, executed: int) -> None:
+        """
+        处理 ACK
+
+        Args:
+            seq (int): 批次序号
+            executed (int): 这一批中已经执行完的动作数
+        """
+
+        batch = self._batches.get(seq)
+        if batch is None:
+            return # 已经完成的批次 重复的 ACK
+
+        batch.acknowledged = True
+        batch.executed = max(batch.executed, min(executed, len(batch.actions)))
+        if batch.executed == len(batch.actions):
+            del self._batches[seq]
+            batch.done.set()
+            metrics.inc("car_channel_batches_completed_total")
+
+    async def retransmit(self, timeout: float) -> int:
+        """
+        重发发出后超过 `timeout` 秒还没有收到 ACK 的批次
+
+        Returns:
+            int: 重发的批次数
+        """
+
+        now = time.monotonic()
+        count = 0
+        async with self._lock:
+            for batch in list(self._batches.values()):
+                if not batch.acknowledged and batch.sent_at is not None and now - batch.sent_at >= timeout:
+                    await self._send_batch(batch)
+                    count += 1
+        if count:
+            metrics.inc("car_channel_retransmits_total", count)
+        return count
+
+    async def wait_executed(self, seq: int, timeout: float | None = None) -> bool:
+        """
+        等待某一批指令执行完
+
+        Returns:
+            bool: 是否在超时前执行完
+        """
+
+        batch = self._batches.get(seq)
+        if batch is None:
+            return seq < self._next_seq
+        try:
+            await asyncio.wait_for(batch.done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def status(self) -> dict:
+        """通道状态"""
+
+        return {
+            "car_id": self.car_id,
+            "connected": self.connected,
+            "pending": [
+                { "seq": batch.seq, "actions": len(batch.actions), "executed": batch.executed }
+                for batch in self._batches.values()
+            ],
+        }
+
+
+class CarChannelManager:
+    """
+    所有小车的指令通道
+    """
+
+    def __init__(self):
+        self._channels: dict[str, CarChannel] = {}
+
+    def channel(self, car_id: str) -> CarChannel:
+        """获取小车的通道 没有时创建（小车还没连上时也可以先排队）"""
+
+        channel = self._channels.get(car_id)
+        if channel is None:
+            channel = self._channels[car_id] = CarChannel(car_id)
+        return channel
+
+    def find(self, car_id: str) -> CarChannel | None:
+        """获取已有的通道 不创建（只读的查询用 避免任意 ID 的请求不断新建通道）"""
+
+        return self._channels.get(car_id)
+
+    def channels(self) -> list[CarChannel]:
+        return list(self._channels.values())
+
+    async def handle_connection(self, receive: ReceiveBytes, send: SendBytes) -> str | None:
+        """
+        处理一个小车连接直到断开 第一帧必须是 HELLO
+
+        Args:
+            receive (ReceiveBytes): 接收一段字节 连接关闭时返回 None
+            send (SendBytes): 发送一段字节
+        Returns:
+            str | None: 小车ID 没有收到 HELLO 就断开时为 None
+        """
+
+        decoder = FrameDecoder()
+        channel: CarChannel | None = None
+
+        try:
+            while True:
+                data = await receive()
+                if data is None:
+                    break
+                for frame in decoder.feed(data):
+                    if frame.type == FrameType.HELLO:
+                        if channel is not None:
+                            channel.detach(send)
+                        channel = self.channel(frame.payload.decode("utf-8", errors="replace"))
+                        await channel.attach(send)
+                    elif channel is None:
+                        logger.warning(f"Car frame before HELLO ignored: {frame}")
+                    elif frame.type == FrameType.ACK:
+                        self._handle_ack(channel, frame)
+        finally:
+            if channel is not None:
+                channel.detach(send)
+
+        return channel.car_id if channel is not None else None
+
+    @staticmethod
+    def _handle_ack(channel: CarChannel, frame: Frame) -> None:
+        try:
+            executed, _ = decode_varint(frame.payload)
+        except ValueError:
+            logger.warning(f"Invalid ACK from car {channel.car_id}: {frame}")
+            return
+        channel.on_ack(frame.seq, executed)
+
+    async def watch(self, interval: float) -> None:
+        """
+        定期重发超时没有收到 ACK 的批次
+
+        Args:
+            interval (float): 检查间隔（秒）
+        """
+
+        while True:
+            await asyncio.sleep(interval)
+            for channel in self.channels():
+                if channel.connected:
+                    await channel.retransmit(CAR_CHANNEL_RETRANSMIT_TIMEOUT)
+
+
+def encode_ack(seq: int, executed: int) -> bytes:
+    """小车一侧：组装 ACK 帧"""
+
+    return encode_frame(FrameType.ACK, seq, encode_varint(executed))
+
+
+def encode_hello(car_id: str) -> bytes:
+    """小车一侧：组装 HELLO 帧"""
+
+    return encode_frame(FrameType.HELLO, 0, car_id.encode("utf-8"))
+
+
+car_channel_manager: CarChannelManager | None = None
+
+
+def _build_car_channel_manager():
+    """
+    初始化小车通道管理器
+    """
+
+    global car_channel_manager
+
+    car_channel_manager = CarChannelManager()
+
+
+def get_car_channel_manager() -> CarChannelManager:
+    """获取小车通道管理器实例"""
+
+    global car_channel_manager
+
+    if car_channel_manager is None:
+        _build_car_channel_manager()
+
+    return car_channel_manager
+
+
+__all__ = [
+    "CommandBatch",
+    "CarChannel",
+    "CarChannelManager",
+    "encode_ack",
+    "encode_hello",
+    "get_car_channel_manager",
+]
@@ -0,0 +1,175 @@
+# smart_triager/car/command_cache.py
+# 小车指令序列的缓存
+#
+# 同一条路线在同一版本的地图上生成的指令总是相同的，按（地图版本, 优化目标, 路线）缓存。
+# 每条缓存记录它经过的边：这些边被临时封闭或加权后只让相关的记录失效；
+# 有边的费用变小（解除封闭等）时任何路线都可能变短，整个缓存失效。
+# 每次失效都会增加代数：在失效之前开始计算的指令（可能用的是调整前的最短路径）不再写入缓存。
+
+import threading
+from collections import OrderedDict
+
+from src import metrics
+from src.config.general import CAR_COMMAND_CACHE_ENTRIES
+from src.map.edge_weights import EdgeKey, get_edge_weights
+from src.map.registry import get_map_registry
+from src.smart_triager.typedef import LocationLink
+from .typedef import CarCommandsOutput
+
+
+RouteKey = tuple[str, tuple[tuple[str, str], ...]]
+CacheKey = tuple[int, RouteKey]
+
+
+def route_key(route: list[LocationLink], objective: str) -> RouteKey:
+    """路线的缓存键（同一条路线按不同的优化目标会展开成不同的路径）"""
+
+    return (objective, tuple((link.this, link.next) for link in route))
+
+
+class CommandCache:
+    """
+    LRU 指令缓存
+
+    Args:
+        max_entries (int): 最多缓存的路线数
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[CacheKey, tuple[CarCommandsOutput, set[EdgeKey]]] = OrderedDict()
+        self._by_edge: dict[EdgeKey, set[CacheKey]] = {}
+        self._lock = threading.Lock()
+        self._generation = 0 # 失效的次数
+
+    @property
+    def generation(self) -> int:
+        """当前的失效代数 计算指令之前取一次 写入缓存时传回 `put`"""
+
+        return self._generation
+
+    def get(self, version: int, route: RouteKey) -> CarCommandsOutput | None:
+        """
+        查询缓存 返回副本（调用方可以随意修改）
+        """
+
+        with self._lock:
+            entry = self._entries.get((version, route))
+            if entry is None:
+                metrics.inc("car_command_cache_misses_total")
+                return None
+            self._entries.move_to_end((version, route))
+        metrics.inc("car_command_cache_hits_total")
+        return entry[0].model_copy(deep=True)
+
+    def put(
+        self,
+        version: int,
+        route: RouteKey,
+        commands: CarCommandsOutput,
+        edges: set[EdgeKey],
+        generation: int | None = None
+    ) -> bool:
+        """
+        写入缓存
+
+        Args:
+            version (int): 地图版本
+            route (RouteKey): 路线
+            commands (CarCommandsOutput): 指令序列
+            edges (set[EdgeKey]): 路线经过的边
+            generation (int | None): 开始计算指令之前的 `generation` 之后缓存失效过时不写入
+        Returns:
+            bool: 是否写入
+        """
+
+        key = (version, route)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                metrics.inc("car_command_cache_stale_puts_total")
+                return False
+            self._remove(key)
+            self._entries[key] = (commands.model_copy(deep=True), edges)
+            for edge in edges:
+                self._by_edge.setdefault(edge, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+        return True
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for edge in entry[1]:
+            keys = self._by_edge.get(edge)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_edge[edge]
+
+    def invalidate_edges(self, edges: set[EdgeKey], relaxed: bool = False) -> int:
+        """
+        让经过这些边的缓存失效
+
+        Args:
+            edges (set[EdgeKey]): 发生变化的边
+            relaxed (bool): 是否有边的费用变小 为 True 时清空整个缓存
+        Returns:
+            int: 失效的记录数
+        """
+
+        with self._lock:
+            self._generation += 1
+            if relaxed:
+                count = len(self._entries)
+                self._entries.clear()
+                self._by_edge.clear()
+            else:
+                keys = set().union(*(self._by_edge.get(edge, set()) for edge in edges))
+                for key in keys:
+                    self._remove(key)
+                count = len(keys)
+
+        metrics.inc("car_command_cache_invalidations_total", count)
+        return count
+
+    def clear(self) -> None:
+        """清空缓存"""
+
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_edge.clear()
+
+
+command_cache: CommandCache | None = None
+
+
+def _build_command_cache():
+    """
+    初始化指令缓存 边的调整变化或者换地图时失效
+    """
+
+    global command_cache
+
+    command_cache = CommandCache(CAR_COMMAND_CACHE_ENTRIES)
+    get_edge_weights().add_listener(command_cache.invalidate_edges)
+    get_map_registry().add_listener(lambda snapshot: command_cache.clear())
+
+
+def get_command_cache() -> CommandCache:
+    """获取指令缓存实例"""
+
+    global command_cache
+
+    if command_cache is None:
+        _build_command_cache()
+
+    return command_cache
+
+
+__all__ = [
+    "CommandCache",
+    "route_key",
+    "get_command_cache",
+]
@@ -0,0 +1,626 @@
+# smart_triager/car/fleet.py
+# 多辆导引小车的调度：按预计到达时间分配任务 在时间展开图上规划互不冲突的路线
+#
+# 导航节点（走廊）和边同一时刻只能有一辆小车；主节点是房间 / 站点，可以同时停放多辆，不做预约。
+#
+# - 分配：空闲小车到各个任务起点（接患者的地方）的预计用时组成矩阵，每次取用时最短的（小车, 任务）对
+# - 规划（优先级规划）：按分配的先后依次规划，后规划的小车避开之前的小车已经预约的（节点, 时间步）和（边, 时间步）。
+#   每一段在时间展开图上搜索：小车可以在节点上原地等待、转向（原地占用节点）后沿一条边前进。
+#   为了不逐个时间步展开，用安全区间路径规划（SIPP）：把每个导航节点没有被预约的时间合并为若干空闲区间，
+#   状态为（节点, 车头朝向, 空闲区间），A* 的启发函数为到终点的最短距离按最高速度折算的时间步数
+# - 输出：每辆小车的 `CarCommandsOutput`，需要避让的地方在动作上带等待时间（`CarAction.wait`）
+#
+# 时间按 `FLEET_TIME_STEP` 离散化，行驶按最高速度匀速估计（不计加减速），
+# 预约在占用时间前后各多留 `FLEET_RESERVATION_MARGIN` 步，吸收实际执行时的偏差。
+# 停在走廊里的空闲小车（以及终点在导航节点上的小车到达之后）一直占用所在的节点，直到被分配新的任务。
+# 边的临时调整同样生效：封闭的边不能通过，加权（拥堵）的边按加权后的费用计算通过时间。
+
+import math
+import time
+import heapq
+import threading
+
+from src import logger
+from src.config.general import (
+    FLEET_TIME_STEP,
+    FLEET_RESERVATION_MARGIN,
+    FLEET_MAX_DELAY_SECONDS,
+    FLEET_MAX_EXPANSIONS,
+)
+from src.map import Map, get_compiled_map
+from src.map.compiled import CompiledGraph, CompiledMap, UNREACHABLE, NO_HEADING
+from src.map.registry import current_map
+from .typedef import Orientation, CarAction, CarCommandsOutput, KinematicProfile, FleetTask, FleetAssignment, FleetDispatchOutput
+from .parser import get_absolute_direction, get_relative_turn, merge_straight_moves
+from .kinematics import move_seconds, estimate_seconds
+
+
+class CarSchedule:
+    """
+    一辆小车的时间表（时间步为调度器时钟上的绝对值）
+
+    - `nodes`：依次经过的节点ID
+    - `arrive[i]` / `depart[i]`：到达节点 i 的时间步 / 转完向开始驶离的时间步（最后一个节点为到达时间）
+    - `waits[i]`：在节点 i 上为避让而等待的步数（不含转向）
+    """
+
+    __slots__ = ("nodes", "arrive", "depart", "waits")
+
+    def __init__(self, nodes: list[str], arrive: list[int], depart: list[int], waits: list[int]):
+        self.nodes = nodes
+        self.arrive = arrive
+        self.depart = depart
+        self.waits = waits
+
+    @property
+    def start(self) -> int:
+        return self.arrive[0]
+
+    @property
+    def finish(self) -> int:
+        return self.arrive[-1]
+
+
+FOREVER = 1 << 62 # 没有结束的时间区间
+
+
+class ReservationTable:
+    """
+    导航节点与边的时间预约表
+
+    Args:
+        graph (CompiledGraph): 编译后的图
+        margin (int): 预约在占用时间前后各多留的时间步
+    """
+
+    def __init__(self, graph: CompiledGraph, margin: int = FLEET_RESERVATION_MARGIN):
+        self.graph = graph
+        self.margin = margin
+        self._is_main: list[bool] = graph.is_main.tolist()
+        self._nodes: dict[int, set[int]] = {}
+        self._edges: dict[int, set[int]] = {}
+        self._blocked: dict[int, int] = {} # 节点 → 从这个时间步开始一直被停着的小车占用
+        self._intervals: dict[int, list[tuple[int, int]]] = {} # 节点 → 空闲区间（缓存）
+
+    def _edge(self, u: int, v: int) -> int:
+        return min(u, v) * self.graph.node_count + max(u, v)
+
+    def safe_intervals(self, node: int) -> list[tuple[int, int]]:
+        """
+        节点的空闲时间区间 [开始, 结束]（闭区间 按时间顺序） 主节点总是空闲
+
+        Returns:
+            list[tuple[int, int]]: 空闲区间列表 最后一个区间没有结束时结束为 `FOREVER`
+        """
+
+        if self._is_main[node]:
+            return [(-FOREVER, FOREVER)]
+
+        intervals = self._intervals.get(node)
+        if intervals is not None:
+            return intervals
+
+        blocked = self._blocked.get(node)
+        end = blocked - self.margin - 1 if blocked is not None else FOREVER
+        intervals = []
+        start = -FOREVER
+        for tick in sorted(self._nodes.get(node, ())):
+            if tick > end:
+                break
+            if tick > start:
+                intervals.append((start, tick - 1))
+            start = tick + 1
+        if start <= end:
+            intervals.append((start, end))
+
+        self._intervals[node] = intervals
+        return intervals
+
+    def earliest_edge_arrival(self, u: int, v: int, ticks: int, low: int, high: int) -> int | None:
+        """
+        在 [low, high] 内找最早的到达时间步 ta 使 u—v 之间的边在 [ta - ticks, ta] 内空闲
+
+        Returns:
+            int | None: 最早的到达时间步 没有时返回 None
+        """
+
+        reserved = self._edges.get(self._edge(u, v))
+        if not reserved:
+            return low if low <= high else None
+
+        arrival = low
+        while arrival <= high:
+            blocker = max((t for t in range(arrival - ticks, arrival + 1) if t in reserved), default=None)
+            if blocker is None:
+                return arrival
+            arrival = blocker + ticks + 1 # 跳到窗口刚好越过这个被占用的时间步
+        return None
+
+    def block(self, node: int, since: int) -> None:
+        if not self._is_main[node]:
+            self._blocked[node] = since
+            self._intervals.pop(node, None)
+
+    def unblock(self, node: int) -> int | None:
+        self._intervals.pop(node, None)
+        return self._blocked.pop(node, None)
+
+    def reserve(self, nodes: list[int], arrive: list[int], depart: list[int]) -> None:
+        """预约一条时间表经过的节点和边"""
+
+        for i, node in enumerate(nodes):
+            if not self._is_main[node]:
+                self._nodes.setdefault(node, set()).update(range(arrive[i] - self.margin, depart[i] + self.margin + 1))
+                self._intervals.pop(node, None)
+            if i + 1 < len(nodes):
+                ticks = self._edges.setdefault(self._edge(node, nodes[i + 1]), set())
+                ticks.update(range(depart[i] - self.margin, arrive[i + 1] + self.margin + 1))
+
+
+class _Planner:
+    """
+    在一张预约表上为一辆小车规划一段路线
+
+    安全区间路径规划（SIPP）：状态为（节点, 车头朝向, 节点的一个空闲区间），记录最早的到达时间，
+    在区间内原地等待不产生新的状态，比逐个时间步展开的状态少得多。
+    """
+
+    def __init__(self, graph: CompiledGraph, table: ReservationTable, profile: KinematicProfile, distance_row):
+        self.graph = graph
+        self.table = table
+        self.distance_row = distance_row
+        self.units_per_tick = profile.max_speed * FLEET_TIME_STEP
+        turn = math.ceil(profile.turn_seconds / FLEET_TIME_STEP)
+        self.turn_ticks = (0, turn, 2 * turn, turn) # 按逆时针相差的 90° 数 掉头为两次 90° 转向
+        self.max_delay = math.ceil(FLEET_MAX_DELAY_SECONDS / FLEET_TIME_STEP)
+
+    def heuristic(self, target: int):
+        """到终点的最短时间步数的下界 不可达的节点为 inf"""
+
+        speed = self.units_per_tick
+        row = self.distance_row(target)
+        return lambda node: math.inf if row[node] == UNREACHABLE else row[node] / speed
+
+    def plan(self, source: int, target: int, start: int, heading: int, park: bool) -> tuple[list[tuple[int, int, int, int]], int] | None:
+        """
+        规划 source→target 的一段
+
+        Args:
+            source (int): 起点下标
+            target (int): 终点下标
+            start (int): 从起点出发的最早时间步
+            heading (int): 起点处的车头朝向（`HEADINGS` 下标） 未知时为 `NO_HEADING`
+            park (bool): 到达后是否一直停在终点（最后一段）
+        Returns:
+            tuple[list[tuple[int, int, int, int]], int] | None:
+                ([(节点, 到达时间步, 等待步数, 驶离时间步), ...], 到达终点时的朝向) 超出允许的延误或搜索上限时返回 None
+        """
+
+        graph, table = self.graph, self.table
+        offsets, targets, costs = graph._offsets_list, graph._targets_list, graph._costs_list
+        headings = graph._arc_headings_list
+        units_per_tick, turn_ticks = self.units_per_tick, self.turn_ticks
+        h = self.heuristic(target)
+
+        if h(source) == math.inf:
+            return None
+        limit = start + h(source) + self.max_delay
+
+        interval = next((iv for iv in table.safe_intervals(source) if iv[0] <= start <= iv[1]), None)
+        if interval is None:
+            return None
+
+        # 状态：(节点, 朝向, 空闲区间开始, 空闲区间结束)
+        # 前驱记录 (上一个状态, 从上一个节点驶离（开始转向）的时间步, 转向步数)
+        initial = (source, heading, interval[0], interval[1])
+        arrival = {initial: start}
+        previous: dict[tuple, tuple[tuple, int, int] | None] = {initial: None}
+        closed: set[tuple] = set()
+        heap = [(start + h(source), -start, initial)]
+        expansions = 0
+
+        while heap:
+            f, negative_t, state = heapq.heappop(heap)
+            if f > limit:
+                return None
+            if state in closed:
+                continue
+            closed.add(state)
+            t = -negative_t
+            node, current_heading, _, interval_end = state
+
+            if node == target and (not park or interval_end == FOREVER):
+                return self._reconstruct(previous, arrival, state), current_heading
+
+            expansions += 1
+            if expansions > FLEET_MAX_EXPANSIONS:
+                return None
+
+            for arc in range(offsets[node], offsets[node + 1]):
+                cost = costs[arc]
+                if cost == math.inf:
+                    continue # 临时封闭
+                neighbor = targets[arc]
+                estimate = h(neighbor)
+                if estimate == math.inf:
+                    continue
+
+                arc_heading = headings[arc]
+                if arc_heading == NO_HEADING:
+                    next_heading, turn = current_heading, 0
+                else:
+                    next_heading = arc_heading
+                    turn = 0 if current_heading == NO_HEADING else turn_ticks[(arc_heading - current_heading) % 4]
+                ticks = max(1, math.ceil(cost / units_per_tick))
+
+                # 最早到达 / 最晚到达（转完向时还要在当前节点的空闲区间内）
+                low = t + turn + ticks
+                high = interval_end + ticks if interval_end != FOREVER else FOREVER
+                for next_start, next_end in table.safe_intervals(neighbor):
+                    if next_end < low:
+                        continue
+                    if next_start > high:
+                        break
+                    reach = table.earliest_edge_arrival(node, neighbor, ticks, max(low, next_start), min(high, next_end))
+                    if reach is None:
+                        continue
+                    successor = (neighbor, next_heading, next_start, next_end)
+                    if successor in closed or reach >= arrival.get(successor, math.inf):
+                        continue
+                    arrival[successor] = reach
+                    previous[successor] = (state, reach - ticks - turn, turn)
+                    heapq.heappush(heap, (reach + estimate, -reach, successor))
+
+        return None
+
+    @staticmethod
+    def _reconstruct(previous: dict, arrival: dict, state: tuple) -> list[tuple[int, int, int, int]]:
+        """把状态链整理为逐个节点的 (节点, 到达时间步, 等待步数, 驶离时间步)"""
+
+        states = [state]
+        links: list[tuple[int, int]] = []
+        while previous[states[-1]] is not None:
+            before, leave, turn = previous[states[-1]]
+            links.append((leave, turn))
+            states.append(before)
+        states.reverse()
+        links.reverse()
+
+        visits = []
+        for i, current in enumerate(states):
+            reach = arrival[current]
+            if i < len(links):
+                leave, turn = links[i]
+                visits.append((current[0], reach, leave - reach, leave + turn))
+            else:
+                visits.append((current[0], reach, 0, reach))
+        return visits
+
+
+class FleetCar:
+    """
+    调度器中的一辆小车
+
+    - `node`：空闲时所在的节点 执行任务时为出发的节点
+    - `schedule`：正在执行的时间表 空闲时为 None
+    """
+
+    __slots__ = ("car_id", "node", "task_id", "schedule")
+
+    def __init__(self, car_id: str, node: str):
+        self.car_id = car_id
+        self.node = node
+        self.task_id: str | None = None
+        self.schedule: CarSchedule | None = None
+
+
+class FleetDispatcher:
+    """
+    多车调度器 小车的时间表按调度器时钟（创建后经过的秒数）记录
+
+    Args:
+        map (Map | None): 固定使用的地图（基准测试等） 为空时使用当前地图
+    """
+
+    def __init__(self, map: Map | None = None):
+        self._map = map
+        self._cars: dict[str, FleetCar] = {}
+        self._epoch = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _compiled(self) -> CompiledMap:
+        return get_compiled_map(self._map) if self._map is not None else current_map().compiled
+
+    def now(self) -> float:
+        """调度器时钟（秒）"""
+
+        return time.monotonic() - self._epoch
+
+    def add_car(self, car_id: str, node: str) -> None:
+        """
+        加入（或者重新放置）一辆空闲小车
+
+        Raises:
+            ValueError: 节点不存在
+        """
+
+        if node not in self._compiled().index:
+            raise ValueError(f"Node not found: {node}")
+        with self._lock:
+            self._cars[car_id] = FleetCar(car_id, node)
+
+    def remove_car(self, car_id: str) -> bool:
+        with self._lock:
+            return self._cars.pop(car_id, None) is not None
+
+    def _release_finished(self, tick: int) -> None:
+        """执行完的小车停在终点 变为空闲"""
+
+        for car in self._cars.values():
+            if car.schedule is not None and car.schedule.finish <= tick:
+                car.node = car.schedule.nodes[-1]
+                car.task_id = None
+                car.schedule = None
+
+    def status(self, now: float | None = None) -> list[dict]:
+        """所有小车的状态"""
+
+        now = self.now() if now is None else now
+        with self._lock:
+            self._release_finished(math.floor(now / FLEET_TIME_STEP))
+            return [
+                {
+                    "car_id": car.car_id,
+                    "node": car.node,
+                    "busy": car.schedule is not None,
+                    "task_id": car.task_id,
+                    "finish_seconds": car.schedule.finish * FLEET_TIME_STEP - now if car.schedule is not None else None,
+                }
+                for car in self._cars.values()
+            ]
+
+    def dispatch(self, tasks: list[FleetTask], profile: KinematicProfile | None = None, now: float | None = None) -> FleetDispatchOutput:
+        """
+        把任务分配给空闲小车并规划互不冲突的路线
+
+        分配或者规划失败（超出允许的延误）的任务留到下一轮。
+
+        Args:
+            tasks (list[FleetTask]): 任务 小车先开到路线的第一个地点接上患者 再依次经过路线上的地点
+            profile (KinematicProfile | None): 运动学参数 为空时使用配置中的默认值
+            now (float | None): 调度器时钟上的当前时间（秒） 为空时取当前时刻
+        Returns:
+            FleetDispatchOutput: 每辆小车的指令与时间 以及没有分配出去的任务
+        """
+
+        profile = profile or KinematicProfile()
+        now = self.now() if now is None else now
+        tick = math.ceil(now / FLEET_TIME_STEP)
+        compiled = self._compiled()
+        graph = compiled.graph
+
+        with self._lock:
+            self._release_finished(tick)
+            table = self._build_table(graph, tick)
+
+            rows: dict[int, list] = {}
+
+            def distance_row(target: int):
+                """到 target 的最短距离（编译地图的最短路径表中有时直接取 否则跑一次 Dijkstra）"""
+
+                if target not in rows:
+                    if target in compiled.target_rows:
+                        rows[target] = compiled.distances[compiled.target_rows[target]].tolist()
+                    else:
+                        distances = graph.dijkstra(target)[0]
+                        rows[target] = [UNREACHABLE if d == math.inf else d for d in distances]
+                return rows[target]
+
+            free = [car for car in self._cars.values() if car.schedule is None and car.node in graph.index]
+            valid: list[FleetTask] = []
+            unassigned: list[str] = []
+            for task in tasks:
+                if all(node in graph.index for link in task.route for node in (link.this, link.next)):
+                    valid.append(task)
+                else:
+                    unassigned.append(task.task_id)
+
+            # 空闲小车到各个任务起点的预计用时
+            etas = [[math.inf] * len(free) for _ in valid]
+            for i, task in enumerate(valid):
+                row = distance_row(graph.index[task.route[0].this])
+                for j, car in enumerate(free):
+                    distance = row[graph.index[car.node]]
+                    if distance != UNREACHABLE:
+                        etas[i][j] = move_seconds(distance, profile)[0]
+
+            planner = _Planner(graph, table, profile, distance_row)
+            assignments: list[FleetAssignment] = []
+            pending, available = set(range(len(valid))), set(range(len(free)))
+            while pending and available:
+                eta, i, j = min(((etas[i][j], i, j) for i in pending for j in available), default=(math.inf, -1, -1))
+                if eta == math.inf:
+                    break
+
+                task, car = valid[i], free[j]
+                pending.discard(i)
+                schedule = self._plan_task(planner, table, car, task, tick)
+                if schedule is None:
+                    logger.warning(f"Fleet: no conflict-free plan for task {task.task_id} with car {car.car_id}")
+                    continue
+
+                available.discard(j)
+                car.task_id = task.task_id
+                car.schedule = schedule
+                assignments.append(self._assignment(car, task, schedule, graph, profile, now))
+
+            unassigned.extend(valid[i].task_id for i in sorted(pending))
+
+        return FleetDispatchOutput(assignments=assignments, unassigned=unassigned)
+
+    def _build_table(self, graph: CompiledGraph, tick: int) -> ReservationTable:
+        """根据正在执行的时间表和停在走廊里的小车构建预约表"""
+
+        table = ReservationTable(graph)
+        for car in self._cars.values():
+            schedule = car.schedule
+            if schedule is None:
+                if car.node in graph.index:
+                    table.block(graph.index[car.node], tick)
+                continue
+            if not all(node in graph.index for node in schedule.nodes):
+                # 换了地图 路线上的节点已经不存在 只能当作空闲
+                logger.warning(f"Fleet: schedule of car {car.car_id} dropped after map change")
+                car.schedule, car.task_id = None, None
+                continue
+            nodes = [graph.index[node] for node in schedule.nodes]
+            table.reserve(nodes, schedule.arrive, schedule.depart)
+            table.block(nodes[-1], schedule.finish)
+        return table
+
+    @staticmethod
+    def _plan_task(planner: _Planner, table: ReservationTable, car: FleetCar, task: FleetTask, tick: int) -> CarSchedule | None:
+        """依次规划 小车位置 → 接患者的地点 → 路线上的各个地点 成功后写入预约表"""
+
+        graph = planner.graph
+        source = graph.index[car.node]
+        blocked = table.unblock(source) # 小车自己停着的节点
+
+        waypoints = [task.route[0].this] + [link.next for link in task.route]
+        visits: list[tuple[int, int, int, int]] = []
+        node, heading, start = source, NO_HEADING, tick
+        for k, waypoint in enumerate(waypoints):
+            leg = planner.plan(node, graph.index[waypoint], start, heading, park=(k == len(waypoints) - 1))
+            if leg is None:
+                if blocked is not None:
+                    table.block(source, blocked)
+                return None
+            legs, heading = leg
+            if visits:
+                # 上一段的终点就是这一段的起点
+                last = visits.pop()
+                first = legs[0]
+                legs[0] = (last[0], last[1], last[2] + first[2], first[3])
+            visits.extend(legs)
+            node, start = visits[-1][0], visits[-1][1]
+
+        nodes = [visit[0] for visit in visits]
+        arrive = [visit[1] for visit in visits]
+        depart = [visit[3] for visit in visits]
+        table.reserve(nodes, arrive, depart)
+        table.block(nodes[-1], arrive[-1])
+
+        return CarSchedule(
+            nodes=[graph.node_ids[node] for node in nodes],
+            arrive=arrive,
+            depart=depart,
+            waits=[visit[2] for visit in visits],
+        )
+
+    @staticmethod
+    def _assignment(car: FleetCar, task: FleetTask, schedule: CarSchedule, graph: CompiledGraph, profile: KinematicProfile, now: float) -> FleetAssignment:
+        commands = schedule_to_commands(schedule, graph)
+        pickup = schedule.nodes.index(task.route[0].this)
+        return FleetAssignment(
+            car_id=car.car_id,
+            task_id=task.task_id,
+            commands=commands,
+            path=schedule.nodes,
+            pickup_seconds=max(0.0, schedule.arrive[pickup] * FLEET_TIME_STEP - now),
+            finish_seconds=max(0.0, schedule.finish * FLEET_TIME_STEP - now),
+            wait_seconds=sum(schedule.waits) * FLEET_TIME_STEP,
+            eta_seconds=estimate_seconds(commands, profile),
+        )
+
+    def find_conflicts(self) -> list[str]:
+        """
+        检查当前所有时间表之间的冲突（不计预约的余量） 正常情况下应该为空
+
+        Returns:
+            list[str]: 冲突的描述
+        """
+
+        graph = self._compiled().graph
+        is_main = graph.is_main.tolist()
+        nodes: dict[tuple[str, int], str] = {}
+        edges: dict[tuple[frozenset, int], str] = {}
+        conflicts = []
+
+        with self._lock:
+            schedules = [(car.car_id, car.schedule) for car in self._cars.values() if car.schedule is not None]
+
+        for car_id, schedule in schedules:
+            for i, node in enumerate(schedule.nodes):
+                if not is_main[graph.index[node]]:
+                    for t in range(schedule.arrive[i], schedule.depart[i] + 1):
+                        other = nodes.setdefault((node, t), car_id)
+                        if other != car_id:
+                            conflicts.append(f"{car_id} and {other} at node {node} tick {t}")
+                if i + 1 < len(schedule.nodes):
+                    key = frozenset((node, schedule.nodes[i + 1]))
+                    for t in range(schedule.depart[i], schedule.arrive[i + 1] + 1):
+                        other = edges.setdefault((key, t), car_id)
+                        if other != car_id:
+                            conflicts.append(f"{car_id} and {other} on edge {sorted(key)} tick {t}")
+        return conflicts
+
+
+def schedule_to_commands(schedule: CarSchedule, graph: CompiledGraph) -> CarCommandsOutput:
+    """
+    把时间表转换为小车指令 在节点上的等待放到从这个节点出发的动作上
+
+    与 `full_path_to_commands` 一样第一个动作为直行、合并连续的直行（带等待的动作不合并）。
+    坐标相同的相邻节点之间不产生动作 它的等待与通过时间并入下一个动作的等待。
+    """
+
+    xs, ys = graph._xs_list, graph._ys_list
+    actions: list[CarAction] = []
+    direction: str | None = None
+    carried = 0.0
+    for i in range(len(schedule.nodes) - 1):
+        u, v = graph.index[schedule.nodes[i]], graph.index[schedule.nodes[i + 1]]
+        dx, dy = int(xs[v] - xs[u]), int(ys[v] - ys[u])
+        wait = carried + schedule.waits[i] * FLEET_TIME_STEP
+        hop = get_absolute_direction(dx, dy)
+        if hop == "stay":
+            carried = wait + (schedule.arrive[i + 1] - schedule.arrive[i] - schedule.waits[i]) * FLEET_TIME_STEP
+            continue
+        orientation = Orientation.straight if direction is None else get_relative_turn(direction, hop)
+        actions.append(CarAction(orientation=orientation, distance=abs(dx) + abs(dy), wait=wait))
+        direction, carried = hop, 0.0
+
+    return CarCommandsOutput(actions=merge_straight_moves(actions))
+
+
+fleet_dispatcher: FleetDispatcher | None = None
+
+
+def _build_fleet_dispatcher():
+    """
+    初始化多车调度器
+    """
+
+    global fleet_dispatcher
+
+    fleet_dispatcher = FleetDispatcher()
+
+
+def get_fleet_dispatcher() -> FleetDispatcher:
+    """获取多车调度器实例"""
+
+    global fleet_dispatcher
+
+    if fleet_dispatcher is None:
+        _build_fleet_dispatcher()
+
+    return fleet_dispatcher
+
+
+__all__ = [
+    "CarSchedule",
+    "ReservationTable",
+    "FleetCar",
+    "FleetDispatcher",
+    "schedule_to_commands",
+    "get_fleet_dispatcher",
+]
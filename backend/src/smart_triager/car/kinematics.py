@@ -0,0 +1,279 @@
+# smart_triager/car/kinematics.py
+# 按运动学模型回放小车指令 估计执行时间
+#
+# 小车只在转向与等待之前停下：一个动作（转向或等待后出发）连同紧跟在它后面的直行动作
+# （`merge_straight_moves` 会保留「转向 d1、直行 d2」这样的两个动作）构成一段「静止 → 静止」的移动，
+# 从静止加速、以最高速度行驶、减速停下。这一段的用时按总距离计算，再按位置拆分到其中的各个动作上。
+# 距离不够加速到最高速度时为三角形速度曲线，最高速度为两段加减速相交处的速度。
+#
+# 动作带等待时间（多车调度的避让）时先原地等待再转向。
+# 指令中不区分 90° 转向与掉头（掉头也记为一次转向），按一次 90° 转向计时。
+
+import math
+
+from src.config.general import ROUTING_OBJECTIVE_TYPES
+from src.map import current_map
+from src.map.typedef import Position
+from src.smart_triager.typedef import LocationLink
+from .typedef import Orientation, CarAction, CarCommandsOutput, KinematicProfile, ActionTiming, CarExecutionEstimate, RoutePlan
+from .parser import get_route_commands
+
+
+_DEFAULT_PROFILE = KinematicProfile()
+
+
+def move_seconds(distance: float, profile: KinematicProfile) -> tuple[float, float]:
+    """
+    从静止出发移动一段距离并停下的用时
+
+    Args:
+        distance (float): 移动距离
+        profile (KinematicProfile): 运动学参数
+    Returns:
+        tuple[float, float]: (用时（秒）, 过程中的最高速度)
+    """
+
+    if distance <= 0:
+        return 0.0, 0.0
+
+    a, d, v = profile.acceleration, profile.deceleration, profile.max_speed
+    ramp = v * v / (2 * a) + v * v / (2 * d) # 加速到最高速度再减速到 0 需要的距离
+    if distance >= ramp:
+        return v / a + v / d + (distance - ramp) / v, v
+
+    peak = math.sqrt(2 * distance * a * d / (a + d))
+    return peak / a + peak / d, peak
+
+
+def _time_at(position: float, distance: float, profile: KinematicProfile) -> float:
+    """
+    在一段「静止 → 静止」、总长 `distance` 的移动中 到达 `position` 处的时刻（从出发算起）
+    """
+
+    if position <= 0:
+        return 0.0
+    total, peak = move_seconds(distance, profile)
+    if position >= distance:
+        return total
+
+    a, d = profile.acceleration, profile.deceleration
+    accelerate = peak * peak / (2 * a) # 加速段的距离
+    decelerate = peak * peak / (2 * d) # 减速段的距离
+    if position <= accelerate:
+        return math.sqrt(2 * position / a)
+    if position <= distance - decelerate:
+        return peak / a + (position - accelerate) / peak
+    return total - math.sqrt(2 * (distance - position) / d)
+
+
+def _stops(actions: list[CarAction]) -> list[int]:
+    """
+    每一段「静止 → 静止」移动的起始动作下标：第一个动作、转向的动作与需要等待的动作
+    """
+
+    return [
+        index for index, action in enumerate(actions)
+        if index == 0 or action.orientation != Orientation.straight or action.wait
+    ]
+
+
+def simulate_commands(
+    commands: CarCommandsOutput | list[CarAction],
+    profile: KinematicProfile | None = None
+) -> CarExecutionEstimate:
+    """
+    回放指令序列 生成逐个动作的时间线与总用时
+
+    Args:
+        commands (CarCommandsOutput | list[CarAction]): 指令序列
+        profile (KinematicProfile | None): 运动学参数 为空时使用配置中的默认值
+    Returns:
+        CarExecutionEstimate: 时间估计
+    """
+
+    profile = profile or _DEFAULT_PROFILE
+    actions = commands.actions if isinstance(commands, CarCommandsOutput) else commands
+
+    timeline: list[ActionTiming] = []
+    now = 0.0
+    distance = 0
+    turns = 0
+    stops = _stops(actions)
+    for start, stop in zip(stops, stops[1:] + [len(actions)]):
+        segment = sum(action.distance for action in actions[start:stop])
+        peak = move_seconds(segment, profile)[1]
+        travelled = 0
+        for index in range(start, stop):
+            action = actions[index]
+            turn = profile.turn_seconds if action.orientation != Orientation.straight else 0.0
+            move = _time_at(travelled + action.distance, segment, profile) - _time_at(travelled, segment, profile)
+            travelled += action.distance
+            end = now + action.wait + turn + move
+            timeline.append(ActionTiming(
+                index=index,
+                orientation=action.orientation,
+                distance=action.distance,
+                start=now,
+                wait_seconds=action.wait,
+                turn_seconds=turn,
+                move_seconds=move,
+                end=end,
+                peak_speed=peak,
+            ))
+            now = end
+            distance += action.distance
+            turns += action.orientation != Orientation.straight
+
+    return CarExecutionEstimate(timeline=timeline, total_seconds=now, distance=distance, turns=turns)
+
+
+def estimate_seconds(
+    commands: CarCommandsOutput | list[CarAction],
+    profile: KinematicProfile | None = None
+) -> float:
+    """
+    只计算总用时 不生成时间线（批量给候选路线打分时用）
+
+    同一串指令中相同距离的「静止 → 静止」移动只计算一次。
+    """
+
+    profile = profile or _DEFAULT_PROFILE
+    actions = commands.actions if isinstance(commands, CarCommandsOutput) else commands
+    return _summarize(actions, profile, {})[2]
+
+
+def _summarize(actions: list[CarAction], profile: KinematicProfile, moves: dict[int, float]) -> tuple[int, int, float]:
+    """
+    一次遍历得到 (总距离, 转向次数, 总用时) `moves` 缓存每种距离的移动用时 可以在多条路线之间共用
+
+    直行动作并入前一段移动 每段「静止 → 静止」的移动按总距离计时一次。
+    """
+
+    distance = 0
+    turns = 0
+    total = 0.0
+    segment = 0
+    for index, action in enumerate(actions):
+        if index > 0 and (action.orientation != Orientation.straight or action.wait):
+            total += _segment_seconds(segment, profile, moves)
+            segment = 0
+        segment += action.distance
+        distance += action.distance
+        total += action.wait
+        if action.orientation != Orientation.straight:
+            turns += 1
+            total += profile.turn_seconds
+    total += _segment_seconds(segment, profile, moves)
+    return distance, turns, total
+
+
+def _segment_seconds(distance: int, profile: KinematicProfile, moves: dict[int, float]) -> float:
+    move = moves.get(distance)
+    if move is None:
+        move = moves[distance] = move_seconds(distance, profile)[0]
+    return move
+
+
+def score_routes(
+    routes: list[list[LocationLink]],
+    objective: ROUTING_OBJECTIVE_TYPES | None = None,
+    profile: KinematicProfile | None = None,
+    position: Position | None = None
+) -> list[float]:
+    """
+    在当前地图上批量估计候选路线的执行时间（例如访问顺序优化给出的几种方案）
+
+    指令通过 `get_route_commands` 生成 相同的路线命中指令缓存。
+
+    Args:
+        routes (list[list[LocationLink]]): 候选路线
+        objective (ROUTING_OBJECTIVE_TYPES | None): 优化目标 为空时使用服务端配置
+        profile (KinematicProfile | None): 运动学参数 为空时使用配置中的默认值
+        position (Position | None): 小车当前的坐标 给出时从离它最近的节点出发
+    Returns:
+        list[float]: 每条路线的预计用时（秒） 无法到达的路线为 inf
+    """
+
+    scores = []
+    for route in routes:
+        try:
+            commands = get_route_commands(route, objective, position)
+        except ValueError:
+            scores.append(math.inf)
+            continue
+        scores.append(estimate_seconds(commands, profile))
+    return scores
+
+
+def plan_routes(
+    routes: list[list[LocationLink]],
+    objective: ROUTING_OBJECTIVE_TYPES | None = None,
+    profile: KinematicProfile | None = None,
+    position: Position | None = None
+) -> list[RoutePlan]:
+    """
+    批量把候选路线转换为指令 并给出每条路线的总距离、转向次数与预计用时（调度面板为每位患者挑选路线时用）
+
+    所有路线在同一个地图快照上计算：请求中重复的路线只计算一次，
+    不同路线共有的主节点点对通过指令段表（见 `segments.py`）只展开一次，整条路线的指令命中指令缓存；
+    距离、转向与用时在一次遍历中得到，各种距离的移动用时在整批路线之间共用。
+
+    Args:
+        routes (list[list[LocationLink]]): 候选路线
+        objective (ROUTING_OBJECTIVE_TYPES | None): 优化目标 为空时使用服务端配置
+        profile (KinematicProfile | None): 运动学参数 为空时使用配置中的默认值
+        position (Position | None): 小车当前的坐标 给出时每条路线都从离它最近的节点出发
+    Returns:
+        list[RoutePlan]: 与 `routes` 一一对应的结果 单条路线失败只体现在它的 `success` / `error` 中
+    """
+
+    profile = profile or _DEFAULT_PROFILE
+    snapshot = current_map()
+    moves: dict[int, float] = {}
+    planned: dict[tuple[tuple[str, str], ...], RoutePlan] = {}
+
+    plans = []
+    for index, route in enumerate(routes):
+        key = tuple((link.this, link.next) for link in route)
+        plan = planned.get(key)
+        if plan is None:
+            try:
+                commands = get_route_commands(route, objective, position, snapshot)
+            except ValueError as e:
+                plan = RoutePlan(index=index, success=False, error=str(e))
+            else:
+                distance, turns, seconds = _summarize(commands.actions, profile, moves)
+                plan = RoutePlan(
+                    index=index,
+                    success=True,
+                    commands=commands,
+                    distance=distance,
+                    turns=turns,
+                    eta_seconds=seconds,
+                    eta_message=format_eta(seconds),
+                )
+            planned[key] = plan
+        plans.append(plan if plan.index == index else plan.model_copy(update={ "index": index }))
+    return plans
+
+
+def format_eta(seconds: float) -> str:
+    """
+    给患者看的预计到达时间 按分钟向上取整 例如「预计 3 分钟到达」
+    """
+
+    if seconds <= 0:
+        return "已到达"
+    if seconds < 60:
+        return "预计 1 分钟内到达"
+    return f"预计 {math.ceil(seconds / 60)} 分钟到达"
+
+
+__all__ = [
+    "move_seconds",
+    "simulate_commands",
+    "estimate_seconds",
+    "score_routes",
+    "plan_routes",
+    "format_eta",
+]
@@ -1,15 +1,22 @@
 # smart_triager/car/parser.py
 # 路径解析和指令生成
 
-from typing import Optional
-from src.map import Map, dijkstra_search
+from typing import Iterator, Optional
+
+import numpy as np
+
+from src.config.general import MAP_ROUTING_OBJECTIVE, ROUTING_OBJECTIVE_TYPES
+from src.map import Map, MapSnapshot, Position, search_path, search_path_with_turns, as_compiled_map, current_map, edge_key, nearest_node
+from src.map.compiled import CompiledMap, HEADINGS, NO_HEADING
 from src.smart_triager.typedef import LocationLink
 from .typedef import Orientation, CarAction, CarCommandsOutput
+from .command_cache import get_command_cache, route_key
 
 
 def expand_main_route_to_full_path(
     route: list[LocationLink],
-    map: Map
+    map: Map | CompiledMap,
+    objective: ROUTING_OBJECTIVE_TYPES | None = None
 ) -> list[str]:
     """
     将只包含main节点的路径扩展为包含nav节点的完整路径
@@ -17,13 +24,15 @@ def expand_main_route_to_full_path(
     步骤：
     1. 从第一个LocationLink的this节点开始
     2. 遍历每个LocationLink，对每个this→next对：
-       a. 使用dijkstra_search(this, next, map)查找最短路径
+       a. 距离最短：在编译好的最短路径表中查找最短路径（终点不在表中时退回search_path）
+          时间最短：在（节点, 朝向）状态图上搜索，上一段结束时的朝向作为下一段的初始朝向
        b. 将路径节点加入完整路径（避免重复添加连接点）
     3. 返回完整节点ID列表
 
     参数:
         route: LocationLink序列，只包含main节点
-        map: 地图数据结构
+        map: 地图数据结构（或者它的编译结果 请求路径上传入 `snapshot.compiled`）
+        objective: 优化目标 distance / time，None 表示使用配置中的 `MAP_ROUTING_OBJECTIVE`
 
     返回:
         包含main和nav节点的完整节点ID列表
@@ -34,7 +43,9 @@ def expand_main_route_to_full_path(
     if not route:
         return []
 
+    objective = objective or MAP_ROUTING_OBJECTIVE
     full_path: list[str] = []
+    heading: str | None = None
 
     # 处理第一个节点
     first_link = route[0]
@@ -42,10 +53,8 @@ def expand_main_route_to_full_path(
 
     # 遍历每个LocationLink
     for link in route:
-        # 查找this→next的最短路径
-        path = dijkstra_search(link.this, link.next, map)
-        if not path:
-            raise ValueError(f"No path found between {link.this} and {link.next}")
+        # 查找this→next的路径
+        path, heading = expand_link(link.this, link.next, map, objective, heading)
 
         # 添加路径节点（跳过第一个节点，避免重复）
         full_path.extend(path[1:])
@@ -53,6 +62,75 @@ def expand_main_route_to_full_path(
     return full_path
 
 
+def expand_link(
+    start: str,
+    end: str,
+    map: Map | CompiledMap,
+    objective: ROUTING_OBJECTIVE_TYPES,
+    heading: str | None = None
+) -> tuple[list[str], str | None]:
+    """
+    展开路线中的一段 start→end
+
+    参数:
+        start: 起点ID
+        end: 终点ID
+        map: 地图数据结构（或者它的编译结果 请求路径上传入 `snapshot.compiled`）
+        objective: 优化目标 distance / time
+        heading: 进入这一段时的车头朝向（只在 time 目标下使用）
+
+    返回:
+        (包含nav节点的路径, 走完这一段后的朝向)
+
+    异常:
+        ValueError: 如果路径不存在
+    """
+    compiled = as_compiled_map(map)
+
+    if objective == "time":
+        result = search_path_with_turns(start, end, compiled, heading)
+        path, heading = result if result is not None else (None, heading)
+    elif start in compiled.index and compiled.has_target(end):
+        path = compiled.path(start, end)
+    else:
+        path = search_path(start, end, compiled)
+    if not path:
+        raise ValueError(f"No path found between {start} and {end}")
+
+    return path, heading
+
+
+def route_from_position(
+    position: Position,
+    route: list[LocationLink],
+    map: Map | CompiledMap
+) -> list[LocationLink]:
+    """
+    让路线从任意坐标出发：把坐标吸附到最近的节点，在路线前面加上从该节点到路线起点的一段
+
+    参数:
+        position: 当前坐标（例如小车上报的位置）
+        route: LocationLink序列，只包含main节点
+        map: 地图数据结构（或者它的编译结果 请求路径上传入 `snapshot.compiled`）
+
+    返回:
+        从吸附节点出发的LocationLink序列（吸附节点就是路线起点时原样返回）
+
+    异常:
+        ValueError: 如果路线为空或地图中没有节点
+    """
+    if not route:
+        raise ValueError("Route is empty.")
+
+    snapped = nearest_node(map, position.x, position.y)
+    if snapped is None:
+        raise ValueError("Map has no nodes.")
+
+    if snapped[0] == route[0].this:
+        return route
+    return [LocationLink(this=snapped[0], next=route[0].this)] + route
+
+
 def get_absolute_direction(dx: int, dy: int) -> str:
     """
     根据坐标差计算绝对方向
@@ -113,7 +191,7 @@ def get_relative_turn(current_dir: str, target_dir: str) -> Orientation:
 
 def merge_straight_moves(actions: list[CarAction]) -> list[CarAction]:
     """
-    合并连续的straight动作
+    合并连续的straight动作（前面要等待的动作不合并）
 
     参数:
         actions: CarAction列表
@@ -127,6 +205,7 @@ def merge_straight_moves(actions: list[CarAction]) -> list[CarAction]:
     merged: list[CarAction] = []
     for action in actions:
         if (action.orientation == Orientation.straight and
+            not action.wait and
             merged and
             merged[-1].orientation == Orientation.straight):
             # 合并连续的straight动作
@@ -139,7 +218,8 @@ def merge_straight_moves(actions: list[CarAction]) -> list[CarAction]:
 
 def parse_route_to_commands(
     route: list[LocationLink],
-    map: Map
+    map: Map | CompiledMap,
+    objective: ROUTING_OBJECTIVE_TYPES | None = None
 ) -> CarCommandsOutput:
     """
     将LocationLink路径转换为小车移动指令
@@ -148,9 +228,13 @@ def parse_route_to_commands(
     1. 路径扩展：main节点 → 完整路径（包含nav节点）
     2. 指令生成：完整路径 → CarAction序列
 
+    两个阶段都按主节点对预先计算在指令段表中（见 `segments.py`），这里只拼接各段并补上连接处的转向，
+    结果与对完整路径调用 `full_path_to_commands` 相同。
+
     参数:
         route: LocationLink序列，只包含main节点
-        map: 地图数据结构
+        map: 地图数据结构（或者它的编译结果 请求路径上传入 `snapshot.compiled`）
+        objective: 优化目标 distance / time，None 表示使用配置中的 `MAP_ROUTING_OBJECTIVE`
 
     返回:
         CarCommandsOutput对象，包含小车动作序列
@@ -158,60 +242,200 @@ def parse_route_to_commands(
     异常:
         ValueError: 如果输入无效或路径处理失败
     """
-    # 阶段1：路径扩展
-    full_path = expand_main_route_to_full_path(route, map)
+    # 指令段表依赖本模块中的函数 在这里导入避免循环导入
+    from .segments import get_segment_tables
+
+    commands, _ = get_segment_tables().get(map).route_commands(route, objective)
+    return commands
+
+
+# 相邻两跳的方向差（`HEADINGS` 下标之差 mod 4，逆时针为正）→ 转向 与 `get_relative_turn` 一致，180° 记为左转
+_TURNS = [Orientation.straight, Orientation.left, Orientation.left, Orientation.right]
+
+
+def direction_name(heading: int) -> str:
+    """
+    `HEADINGS` 下标 → 绝对方向字符串（与 `get_absolute_direction` 一致），NO_HEADING 为 "stay"
+    """
+    return "stay" if heading == NO_HEADING else HEADINGS[heading]
+
+
+def path_hops(indices: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    按节点下标批量计算路径上每一跳的绝对方向与距离
+
+    坐标差先截断为整数，方向的判断与 `get_absolute_direction` 相同（x 有变化时按 x 判断东西，否则按 y 判断南北）。
+
+    参数:
+        indices: 路径上各节点在编译地图中的下标
+        xs: 编译地图中所有节点的 x 坐标
+        ys: 编译地图中所有节点的 y 坐标
+
+    返回:
+        (每一跳的方向（`HEADINGS` 下标，坐标相同为 NO_HEADING）, 每一跳的曼哈顿距离)
+    """
+    dx = np.trunc(np.diff(xs[indices])).astype(np.int64)
+    dy = np.trunc(np.diff(ys[indices])).astype(np.int64)
+    headings = np.select(
+        [dx > 0, dx < 0, dy > 0, dy < 0],
+        [HEADINGS.index("east"), HEADINGS.index("west"), HEADINGS.index("south"), HEADINGS.index("north")],
+        default=NO_HEADING,
+    )
+    return headings, np.abs(dx) + np.abs(dy)
+
+
+def hops_to_actions(headings: np.ndarray, distances: np.ndarray, heading: int = NO_HEADING) -> list[CarAction]:
+    """
+    把每一跳的方向与距离转换为合并后的小车动作
+
+    每一跳的转向由与前一跳的方向差 mod 4 得到（第一跳与进入时的朝向比较，没有朝向时为直行）；
+    直行且前一跳也是直行的跳并入前一个动作（与 `merge_straight_moves` 一致），按游程分组求和，
+    最后去掉距离为 0 的动作。只为合并后的动作构造 CarAction。
+
+    参数:
+        headings: 每一跳的方向（`HEADINGS` 下标）
+        distances: 每一跳的距离
+        heading: 进入第一跳之前的车头朝向（`HEADINGS` 下标），NO_HEADING 表示第一跳为直行
+
+    返回:
+        CarAction列表
+
+    异常:
+        ValueError: 如果路径中有坐标相同的相邻节点（只有一跳且没有进入朝向时除外）
+    """
+    if len(headings) == 0:
+        return []
+
+    if heading != NO_HEADING:
+        headings = np.concatenate(([heading], headings))
+        distances = np.concatenate(([0], distances))
+
+    stays = np.flatnonzero(headings == NO_HEADING)
+    if len(stays) and len(headings) > 1:
+        current, target = (0, 1) if stays[0] == 0 else (stays[0] - 1, stays[0])
+        raise ValueError(f"Invalid direction: current={direction_name(headings[current])}, target={direction_name(headings[target])}")
+
+    turns = np.zeros(len(headings), dtype=np.int64)
+    turns[1:] = (headings[1:] - headings[:-1]) % 4
+    if heading != NO_HEADING:
+        # 进入朝向只用来计算第一跳的转向 本身不是一个动作
+        headings, distances, turns = headings[1:], distances[1:], turns[1:]
+
+    straight = turns == 0
+    starts = np.flatnonzero(~(straight & np.concatenate(([False], straight[:-1]))))
+    merged = np.add.reduceat(distances, starts)
+    keep = merged > 0
+
+    return [
+        CarAction(orientation=_TURNS[turn], distance=distance)
+        for turn, distance in zip(turns[starts][keep].tolist(), merged[keep].tolist())
+    ]
+
+
+def full_path_to_commands(
+    full_path: list[str],
+    map: Map | CompiledMap
+) -> CarCommandsOutput:
+    """
+    将完整节点路径转换为小车移动指令
+
+    按节点下标从编译地图中批量取出坐标，用 NumPy 计算每一跳的方向、转向与合并后的距离（见 `path_hops` / `hops_to_actions`），
+    结果与逐跳调用 `get_absolute_direction` / `get_relative_turn` 再 `merge_straight_moves` 相同。
+
+    参数:
+        full_path: 包含main和nav节点的完整节点ID列表
+        map: 地图数据结构（或者它的编译结果 请求路径上传入 `snapshot.compiled`）
+
+    返回:
+        CarCommandsOutput对象，包含小车动作序列
 
+    异常:
+        ValueError: 如果节点不存在
+    """
     if len(full_path) < 2:
         # 路径至少需要两个节点
         return CarCommandsOutput(actions=[])
 
-    # 阶段2：指令生成
+    graph = as_compiled_map(map).graph
+    try:
+        indices = np.fromiter((graph.index[node_id] for node_id in full_path), dtype=np.int64, count=len(full_path))
+    except KeyError:
+        missing = next(i for i, node_id in enumerate(full_path) if node_id not in graph.index)
+        first = max(missing - 1, 0)
+        raise ValueError(f"Node not found: {full_path[first]} or {full_path[first + 1]}")
+
+    headings, distances = path_hops(indices, graph.xs, graph.ys)
+    return CarCommandsOutput(actions=hops_to_actions(headings, distances))
+
+
+def get_route_commands(
+    route: list[LocationLink],
+    objective: ROUTING_OBJECTIVE_TYPES | None = None,
+    position: Position | None = None,
+    snapshot: MapSnapshot | None = None
+) -> CarCommandsOutput:
+    """
+    在当前地图上把路线转换为小车移动指令 结果按（地图版本, 优化目标, 路线）缓存
+
+    路线经过的边被临时封闭或加权后，对应的缓存会失效（见 `command_cache.py`）。
 
-    # 1. 获取节点坐标字典
-    node_dict = {node.id: node for node in map.nodes}
+    参数:
+        route: LocationLink序列，只包含main节点
+        objective: 优化目标 distance / time，None 表示使用配置中的 `MAP_ROUTING_OBJECTIVE`
+        position: 小车当前的坐标 给出时从离它最近的节点出发（见 `route_from_position`）
+        snapshot: 地图快照 为空时使用当前地图（批量规划时传入同一个快照 保证所有路线在同一版本上计算）
 
-    # 2. 计算绝对方向序列和距离
-    directions: list[str] = []
-    distances: list[int] = []
+    返回:
+        CarCommandsOutput对象，包含小车动作序列
 
-    for i in range(len(full_path) - 1):
-        node_id1 = full_path[i]
-        node_id2 = full_path[i + 1]
+    异常:
+        ValueError: 如果输入无效或路径处理失败
+    """
+    snapshot = snapshot or current_map()
+    cache = get_command_cache()
+    objective = objective or MAP_ROUTING_OBJECTIVE
+    if position is not None:
+        route = route_from_position(position, route, snapshot.compiled)
+    key = route_key(route, objective)
 
-        node1 = node_dict.get(node_id1)
-        node2 = node_dict.get(node_id2)
+    generation = cache.generation
+    cached = cache.get(snapshot.version, key)
+    if cached is not None:
+        return cached
 
-        if not node1 or not node2:
-            raise ValueError(f"Node not found: {node_id1} or {node_id2}")
+    from .segments import get_segment_tables
 
-        dx = int(node2.x - node1.x)  # 坐标转换为整数
-        dy = int(node2.y - node1.y)
+    commands, full_path = get_segment_tables().get(snapshot.compiled).route_commands(route, objective)
+    cache.put(snapshot.version, key, commands, {edge_key(a, b) for a, b in zip(full_path, full_path[1:])}, generation)
+    return commands
 
-        direction = get_absolute_direction(dx, dy)
-        distance = abs(dx) + abs(dy)  # 曼哈顿距离
 
-        directions.append(direction)
-        distances.append(distance)
+def stream_route_commands(
+    route: list[LocationLink],
+    objective: ROUTING_OBJECTIVE_TYPES | None = None,
+    position: Position | None = None
+) -> Iterator[CarAction]:
+    """
+    在当前地图上逐段生成小车移动指令：每展开一段LocationLink就产出其中已经确定的动作
 
-    # 3. 转换为相对转向序列，合并转向与后续直线段
-    actions: list[CarAction] = []
+    跨段的直行合并与 `get_route_commands` 一致（段末尾的直行动作等下一段展开后再产出），
+    多站点的长路线上小车可以在整条路线规划完之前开始移动。
 
-    for i in range(len(directions)):
-        if i == 0:
-            # 第一个线段：总是straight（无前置转向）
-            orientation = Orientation.straight
-        else:
-            # 计算从前一线段方向到当前方向的转向
-            orientation = get_relative_turn(directions[i-1], directions[i])
+    参数:
+        route: LocationLink序列，只包含main节点
+        objective: 优化目标 distance / time，None 表示使用配置中的 `MAP_ROUTING_OBJECTIVE`
+        position: 小车当前的坐标 给出时从离它最近的节点出发（见 `route_from_position`）
 
-        # 创建动作：转向 + 当前线段的距离
-        action = CarAction(orientation=orientation, distance=distances[i])
-        actions.append(action)
+    返回:
+        CarAction迭代器
 
-    # 4. 合并连续的straight移动
-    merged_actions = merge_straight_moves(actions)
+    异常:
+        ValueError: 如果输入无效或路径处理失败（可能在已经产出部分动作之后）
+    """
+    from .segments import get_segment_tables
 
-    # 5. 清理：移除distance=0的动作（纯转向且无后续移动的情况）
-    final_actions = [action for action in merged_actions if action.distance > 0]
+    snapshot = current_map()
+    if position is not None:
+        route = route_from_position(position, route, snapshot.compiled)
 
-    return CarCommandsOutput(actions=final_actions)
\ No newline at end of file
+    return get_segment_tables().get(snapshot.compiled).stream_route_commands(route, objective)
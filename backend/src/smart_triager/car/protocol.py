@@ -0,0 +1,276 @@
+# smart_triager/car/protocol.py
+# 与小车控制器（单片机）之间的紧凑二进制协议
+#
+# 帧格式（多字节整数为小端）：
+#
+#     0xA5 | 类型 (1 字节) | 序号 (varint) | 负载长度 (varint) | 负载 | CRC-16/CCITT-FALSE (2 字节)
+#
+# CRC 覆盖类型到负载的所有字节。varint 为 LEB128：每字节低 7 位为数据，最高位为 1 表示后面还有字节。
+#
+# 帧类型与负载：
+# - COMMANDS（服务端 → 小车）：前一批的序号 (varint) + 起始下标 (varint) + 动作数 (varint)
+#   + 每个动作 [转向 (1 字节) + 距离 (varint) + 等待时间 (varint 单位 0.1 秒 只在转向字节最高位为 1 时出现)]
+#   前一批为发出时服务端队列中排在它前面的批次（没有时为 0），小车必须执行完前一批才能开始这一批，
+#   前一批的帧丢失时不会跳过它先执行后面的；起始下标为这些动作在批次中的位置，断线重连后只重发还没执行的部分
+# - ACK（小车 → 服务端）：该序号的批次中已经执行完的动作数 (varint)，等于批次长度时整批完成
+# - HELLO（小车 → 服务端 连接后第一帧）：小车ID（UTF-8） 序号为 0
+#
+# 一个典型的 5 个动作的批次约 20 字节，对应的 JSON 约 250 字节。
+
+from enum import IntEnum
+from typing import Iterator
+
+from .typedef import Orientation, CarAction
+
+
+FRAME_MAGIC = 0xA5
+MAX_PAYLOAD_LENGTH = 64 * 1024
+_MAX_HEADER_LENGTH = 2 + 10 + 10 # 帧头 + 类型 + 两个 varint（每个最多 10 字节）
+
+
+class FrameType(IntEnum):
+    """帧类型"""
+
+    COMMANDS = 1
+    ACK = 2
+    HELLO = 3
+
+
+# 转向的编码（单字节）
+ORIENTATION_CODES = {
+    Orientation.straight: 0,
+    Orientation.left: 1,
+    Orientation.right: 2,
+}
+_CODE_ORIENTATIONS = {code: orientation for orientation, code in ORIENTATION_CODES.items()}
+_WAIT_FLAG = 0x80 # 转向字节的最高位：动作带等待时间
+_WAIT_UNIT = 0.1 # 等待时间的编码单位（秒）
+
+
+def _build_crc16_table() -> list[int]:
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC16_TABLE = _build_crc16_table()
+
+
+def crc16(data: bytes) -> int:
+    """CRC-16/CCITT-FALSE（多项式 0x1021 初值 0xFFFF） 单片机上常用的查表实现"""
+
+    crc = 0xFFFF
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC16_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+
+def encode_varint(value: int) -> bytes:
+    """
+    编码非负整数为 varint
+
+    Raises:
+        ValueError: 如果为负数
+    """
+
+    if value < 0:
+        raise ValueError(f"Varint must be non-negative: {value}")
+
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data: bytes, offset: int = 0) -> tuple[int, int]:
+    """
+    从 `offset` 处解码一个 varint
+
+    Returns:
+        tuple[int, int]: (数值, 解码后的下一个位置)
+    Raises:
+        ValueError: 如果数据不完整或者 varint 过长
+    """
+
+    value, shift = 0, 0
+    while offset < len(data):
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+        if shift > 63:
+            raise ValueError("Varint too long.")
+    raise ValueError("Truncated varint.")
+
+
+def encode_commands(actions: list[CarAction], start: int = 0, previous: int = 0) -> bytes:
+    """
+    编码 COMMANDS 帧的负载
+
+    Args:
+        actions (list[CarAction]): 动作序列
+        start (int): 这些动作在指令批次中的起始下标
+        previous (int): 必须先执行完的前一批的序号 0 表示没有
+
+    等待时间按 0.1 秒取整。
+    """
+
+    out = bytearray(encode_varint(previous))
+    out += encode_varint(start)
+    out += encode_varint(len(actions))
+    for action in actions:
+        wait = round(action.wait / _WAIT_UNIT)
+        out.append(ORIENTATION_CODES[action.orientation] | (_WAIT_FLAG if wait else 0))
+        out += encode_varint(action.distance)
+        if wait:
+            out += encode_varint(wait)
+    return bytes(out)
+
+
+def decode_commands(payload: bytes) -> tuple[int, int, list[CarAction]]:
+    """
+    解码 COMMANDS 帧的负载
+
+    Returns:
+        tuple[int, int, list[CarAction]]: (前一批的序号, 起始下标, 动作序列)
+    Raises:
+        ValueError: 如果负载无效
+    """
+
+    previous, offset = decode_varint(payload)
+    start, offset = decode_varint(payload, offset)
+    count, offset = decode_varint(payload, offset)
+
+    actions = []
+    for _ in range(count):
+        if offset >= len(payload):
+            raise ValueError("Truncated action.")
+        flags = payload[offset]
+        code = flags & ~_WAIT_FLAG
+        if code not in _CODE_ORIENTATIONS:
+            raise ValueError(f"Unknown orientation code: {code}")
+        distance, offset = decode_varint(payload, offset + 1)
+        wait = 0
+        if flags & _WAIT_FLAG:
+            wait, offset = decode_varint(payload, offset)
+        actions.append(CarAction(orientation=_CODE_ORIENTATIONS[code], distance=distance, wait=wait * _WAIT_UNIT))
+
+    if offset != len(payload):
+        raise ValueError("Trailing bytes after actions.")
+    return previous, start, actions
+
+
+def encode_frame(frame_type: FrameType, seq: int, payload: bytes = b"") -> bytes:
+    """
+    组装一帧
+
+    Args:
+        frame_type (FrameType): 帧类型
+        seq (int): 序号
+        payload (bytes): 负载
+    """
+
+    if len(payload) > MAX_PAYLOAD_LENGTH:
+        raise ValueError(f"Payload too large: {len(payload)} bytes")
+
+    body = bytes([frame_type]) + encode_varint(seq) + encode_varint(len(payload)) + payload
+    return bytes([FRAME_MAGIC]) + body + crc16(body).to_bytes(2, "little")
+
+
+class Frame:
+    """
+    解码出的一帧
+    """
+
+    __slots__ = ("type", "seq", "payload")
+
+    def __init__(self, frame_type: FrameType, seq: int, payload: bytes):
+        self.type = frame_type
+        self.seq = seq
+        self.payload = payload
+
+    def __repr__(self) -> str:
+        return f"Frame(type={self.type.name}, seq={self.seq}, payload={self.payload.hex()})"
+
+
+class FrameDecoder:
+    """
+    流式帧解码器：串口 / TCP 上收到的字节可能被任意切分，逐段喂入，解出完整的帧
+
+    帧头或者 CRC 不对时丢弃一个字节，从下一个 0xA5 开始重新同步。
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.dropped_bytes = 0
+
+    def feed(self, data: bytes) -> Iterator[Frame]:
+        """喂入收到的字节 产出其中完整的帧"""
+
+        self._buffer += data
+
+        while self._buffer:
+            if self._buffer[0] != FRAME_MAGIC:
+                self._skip()
+                continue
+
+            if len(self._buffer) < 2:
+                return
+            frame_type = self._buffer[1]
+            if frame_type not in FrameType._value2member_map_:
+                self._skip()
+                continue
+
+            try:
+                seq, offset = decode_varint(self._buffer, 2)
+                length, offset = decode_varint(self._buffer, offset)
+            except ValueError:
+                if len(self._buffer) < _MAX_HEADER_LENGTH: # 序号和长度可能还没收完
+                    return
+                self._skip()
+                continue
+
+            if length > MAX_PAYLOAD_LENGTH:
+                self._skip()
+                continue
+
+            end = offset + length + 2
+            if len(self._buffer) < end:
+                return
+
+            body = bytes(self._buffer[1:end - 2])
+            if crc16(body) != int.from_bytes(self._buffer[end - 2:end], "little"):
+                self._skip()
+                continue
+
+            payload = bytes(self._buffer[offset:end - 2])
+            del self._buffer[:end]
+            yield Frame(FrameType(frame_type), seq, payload)
+
+    def _skip(self) -> None:
+        del self._buffer[0]
+        self.dropped_bytes += 1
+
+
+__all__ = [
+    "FrameType",
+    "Frame",
+    "FrameDecoder",
+    "crc16",
+    "encode_varint",
+    "decode_varint",
+    "encode_commands",
+    "decode_commands",
+    "encode_frame",
+]
@@ -0,0 +1,335 @@
+# smart_triager/car/segments.py
+# 主节点之间预先计算好的小车指令段
+#
+# 路线总是在主节点之间跳转，主节点的有序点对数量很少且在同一版本的地图上固定不变。
+# 这里为每个点对保存一段指令（展开后的路径、进入 / 离开时的朝向、合并后的动作），
+# 生成整条路线的指令时只需要把各段拼接起来，在段与段的连接处补一次转向，
+# 不再逐条路线重新展开路径、计算方向序列、合并直行。
+#
+# 拼接的结果与对完整路径调用 `full_path_to_commands` 完全一致：
+# 连接处的转向为直行时，这一段的第一个直行动作与上一段末尾的直行动作合并（`head`）；
+# 否则第一跳带上连接处的转向单独成为一个动作，之后的动作与单独合并时相同（`tail`）。
+#
+# 距离最短的点对在主节点不多时（`CAR_SEGMENT_PRECOMPUTE_MAX_MAIN_NODES`）随地图一起全部预先计算，
+# 更大的地图以及时间最短（路径依赖进入时的朝向）的指令段在第一次使用时计算并保存。
+# 每个地图对象一张表，地图热更新时为新快照重新构建；边的临时调整只让经过这些边的指令段失效。
+
+import threading
+from typing import Iterator
+
+import numpy as np
+
+from src import logger
+from src.config.general import CAR_SEGMENT_PRECOMPUTE_MAX_MAIN_NODES, MAP_ROUTING_OBJECTIVE, ROUTING_OBJECTIVE_TYPES
+from src.map import Map, MapSnapshot, as_compiled_map, get_map_registry
+from src.map.compiled import CompiledMap, NO_HEADING
+from src.map.edge_weights import EdgeKey, edge_key, get_edge_weights
+from src.smart_triager.typedef import LocationLink
+from .typedef import Orientation, CarAction, CarCommandsOutput
+from .parser import expand_link, get_relative_turn, full_path_to_commands, direction_name, path_hops, hops_to_actions
+
+
+SegmentKey = tuple[str, str, str, str | None]
+
+
+class CommandSegment:
+    """
+    一个有序点对之间的指令段
+
+    - `path`：展开后的完整路径
+    - `entry` / `exit`：第一跳 / 最后一跳的绝对方向 路径只有一个节点时为 None
+    - `heading`：走完这一段后的车头朝向（time 目标下作为下一段的初始朝向）
+    - `head`：单独生成时的动作（第一跳为直行）
+    - `first_distance` / `tail`：第一跳的距离 与除第一跳以外的跳单独合并后的动作
+    - `regular`：路径中没有坐标相同的相邻节点 为 False 时不能拼接，退回对完整路径生成指令
+    """
+
+    __slots__ = ("path", "entry", "exit", "heading", "head", "first_distance", "tail", "regular")
+
+    def __init__(self, path: list[str], compiled: CompiledMap, heading: str | None):
+        self.path = path
+        self.heading = heading
+
+        graph = compiled.graph
+        indices = np.array([graph.index[node_id] for node_id in path], dtype=np.int64)
+        headings, distances = path_hops(indices, graph.xs, graph.ys)
+
+        self.regular = not (headings == NO_HEADING).any()
+        self.entry = direction_name(int(headings[0])) if len(headings) else None
+        self.exit = direction_name(int(headings[-1])) if len(headings) else None
+        self.first_distance = int(distances[0]) if len(distances) else 0
+        self.head: list[CarAction] = []
+        self.tail: list[CarAction] = []
+        if not self.regular or not len(headings):
+            return
+
+        self.head = hops_to_actions(headings, distances)
+        self.tail = hops_to_actions(headings[1:], distances[1:], int(headings[0]))
+
+    def edges(self) -> set[EdgeKey]:
+        return {edge_key(a, b) for a, b in zip(self.path, self.path[1:])}
+
+
+class SegmentTable:
+    """
+    一个地图对象上的指令段表
+
+    Args:
+        map (Map | CompiledMap): 地图对象或者编译结果
+    """
+
+    def __init__(self, map: Map | CompiledMap):
+        self.compiled = as_compiled_map(map)
+        self._segments: dict[SegmentKey, CommandSegment] = {}
+        self._by_edge: dict[EdgeKey, set[SegmentKey]] = {}
+        self._lock = threading.Lock()
+        self._generation = 0 # 失效的次数 与指令缓存相同 失效之前开始计算的指令段不再保存
+
+    def build(self) -> int:
+        """
+        预先计算所有有序主节点对之间距离最短的指令段（主节点过多时跳过）
+
+        Returns:
+            int: 计算的指令段数
+        """
+
+        graph = self.compiled.graph
+        main_ids = [graph.node_ids[i] for i in range(graph.node_count) if graph.is_main[i]]
+        if len(main_ids) > CAR_SEGMENT_PRECOMPUTE_MAX_MAIN_NODES:
+            return 0
+
+        count = 0
+        for start in main_ids:
+            for end in main_ids:
+                if start == end:
+                    continue
+                try:
+                    self.segment(start, end, "distance")
+                    count += 1
+                except ValueError:
+                    pass # 不可达的点对在使用时再报错
+        return count
+
+    def segment(self, start: str, end: str, objective: ROUTING_OBJECTIVE_TYPES, heading: str | None = None) -> CommandSegment:
+        """
+        获取 start→end 的指令段 没有时计算并保存
+
+        Raises:
+            ValueError: 如果路径不存在
+        """
+
+        heading = heading if objective == "time" else None
+        key = (start, end, objective, heading)
+        segment = self._segments.get(key)
+        if segment is not None:
+            return segment
+
+        generation = self._generation
+        path, final_heading = expand_link(start, end, self.compiled, objective, heading)
+        segment = CommandSegment(path, self.compiled, final_heading)
+        with self._lock:
+            if generation != self._generation:
+                return segment
+            self._segments[key] = segment
+            for edge in segment.edges():
+                self._by_edge.setdefault(edge, set()).add(key)
+        return segment
+
+    def invalidate_edges(self, edges: set[EdgeKey], relaxed: bool = False) -> int:
+        """
+        让经过这些边的指令段失效 有边的费用变小时全部失效（任何点对之间的最短路径都可能变化）
+
+        Returns:
+            int: 失效的指令段数
+        """
+
+        with self._lock:
+            self._generation += 1
+            if relaxed:
+                count = len(self._segments)
+                self._segments.clear()
+                self._by_edge.clear()
+                return count
+
+            keys = set().union(*(self._by_edge.pop(edge, set()) for edge in edges))
+            for key in keys:
+                self._segments.pop(key, None)
+            return len(keys)
+
+    def route_commands(
+        self,
+        route: list[LocationLink],
+        objective: ROUTING_OBJECTIVE_TYPES | None = None
+    ) -> tuple[CarCommandsOutput, list[str]]:
+        """
+        把各段指令拼接成整条路线的指令
+
+        Returns:
+            tuple[CarCommandsOutput, list[str]]: (指令序列, 展开后的完整路径)
+        Raises:
+            ValueError: 如果路径不存在或输入无效
+        """
+
+        if not route:
+            return CarCommandsOutput(actions=[]), []
+
+        objective = objective or MAP_ROUTING_OBJECTIVE
+        segments: list[CommandSegment] = []
+        heading: str | None = None
+        for link in route:
+            segment = self.segment(link.this, link.next, objective, heading)
+            segments.append(segment)
+            heading = segment.heading
+
+        full_path = [route[0].this]
+        for segment in segments:
+            full_path.extend(segment.path[1:])
+
+        if not all(segment.regular for segment in segments):
+            return full_path_to_commands(full_path, self.compiled), full_path
+
+        joiner = ActionJoiner()
+        actions = [action for segment in segments for action in joiner.add(segment)]
+        actions.extend(joiner.finish())
+        return CarCommandsOutput(actions=actions), full_path
+
+    def stream_route_commands(
+        self,
+        route: list[LocationLink],
+        objective: ROUTING_OBJECTIVE_TYPES | None = None
+    ) -> Iterator[CarAction]:
+        """
+        逐段展开路线 每展开一段就产出其中已经确定的动作（小车不必等整条路线规划完）
+
+        产出的动作序列与 `route_commands` 相同。
+
+        Raises:
+            ValueError: 如果路径不存在、或者路径中有坐标相同的相邻节点（无法确定方向）
+        """
+
+        objective = objective or MAP_ROUTING_OBJECTIVE
+        joiner = ActionJoiner()
+        heading: str | None = None
+        for link in route:
+            segment = self.segment(link.this, link.next, objective, heading)
+            if not segment.regular:
+                raise ValueError(f"Zero-length hop on the path between {link.this} and {link.next}")
+            heading = segment.heading
+            yield from joiner.add(segment)
+        yield from joiner.finish()
+
+
+class ActionJoiner:
+    """
+    把指令段依次拼接成动作序列
+
+    每加入一段 返回其中已经确定的动作：末尾的直行动作可能还要与下一段开头的直行合并，先保留到下一段加入时
+    （转向动作之后的直行不会合并到转向动作上，所以末尾不是直行时整段都可以直接产出）。
+    """
+
+    def __init__(self):
+        self._direction: str | None = None
+        self._pending: CarAction | None = None
+
+    def add(self, segment: CommandSegment) -> list[CarAction]:
+        """加入一段 返回确定下来的动作"""
+
+        if segment.entry is None:
+            return [] # 原地不动的一段 不影响朝向
+
+        turn = Orientation.straight if self._direction is None else get_relative_turn(self._direction, segment.entry)
+        if turn == Orientation.straight:
+            actions = [action.model_copy() for action in segment.head]
+            if self._pending is not None:
+                actions[0].distance += self._pending.distance
+        else:
+            actions = [CarAction(orientation=turn, distance=segment.first_distance)]
+            actions.extend(action.model_copy() for action in segment.tail)
+            if self._pending is not None:
+                actions.insert(0, self._pending)
+
+        self._direction = segment.exit
+        self._pending = actions.pop() if actions[-1].orientation == Orientation.straight else None
+        return actions
+
+    def finish(self) -> list[CarAction]:
+        """路线结束 返回保留的最后一个动作"""
+
+        pending, self._pending = self._pending, None
+        return [pending] if pending is not None else []
+
+
+class SegmentTables:
+    """
+    按编译地图保存的指令段表 与 `get_compiled_map` 的缓存一样只保留最近的几个地图对象
+    """
+
+    _MAX_ENTRIES = 4
+
+    def __init__(self):
+        self._tables: dict[int, tuple[CompiledMap, SegmentTable]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, map: Map | CompiledMap) -> SegmentTable:
+        """获取地图对象（或者编译结果 请求路径上传入 `snapshot.compiled`）的指令段表"""
+
+        compiled = as_compiled_map(map)
+        with self._lock:
+            cached = self._tables.get(id(compiled))
+            if cached is None or cached[0] is not compiled:
+                if len(self._tables) >= self._MAX_ENTRIES:
+                    self._tables.pop(next(iter(self._tables)))
+                cached = (compiled, SegmentTable(compiled))
+                self._tables[id(compiled)] = cached
+        return cached[1]
+
+    def invalidate_edges(self, edges: set[EdgeKey], relaxed: bool = False) -> None:
+        """边的临时调整变化后 让各张表中经过这些边的指令段失效"""
+
+        with self._lock:
+            tables = [table for _, table in self._tables.values()]
+        for table in tables:
+            table.invalidate_edges(edges, relaxed)
+
+    def prepare_snapshot(self, snapshot: MapSnapshot) -> None:
+        """地图热更新时 在新快照替换上去之前为它构建指令段表"""
+
+        count = self.get(snapshot.compiled).build()
+        if count:
+            logger.info(f"{count} car command segments precomputed for map version {snapshot.version}")
+
+
+segment_tables: SegmentTables | None = None
+
+
+def _build_segment_tables():
+    """
+    初始化指令段表 边的调整变化时失效 换地图时为新快照重新构建
+
+    新快照先应用边的临时调整（`get_edge_weights` 注册的准备回调在前），再构建指令段。
+    """
+
+    global segment_tables
+
+    segment_tables = SegmentTables()
+    get_edge_weights().add_listener(segment_tables.invalidate_edges)
+    get_map_registry().add_preparer(segment_tables.prepare_snapshot)
+
+
+def get_segment_tables() -> SegmentTables:
+    """获取指令段表实例"""
+
+    global segment_tables
+
+    if segment_tables is None:
+        _build_segment_tables()
+
+    return segment_tables
+
+
+__all__ = [
+    "CommandSegment",
+    "SegmentTable",
+    "ActionJoiner",
+    "get_segment_tables",
+]
@@ -0,0 +1,188 @@
+# smart_triager/car/simulator.py
+# 小车一侧的本地模拟器
+#
+# 按 `protocol.py` 的协议与服务端通信：连上后发送 HELLO，收到指令批次后立即回 ACK，
+# 按序号顺序执行动作（每个动作按距离模拟耗时），每执行完一个动作再回一次 ACK。
+# 前一批还没收到（帧丢失）时等待重发，不会跳过它先执行后面的批次；
+# 重复收到的批次（重连后的重发、超时重发）只补上还没有的动作，不会重复执行。
+#
+# 用法（需要 websockets）：
+#     python -m src.smart_triager.car.simulator --url ws://127.0.0.1:8000/api/car/ws/ --car-id car-1
+#     python -m src.smart_triager.car.simulator --car-id car-1 --disconnect-every 5   # 每执行 5 个动作断线一次 测试断线续传
+
+import asyncio
+import argparse
+
+from src import logger
+from .typedef import CarAction
+from .protocol import FrameType, FrameDecoder, decode_commands
+from .channel import SendBytes, ReceiveBytes, encode_ack, encode_hello
+
+
+class CarSimulator:
+    """
+    模拟的小车控制器 执行状态在断线重连之间保留
+
+    Args:
+        car_id (str): 小车ID
+        seconds_per_unit (float): 每单位距离的行驶时间
+        turn_seconds (float): 每次转向的时间
+    """
+
+    def __init__(self, car_id: str, seconds_per_unit: float = 0.0, turn_seconds: float = 0.0):
+        self.car_id = car_id
+        self.seconds_per_unit = seconds_per_unit
+        self.turn_seconds = turn_seconds
+
+        self._batches: dict[int, list[CarAction]] = {} # 序号 → 已知的动作（可能还没收全）
+        self._previous: dict[int, int] = {} # 序号 → 必须先执行完的前一批
+        self._executed: dict[int, int] = {} # 序号 → 已执行的动作数
+        self._completed = 0 # 最近一个整批执行完的序号（批次按序号顺序执行）
+        self.log: list[tuple[int, int, CarAction]] = [] # (序号, 下标, 动作) 执行记录
+        self._work = asyncio.Event()
+
+    def _receive_commands(self, seq: int, payload: bytes) -> int:
+        """
+        处理一个 COMMANDS 帧
+
+        Returns:
+            int: 这一批中已经执行完的动作数（用于回 ACK）
+        """
+
+        previous, start, actions = decode_commands(payload)
+        total = start + len(actions)
+        if seq <= self._completed and seq not in self._batches:
+            return total # 已经执行完的批次被重发
+
+        known = self._batches.get(seq)
+        if known is None:
+            if start != 0:
+                logger.warning(f"Simulator: batch {seq} starts at {start} but earlier actions are unknown")
+                return 0
+            self._batches[seq] = list(actions)
+            self._previous[seq] = previous
+            self._executed[seq] = 0
+        elif start <= len(known):
+            known.extend(actions[len(known) - start:])
+        self._work.set()
+        return self._executed[seq]
+
+    def _next_batch(self) -> int | None:
+        """下一个可以执行的批次 序号最小的批次的前一批还没执行完时为 None"""
+
+        if not self._batches:
+            return None
+        seq = min(self._batches)
+        previous = self._previous[seq]
+        if previous and previous > self._completed:
+            return None # 前一批的帧丢了 等待重发
+        return seq
+
+    async def _execute(self, send: SendBytes, max_actions: int | None, stop: asyncio.Event) -> None:
+        """按序号顺序执行所有收到的动作 每执行完一个回一次 ACK"""
+
+        count = 0
+        while True:
+            await self._work.wait()
+            self._work.clear()
+            while (seq := self._next_batch()) is not None:
+                actions = self._batches[seq]
+                index = self._executed[seq]
+                if index >= len(actions):
+                    # 整批执行完
+                    del self._batches[seq], self._previous[seq], self._executed[seq]
+                    self._completed = max(self._completed, seq)
+                    continue
+
+                action = actions[index]
+                await asyncio.sleep(action.wait + action.distance * self.seconds_per_unit + (self.turn_seconds if action.orientation != "straight" else 0))
+                self._executed[seq] = index + 1
+                self.log.append((seq, index, action))
+                await send(encode_ack(seq, index + 1))
+
+                count += 1
+                if max_actions is not None and count >= max_actions:
+                    stop.set()
+                    return
+
+    async def run(self, receive: ReceiveBytes, send: SendBytes, max_actions: int | None = None) -> None:
+        """
+        在一个连接上运行 直到连接关闭（或者执行了 `max_actions` 个动作后主动断开 用于测试断线续传）
+
+        Args:
+            receive (ReceiveBytes): 接收一段字节 连接关闭时返回 None
+            send (SendBytes): 发送一段字节
+            max_actions (int | None): 这次连接最多执行的动作数
+        """
+
+        decoder = FrameDecoder()
+        stop = asyncio.Event()
+        await send(encode_hello(self.car_id))
+        self._work.set() # 上次连接中没执行完的动作继续执行
+
+        executor = asyncio.create_task(self._execute(send, max_actions, stop))
+        stopping = asyncio.create_task(stop.wait())
+        try:
+            while True:
+                receiving = asyncio.create_task(receive())
+                await asyncio.wait([receiving, stopping, executor], return_when=asyncio.FIRST_COMPLETED)
+                if not receiving.done():
+                    receiving.cancel()
+                    return
+                data = receiving.result()
+                if data is None:
+                    return
+                for frame in decoder.feed(data):
+                    if frame.type != FrameType.COMMANDS:
+                        continue
+                    try:
+                        executed = self._receive_commands(frame.seq, frame.payload)
+                    except ValueError as e:
+                        logger.warning(f"Simulator: invalid commands frame: {e}")
+                        continue
+                    # 收到即确认 带目前已执行的动作数（已经执行完的批次被重发时 服务端据此把它移除）
+                    await send(encode_ack(frame.seq, executed))
+        finally:
+            executor.cancel()
+            stopping.cancel()
+
+
+async def _main(url: str, car_id: str, seconds_per_unit: float, turn_seconds: float, disconnect_every: int | None) -> None:
+    import websockets
+
+    simulator = CarSimulator(car_id, seconds_per_unit, turn_seconds)
+    while True:
+        try:
+            async with websockets.connect(url) as websocket:
+                async def receive() -> bytes | None:
+                    try:
+                        message = await websocket.recv()
+                    except websockets.ConnectionClosed:
+                        return None
+                    return message if isinstance(message, bytes) else message.encode("utf-8")
+
+                logger.info(f"Simulator {car_id} connected to {url}")
+                await simulator.run(receive, websocket.send, disconnect_every)
+        except OSError as e:
+            logger.warning(f"Simulator {car_id} connection failed: {e}")
+
+        for seq, index, action in simulator.log[-5:]:
+            logger.info(f"Simulator {car_id} executed batch {seq} #{index}: {action.orientation.value} {action.distance}")
+        await asyncio.sleep(1.0)
+
+
+__all__ = [
+    "CarSimulator",
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="小车控制器模拟器")
+    parser.add_argument("--url", type=str, default="ws://127.0.0.1:8000/api/car/ws/", help="服务端小车通道地址")
+    parser.add_argument("--car-id", type=str, default="car-1", help="小车ID")
+    parser.add_argument("--seconds-per-unit", type=float, default=0.2, help="每单位距离的行驶时间")
+    parser.add_argument("--turn-seconds", type=float, default=0.5, help="每次转向的时间")
+    parser.add_argument("--disconnect-every", type=int, default=None, help="每执行这么多个动作主动断线一次")
+    args = parser.parse_args()
+
+    asyncio.run(_main(args.url, args.car_id, args.seconds_per_unit, args.turn_seconds, args.disconnect_every))
@@ -3,7 +3,10 @@
 
 from enum import Enum
 from typing import Literal
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_serializer
+
+from src.config.general import CAR_MAX_SPEED, CAR_ACCELERATION, CAR_DECELERATION, CAR_TURN_SECONDS
+from src.smart_triager.typedef import LocationLink
 
 
 class Orientation(str, Enum):
@@ -18,7 +21,7 @@ class Orientation(str, Enum):
 
 class CarAction(BaseModel):
     """
-    小车单个动作：先转向，再移动指定距离
+    小车单个动作：（需要时先原地等待）先转向，再移动指定距离
     """
     orientation: Orientation = Field(
         ...,
@@ -29,6 +32,19 @@ class CarAction(BaseModel):
         description="转向后的移动距离，应避免为0",
         ge=0  # 距离非负
     )
+    wait: float = Field(
+        default=0.0,
+        description="执行这个动作前原地等待的时间（秒） 多车调度时用于避让其它小车 为 0 时不出现在输出中",
+        ge=0
+    )
+
+    @model_serializer(mode="wrap")
+    def _omit_zero_wait(self, handler):
+        # 不需要等待的动作保持原来的输出格式 { orientation, distance }（前端与小车按这个格式解析）
+        data = handler(self)
+        if not self.wait:
+            data.pop("wait", None)
+        return data
 
 
 class CarCommandsOutput(BaseModel):
@@ -38,4 +54,83 @@ class CarCommandsOutput(BaseModel):
     actions: list[CarAction] = Field(
         ...,
         description="小车动作序列，按顺序执行"
-    )
\ No newline at end of file
+    )
+
+class KinematicProfile(BaseModel):
+    """
+    小车运动学参数 默认值见配置
+    """
+    max_speed: float = Field(default=CAR_MAX_SPEED, gt=0, description="最高速度（地图单位/秒）")
+    acceleration: float = Field(default=CAR_ACCELERATION, gt=0, description="加速度（地图单位/秒²）")
+    deceleration: float = Field(default=CAR_DECELERATION, gt=0, description="减速度（地图单位/秒²）")
+    turn_seconds: float = Field(default=CAR_TURN_SECONDS, ge=0, description="原地 90° 转向的时间（秒）")
+
+
+class ActionTiming(BaseModel):
+    """
+    单个动作的执行时间
+    """
+    index: int = Field(..., description="动作的下标")
+    orientation: Orientation = Field(..., description="转向方向")
+    distance: int = Field(..., description="移动距离")
+    start: float = Field(..., description="开始执行的时刻（秒 从出发算起）")
+    wait_seconds: float = Field(..., description="原地等待的时间（秒）")
+    turn_seconds: float = Field(..., description="转向用时（秒）")
+    move_seconds: float = Field(..., description="移动用时（秒）")
+    end: float = Field(..., description="执行完的时刻（秒）")
+    peak_speed: float = Field(..., description="移动过程中的最高速度（地图单位/秒）")
+
+
+class CarExecutionEstimate(BaseModel):
+    """
+    小车执行一串指令的时间估计
+    """
+    timeline: list[ActionTiming] = Field(..., description="逐个动作的时间线")
+    total_seconds: float = Field(..., description="预计总用时（秒）")
+    distance: int = Field(..., description="总移动距离")
+    turns: int = Field(..., description="转向次数")
+
+
+class RoutePlan(BaseModel):
+    """
+    批量路线规划中一条路线的结果
+    """
+
+    index: int = Field(..., description="该路线在请求列表中的下标")
+    success: bool = Field(..., description="是否成功")
+    commands: CarCommandsOutput | None = Field(None, description="小车指令")
+    distance: int = Field(0, description="总移动距离")
+    turns: int = Field(0, description="转向次数")
+    eta_seconds: float | None = Field(None, description="按运动学模型估计的总用时（秒）")
+    eta_message: str | None = Field(None, description="给患者看的预计到达时间")
+    error: str | None = Field(None, description="失败原因（例如路线无法到达）")
+
+
+class FleetTask(BaseModel):
+    """
+    多车调度的一个任务（一位患者）
+    """
+    task_id: str = Field(..., description="任务ID")
+    route: list[LocationLink] = Field(..., min_length=1, description="患者的路线 小车先开到第一个地点接上患者 再依次经过路线上的地点")
+
+
+class FleetAssignment(BaseModel):
+    """
+    分配给一辆小车的任务与指令
+    """
+    car_id: str = Field(..., description="小车ID")
+    task_id: str = Field(..., description="任务ID")
+    commands: CarCommandsOutput = Field(..., description="小车指令 避让处的动作带等待时间")
+    path: list[str] = Field(..., description="依次经过的节点ID")
+    pickup_seconds: float = Field(..., description="按计划到达接患者地点的时间（秒 从调度时算起）")
+    finish_seconds: float = Field(..., description="按计划到达终点的时间（秒）")
+    wait_seconds: float = Field(..., description="为避让其它小车等待的总时间（秒）")
+    eta_seconds: float = Field(..., description="按运动学模型估计的执行指令的总用时（秒）")
+
+
+class FleetDispatchOutput(BaseModel):
+    """
+    一轮多车调度的结果
+    """
+    assignments: list[FleetAssignment] = Field(..., description="分配出去的任务")
+    unassigned: list[str] = Field(..., description="本轮没有分配出去的任务ID（没有空闲小车、无法到达或者无法避让）")
@@ -0,0 +1,211 @@
+"""
+smart_triager/session_store.py
+多轮分诊会话的存储
+
+内存中保存会话（带过期时间），可选写入 sqlite，服务重启后仍然可以继续会话。
+启用 sqlite 时 `create` / `get` / `put` / `delete` 会进行阻塞的磁盘读写，在异步代码中应当放到线程里调用。
+离线模型的 KV 状态不落盘，而是由 `PromptStateCache` 按对话前缀保存在内存中：
+同一会话下一轮的提示词正好以上一轮的对话为前缀，因此会直接命中上一轮留下的状态。
+"""
+
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+
+from src import logger, metrics
+from src.config import general
+from src.smart_triager.typedef import TriageSession
+
+
+class SessionStore:
+    """
+    分诊会话存储
+
+    Args:
+        ttl_seconds (float): 会话在最后一次更新后保留的秒数
+        sqlite_path (Path | None): sqlite 文件路径 None 表示只保存在内存中
+    """
+
+    def __init__(self, ttl_seconds: float, sqlite_path: Path | None = None):
+        self.ttl_seconds = ttl_seconds
+        self._sessions: dict[str, TriageSession] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._mutex = threading.Lock()
+        self._locks_mutex = threading.Lock() # 只保护 `_locks` 在事件循环上获取会话锁时不必等待 sqlite 读写
+
+        self._db: sqlite3.Connection | None = None
+        if sqlite_path is not None:
+            sqlite_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS triage_sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _expired(self, session: TriageSession, now: float) -> bool:
+        return now - session.updated_at > self.ttl_seconds
+
+    def _load(self, session_id: str) -> TriageSession | None:
+        """从 sqlite 读取会话"""
+
+        if self._db is None:
+            return None
+
+        row = self._db.execute(
+            "SELECT data FROM triage_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        try:
+            return TriageSession.model_validate_json(row[0])
+        except ValueError as e:
+            logger.error(f"Failed to load triage session {session_id}: {e}")
+            return None
+
+    def create(self, origin_route: list, online_model: bool) -> TriageSession:
+        """
+        新建一个会话
+
+        Args:
+            origin_route (list[LocationLink]): 原路线
+            online_model (bool): 是否使用在线模型
+        Returns:
+            TriageSession: 新会话（尚未保存 需要在第一轮之后 `put`）
+        """
+
+        self.purge_expired()
+        return TriageSession(
+            session_id = uuid.uuid4().hex,
+            online_model = online_model,
+            origin_route = origin_route,
+            updated_at = time.time(),
+        )
+
+    def get(self, session_id: str) -> TriageSession | None:
+        """
+        获取会话 已过期或者不存在时返回 None
+        """
+
+        now = time.time()
+        with self._mutex:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._load(session_id)
+                if session is not None:
+                    self._sessions[session_id] = session
+
+            if session is not None and self._expired(session, now):
+                self._delete(session_id)
+                metrics.inc("triage_sessions_expired_total")
+                return None
+
+        # 返回副本 处理过程中失败不会污染已保存的状态
+        return session.model_copy(deep=True) if session is not None else None
+
+    def put(self, session: TriageSession) -> None:
+        """
+        保存会话 并刷新它的过期时间
+        """
+
+        session.updated_at = time.time()
+        with self._mutex:
+            self._sessions[session.session_id] = session
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO triage_sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                    (session.session_id, session.model_dump_json(), session.updated_at),
+                )
+                self._db.commit()
+            metrics.set_gauge("triage_sessions_active", len(self._sessions))
+
+    def _delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+        with self._locks_mutex:
+            self._locks.pop(session_id, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM triage_sessions WHERE session_id = ?", (session_id,))
+            self._db.commit()
+        metrics.set_gauge("triage_sessions_active", len(self._sessions))
+
+    def delete(self, session_id: str) -> bool:
+        """
+        删除会话
+
+        Returns:
+            bool: 会话是否存在
+        """
+
+        with self._mutex:
+            existed = session_id in self._sessions or self._load(session_id) is not None
+            self._delete(session_id)
+            return existed
+
+    def purge_expired(self) -> int:
+        """
+        清理所有过期的会话
+
+        Returns:
+            int: 清理掉的会话数量
+        """
+
+        now = time.time()
+        with self._mutex:
+            expired = [sid for sid, session in self._sessions.items() if self._expired(session, now)]
+            for session_id in expired:
+                self._delete(session_id)
+            # 第一轮就失败、从未保存过的会话留下的锁
+            with self._locks_mutex:
+                for session_id in [sid for sid, lock in self._locks.items() if sid not in self._sessions and not lock.locked()]:
+                    del self._locks[session_id]
+            if self._db is not None:
+                self._db.execute("DELETE FROM triage_sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+                self._db.commit()
+        return len(expired)
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        """
+        同一会话的多轮输入必须串行处理 否则后到的一轮会基于过期的状态计算
+        """
+
+        with self._locks_mutex:
+            if session_id not in self._locks:
+                self._locks[session_id] = asyncio.Lock()
+            return self._locks[session_id]
+
+
+session_store: SessionStore | None = None
+
+
+def _build_session_store():
+    """
+    初始化分诊会话存储
+    """
+
+    global session_store
+
+    session_store = SessionStore(
+        ttl_seconds = general.SESSION_TTL_SECONDS,
+        sqlite_path = general.SESSION_SQLITE_PATH,
+    )
+
+
+def get_session_store() -> SessionStore:
+    """获取分诊会话存储实例"""
+
+    global session_store
+
+    if session_store is None:
+        _build_session_store()
+
+    return session_store
+
+
+__all__ = [
+    "SessionStore",
+    "get_session_store",
+]
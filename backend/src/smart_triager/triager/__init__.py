@@ -1,4 +1,5 @@
 from src.smart_triager.triager.condition_collector import *
 from src.smart_triager.triager.requirement_collector import *
 from src.smart_triager.triager.clinic_selector import *
-from src.smart_triager.triager.route_patcher import *
\ No newline at end of file
+from src.smart_triager.triager.route_patcher import *
+from src.smart_triager.triager.route_optimizer import *
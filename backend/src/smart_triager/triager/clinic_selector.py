@@ -7,10 +7,12 @@ from agents import Agent, ModelSettings, Runner
 from pydantic import BaseModel, Field, ValidationError
 
 from src import logger, utils
+from src.cancellation import CancellationToken, run_cancellable
 from src.smart_triager.typedef import ClinicSelectionOutput
-from src.llm.online import get_online_chat_model
+from src.llm.online import get_online_chat_model, get_online_scheduler, estimate_tokens, OnlinePriority
 from src.llm.offline import get_offline_chat_model
-from src.map.tools import clinic_id_to_name_and_description
+from src.llm.offline.prompt_cache import get_prompt_state_cache
+from src.map.registry import current_map, cached_per_map_version
 
 
 # ============================================================================
@@ -18,7 +20,8 @@ from src.map.tools import clinic_id_to_name_and_description
 # ============================================================================
 
 def generate_dynamic_clinic_list() -> str:
-    """生成动态诊室列表文本"""
+    """生成动态诊室列表文本（当前版本的地图）"""
+    clinic_id_to_name_and_description = current_map().clinic_id_to_name_and_description
     if not clinic_id_to_name_and_description:
         # 回退机制：使用默认诊室列表
         default_clinics = {
@@ -43,10 +46,8 @@ def generate_dynamic_clinic_list() -> str:
 # 系统提示词 (7层结构)
 # ============================================================================
 
-# 生成动态诊室列表
-_dynamic_clinic_list = generate_dynamic_clinic_list()
-
-clinic_selector_instructions = """## Background
+# 诊室列表随地图版本变化 模板中的占位符在 `get_clinic_selector_instructions` 中替换
+_clinic_selector_instructions_template = """## Background
 你是一个医院分诊系统中的诊室选择专家。你的任务是根据患者的结构化症状数据，选择最合适的诊室进行就诊。
 
 ## Role
@@ -195,7 +196,14 @@ $_dynamic_clinic_list$
 {
   "clinic_selection": "internal_clinic"
 }
-""".replace("$_dynamic_clinic_list$", _dynamic_clinic_list)
+"""
+
+
+@cached_per_map_version
+def get_clinic_selector_instructions() -> str:
+    """填入当前地图诊室列表的系统提示词"""
+
+    return _clinic_selector_instructions_template.replace("$_dynamic_clinic_list$", generate_dynamic_clinic_list())
 
 # ============================================================================
 # Logit Bias 配置
@@ -206,6 +214,7 @@ from src.llm.offline import get_offline_chat_model
 def get_logit_bias_config() -> dict:
     """根据动态诊室列表生成 logit_bias 配置"""
     # 获取动态诊室列表
+    clinic_id_to_name_and_description = current_map().clinic_id_to_name_and_description
     clinic_ids = list(clinic_id_to_name_and_description.keys()) if clinic_id_to_name_and_description else []
     
     # 如果没有诊室列表，使用默认配置
@@ -233,11 +242,19 @@ def get_logit_bias_config() -> dict:
     
     return bias_config
 
-_logit_bias = utils.build_logit_bias(
-    get_model_func = get_offline_chat_model,
-    string_to_probability = get_logit_bias_config(),
-    token_eos = -5.0, # 降低模型输出结束符概率，鼓励模型输出更多内容，减少意外截断
-)
+@cached_per_map_version
+def _logit_bias_func():
+    """诊室的 logit bias 随地图版本变化"""
+
+    return utils.build_logit_bias(
+        get_model_func = get_offline_chat_model,
+        string_to_probability = get_logit_bias_config(),
+        token_eos = -5.0, # 降低模型输出结束符概率，鼓励模型输出更多内容，减少意外截断
+    )
+
+
+def _logit_bias() -> dict[int, float]:
+    return _logit_bias_func()()
 
 # ============================================================================
 # API 函数 - 在线模型
@@ -258,7 +275,7 @@ async def select_clinic_online(conditions: ClinicSelectionOutput) -> ClinicSelec
     # 创建Agent
     agent = Agent(
         name = "Clinic Selection Agent in Hospital Route Planner",
-        instructions = utils.instruction_token_wrapper(clinic_selector_instructions),
+        instructions = utils.instruction_token_wrapper(get_clinic_selector_instructions()),
         model = get_online_chat_model(),
         model_settings = ModelSettings(
             temperature = 0.6,
@@ -267,10 +284,15 @@ async def select_clinic_online(conditions: ClinicSelectionOutput) -> ClinicSelec
     )
     
     # 运行Agent
-    response = await Runner().run(
-        starting_agent = agent,
-        input = utils.input_token_wrapper(json.dumps(conditions.dict(), ensure_ascii=False, indent=4)),
-        max_turns = 1 # idk whether the agent will ask multiple rounds of questions
+    input_text = json.dumps(conditions.dict(), ensure_ascii=False, indent=4)
+    response = await get_online_scheduler().run(
+        lambda: Runner().run(
+            starting_agent = agent,
+            input = utils.input_token_wrapper(input_text),
+            max_turns = 1 # idk whether the agent will ask multiple rounds of questions
+        ),
+        priority = OnlinePriority.TRIAGE,
+        estimated_tokens = estimate_tokens(get_clinic_selector_instructions(), input_text, max_tokens = 1024),
     )
     
     response_text = response.final_output
@@ -284,7 +306,7 @@ async def select_clinic_online(conditions: ClinicSelectionOutput) -> ClinicSelec
         result = ClinicSelectionOutput(**output)
         
         # 验证输出是否在诊室列表中
-        valid_clinics = list(clinic_id_to_name_and_description.keys()) if clinic_id_to_name_and_description else []
+        valid_clinics = list(current_map().clinic_id_to_name_and_description.keys())
         if valid_clinics and result.clinic_selection not in valid_clinics:
             logger.warning(f"模型输出不在诊室列表中: {result.clinic_selection}，有效列表: {valid_clinics}")
             # 回退到内科诊室
@@ -307,7 +329,8 @@ async def select_clinic_offline(
     description: str,
     other_relevant_information: list[str],
     temperature: float = 0.1,
-    max_tokens: int = 100
+    max_tokens: int = 100,
+    reuse_prefix: bool = False
 ) -> ClinicSelectionOutput | None:
     """ 
     使用离线模型选择诊室
@@ -320,6 +343,7 @@ async def select_clinic_offline(
         other_relevant_information: 其他相关信息列表
         temperature: 温度参数
         max_tokens: 最大token数
+        reuse_prefix: 是否复用缓存的系统提示词前缀状态（批量分诊时使用），否则每次从头求值
     
     Returns:
         ClinicSelectionOutput: 诊室选择结果
@@ -335,21 +359,25 @@ async def select_clinic_offline(
     }
     
     offline_chat_model = get_offline_chat_model()
+    messages = [
+        {"role": "system", "content": utils.instruction_token_wrapper(get_clinic_selector_instructions())},
+        {"role": "user", "content": utils.input_token_wrapper(json.dumps(input_data, ensure_ascii=False))}
+    ]
     
-    def get_response_func():
-        offline_chat_model.reset()
+    def get_response_func(token: CancellationToken):
+        if reuse_prefix:
+            get_prompt_state_cache().prepare(offline_chat_model, messages)
+        else:
+            offline_chat_model.reset()
         return offline_chat_model.create_chat_completion(
-            messages = [
-                {"role": "system", "content": utils.instruction_token_wrapper(clinic_selector_instructions)},
-                {"role": "user", "content": utils.input_token_wrapper(json.dumps(input_data, ensure_ascii=False))}
-            ],
+            messages = messages,
             response_format = {"type": "text"},
             temperature = temperature,
             max_tokens = max_tokens,
-            logit_bias = _logit_bias()
+            logits_processor = utils.cancellable_logits_processor(offline_chat_model, token, _logit_bias()),
         )
     
-    response = await asyncio.to_thread(get_response_func) 
+    response = await run_cancellable(get_response_func) 
     response_text = str(response["choices"][0]["message"]["content"]) # this type can be ignored
     
     # 详细日志：输出原始响应用于调试
@@ -361,7 +389,7 @@ async def select_clinic_offline(
         result = ClinicSelectionOutput(**output)
         
         # 验证输出是否在诊室列表中
-        valid_clinics = list(clinic_id_to_name_and_description.keys()) if clinic_id_to_name_and_description else []
+        valid_clinics = list(current_map().clinic_id_to_name_and_description.keys())
         if valid_clinics and result.clinic_selection not in valid_clinics:
             logger.warning(f"模型输出不在诊室列表中: {result.clinic_selection}，有效列表: {valid_clinics}")
             # 回退到内科诊室
@@ -382,5 +410,6 @@ __all__ = [
     "select_clinic_online",
     "select_clinic_offline",
     "ClinicSelectionOutput",
-    "generate_dynamic_clinic_list"
+    "generate_dynamic_clinic_list",
+    "get_clinic_selector_instructions"
 ]
\ No newline at end of file
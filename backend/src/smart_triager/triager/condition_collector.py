@@ -5,16 +5,20 @@ condition_collector.py
 
 import json
 import asyncio
+from typing import Callable
 from agents import Agent, ModelSettings, Runner
 
 from src import logger, utils
-from src.llm.online import get_online_chat_model
+from src.cancellation import CancellationToken, run_cancellable
+from src.llm.online import get_online_chat_model, get_online_scheduler, estimate_tokens, OnlinePriority
 from src.llm.offline import get_offline_chat_model
+from src.llm.offline.prompt_cache import get_prompt_state_cache, prompt_tokens
+from src.config import general
 from src.smart_triager.typedef import *
-from src.map import clinic_id_to_name_and_description
+from src.map.registry import current_map, cached_per_map_version
 
 
-condition_collector_instructions = """
+_condition_collector_instructions_template = """
 ## Background
 You are now working in a SMART TRIAGE and ROUTING system which is designed for a **CHINESE** HOSPITAL ENVIRONMENT.
 Your system's final purpose is to plan routes for users based on their specific needs and constraints.
@@ -121,7 +125,17 @@ Output:
         "两三天前扭伤过一次，但是很快就好了。现在又开始不舒服了。"
     ]
 }
-""".replace("$existing_clinics$", json.dumps(clinic_id_to_name_and_description, ensure_ascii=False, indent=4))
+"""
+
+
+@cached_per_map_version
+def get_condition_collector_instructions() -> str:
+    """填入当前地图诊室列表的系统提示词"""
+
+    return _condition_collector_instructions_template.replace(
+        "$existing_clinics$",
+        json.dumps(current_map().clinic_id_to_name_and_description, ensure_ascii=False, indent=4)
+    )
 
 
 _logit_bias = utils.build_logit_bias(
@@ -137,7 +151,80 @@ _logit_bias = utils.build_logit_bias(
 )
 
 
-async def collect_conditions_online(user_input: str) -> ConditionCollectorOutput | None:
+# 多轮会话中患者补充信息时使用的输入格式 要求模型结合之前的对话输出完整的最新总结
+_FOLLOW_UP_INPUT_TEMPLATE = "Follow-up Input (the user adds information, output the COMPLETE UPDATED summary combining the whole conversation): {}"
+
+
+# 会话较长被截断时 用截断处的症状总结代替之前的轮次 作为对话的开头
+_SUMMARY_INPUT_TEMPLATE = "Summary Input (earlier turns of the conversation are omitted, this is the summary of everything the user said in them): {}"
+
+_MAX_TOKENS = 1024 # 每次调用允许生成的最大 token 数
+
+
+def _conversation_messages(
+    history: list[ConditionTurn] | None,
+    user_input: str,
+    summary: ConditionCollectorOutput | None = None
+) -> list[dict]:
+    """
+    把会话中之前的轮次与本轮输入拼成 user / assistant 交替的消息列表（不含系统提示词）
+
+    之前的每一轮都按原样重放（同样的输入格式、模型当时的输出），
+    这样离线推理时前面的对话与上一轮的提示词 token 完全一致，可以直接复用上一轮缓存的状态。
+
+    `summary` 不为 None 时表示更早的轮次已被丢弃，先放入一轮以该总结为输入与输出的对话。
+    """
+
+    messages = []
+    if summary is not None:
+        summary_json = summary.model_dump_json()
+        messages.append({"role": "user", "content": utils.input_token_wrapper(_SUMMARY_INPUT_TEMPLATE.format(summary_json))})
+        messages.append({"role": "assistant", "content": summary_json})
+
+    for turn in history or []:
+        template = _FOLLOW_UP_INPUT_TEMPLATE if messages else "Input: {}"
+        messages.append({"role": "user", "content": utils.input_token_wrapper(template.format(turn.user_input))})
+        messages.append({"role": "assistant", "content": turn.conditions.model_dump_json()})
+
+    template = _FOLLOW_UP_INPUT_TEMPLATE if messages else "Input: {}"
+    messages.append({"role": "user", "content": utils.input_token_wrapper(template.format(user_input))})
+    return messages
+
+
+def _fit_conversation(
+    history: list[ConditionTurn] | None,
+    user_input: str,
+    fits: Callable[[list[dict]], bool]
+) -> list[dict]:
+    """
+    在 token 预算内构造对话消息列表
+
+    优先保留完整的历史；放不下时从最早的轮次开始丢弃，
+    并用被丢弃的最后一轮之后的症状总结（每一轮的总结都是截至当时的完整总结）作为对话的开头。
+    即使只剩总结与本轮输入仍然放不下，也返回这个最短的消息列表。
+
+    Args:
+        history (list[ConditionTurn] | None): 多轮会话中之前的轮次
+        user_input (str): 本轮输入
+        fits (Callable[[list[dict]], bool]): 判断消息列表是否在预算内
+    Returns:
+        list[dict]: 消息列表（不含系统提示词）
+    """
+
+    history = history or []
+    messages = _conversation_messages(history, user_input)
+
+    for dropped in range(1, len(history) + 1):
+        if fits(messages):
+            return messages
+        messages = _conversation_messages(history[dropped:], user_input, summary=history[dropped - 1].conditions)
+
+    if not fits(messages):
+        logger.warning("[CC Agent] Conversation exceeds the token budget even with only the latest summary")
+    return messages
+
+
+async def collect_conditions_online(user_input: str, history: list[ConditionTurn] | None = None) -> ConditionCollectorOutput | None:
     """
     **使用在线模型** 对用户输入的身体状况描述与症状描述进行结构化信息整理。
 
@@ -148,6 +235,8 @@ async def collect_conditions_online(user_input: str) -> ConditionCollectorOutput
 
     Args:
         user_input (str): 用户输入的身体状况描述与症状描述。
+        history (list[ConditionTurn] | None): 多轮会话中之前的轮次，此时 `user_input` 是患者补充的信息。
+            超出 `SESSION_ONLINE_CONTEXT_TOKENS` 时丢弃较早的轮次，用最新的症状总结代替。
     Returns:
         ConditionCollectorOutput: 包含`current_summary`和`missing_fields`的对象。
         None: 如果输出无效，则返回 None。
@@ -155,18 +244,35 @@ async def collect_conditions_online(user_input: str) -> ConditionCollectorOutput
 
     agent = Agent(
         name = "Patient Information Collector Agent in Hospital Route Planner",
-        instructions = utils.instruction_token_wrapper(condition_collector_instructions),
+        instructions = utils.instruction_token_wrapper(get_condition_collector_instructions()),
         model = get_online_chat_model(),
         model_settings = ModelSettings(
             temperature = 0.6,
-            max_tokens = 1024,
+            max_tokens = _MAX_TOKENS,
         ),
     )
 
-    response = await Runner().run(
-        starting_agent = agent,
-        input = utils.input_token_wrapper("Input: {}".format(user_input)),
-        max_turns = 1 # idk whether the agent will ask multiple rounds of questions
+    def estimated_tokens(messages: list[dict]) -> int:
+        return estimate_tokens(
+            get_condition_collector_instructions(),
+            *(message["content"] for message in messages),
+            max_tokens = _MAX_TOKENS
+        )
+
+    messages = _fit_conversation(
+        history,
+        user_input,
+        lambda messages: estimated_tokens(messages) <= general.SESSION_ONLINE_CONTEXT_TOKENS
+    )
+
+    response = await get_online_scheduler().run(
+        lambda: Runner().run(
+            starting_agent = agent,
+            input = utils.input_token_wrapper("Input: {}".format(user_input)) if not history else messages,
+            max_turns = 1 # idk whether the agent will ask multiple rounds of questions
+        ),
+        priority = OnlinePriority.TRIAGE,
+        estimated_tokens = estimated_tokens(messages),
     )
 
     response_text = response.final_output
@@ -182,7 +288,11 @@ async def collect_conditions_online(user_input: str) -> ConditionCollectorOutput
         return None
 
 
-async def collect_conditions_offline(user_input: str) -> ConditionCollectorOutput | None:
+async def collect_conditions_offline(
+    user_input: str,
+    reuse_prefix: bool = False,
+    history: list[ConditionTurn] | None = None
+) -> ConditionCollectorOutput | None:
     """
     **使用离线模型** 对用户输入的身体状况描述与症状描述进行结构化信息整理。
 
@@ -193,27 +303,38 @@ async def collect_conditions_offline(user_input: str) -> ConditionCollectorOutpu
 
     Args:
         user_input (str): 用户输入的身体状况描述与症状描述。
+        reuse_prefix (bool): 是否复用缓存的系统提示词前缀状态（批量分诊时使用），否则每次从头求值。
+        history (list[ConditionTurn] | None): 多轮会话中之前的轮次，此时 `user_input` 是患者补充的信息。
+            有历史时总是复用缓存的状态，只求值上一轮之后新增的对话。
+            对话放不进上下文窗口时丢弃较早的轮次，用最新的症状总结代替。
     Returns:
         ConditionCollectorOutput: 包含`current_summary`和`missing_fields`的对象。
         None: 如果输出无效，则返回 None。
     """
 
     offline_chat_model = get_offline_chat_model()
-
-    def get_response_func():
-        offline_chat_model.reset()
+    system_message = {"role": "system", "content": utils.instruction_token_wrapper(get_condition_collector_instructions())}
+
+    # 提示词与生成的 token 必须一起放进上下文窗口 否则 create_chat_completion 直接报错
+    def fits(conversation: list[dict]) -> bool:
+        return len(prompt_tokens(offline_chat_model, [system_message, *conversation])) + _MAX_TOKENS <= offline_chat_model.n_ctx()
+
+    def get_response_func(token: CancellationToken):
+        # 分词较慢 和推理一起放在线程里
+        messages = [system_message, *_fit_conversation(history, user_input, fits)]
+        if reuse_prefix or history:
+            get_prompt_state_cache().prepare(offline_chat_model, messages)
+        else:
+            offline_chat_model.reset()
         return offline_chat_model.create_chat_completion(
-            messages = [
-                {"role": "system", "content": utils.instruction_token_wrapper(condition_collector_instructions)},
-                {"role": "user", "content": utils.input_token_wrapper("Input: {}".format(user_input))}
-            ],
+            messages = messages,
             response_format = {"type": "text"},
             temperature = 0.72,
-            max_tokens = 1024,
-            logit_bias = _logit_bias()
+            max_tokens = _MAX_TOKENS,
+            logits_processor = utils.cancellable_logits_processor(offline_chat_model, token, _logit_bias()),
         )
 
-    response = await asyncio.to_thread(get_response_func) 
+    response = await run_cancellable(get_response_func) 
     response_text = str(response["choices"][0]["message"]["content"]) # this type can be ignored
     
     # 详细日志：输出原始响应用于调试
@@ -9,7 +9,8 @@ import asyncio
 from agents import Agent, ModelSettings, Runner
 
 from src import logger, utils
-from src.llm.online import get_online_chat_model
+from src.cancellation import CancellationToken, run_cancellable
+from src.llm.online import get_online_chat_model, get_online_scheduler, estimate_tokens, OnlinePriority
 from src.llm.offline import get_offline_chat_model
 from src.smart_triager.typedef import *
 
@@ -117,10 +118,14 @@ async def collect_requirement_online(input: str) -> RequirementCollectorOutput |
         ),
     )
 
-    response = await Runner().run(
-        starting_agent = agent,
-        input = utils.input_token_wrapper("Input: {}".format(input)),
-        max_turns = 1 # idk whether the agent will ask multiple rounds of questions
+    response = await get_online_scheduler().run(
+        lambda: Runner().run(
+            starting_agent = agent,
+            input = utils.input_token_wrapper("Input: {}".format(input)),
+            max_turns = 1 # idk whether the agent will ask multiple rounds of questions
+        ),
+        priority = OnlinePriority.TRIAGE,
+        estimated_tokens = estimate_tokens(requirement_collector_instructions, input, max_tokens = 2048),
     )
 
     response_text = response.final_output
@@ -146,7 +151,7 @@ async def collect_requirement_offline(input: str) -> RequirementCollectorOutput
 
     offline_reasoning_model = get_offline_chat_model()
 
-    def get_response_func():
+    def get_response_func(token: CancellationToken):
         offline_reasoning_model.reset()
         return offline_reasoning_model.create_chat_completion(
             messages = [
@@ -156,10 +161,10 @@ async def collect_requirement_offline(input: str) -> RequirementCollectorOutput
             response_format = {"type": "text"},
             temperature = 0.7,
             max_tokens = 1024,
-            logit_bias = _logit_bias()
+            logits_processor = utils.cancellable_logits_processor(offline_reasoning_model, token, _logit_bias()),
         )
 
-    response = await asyncio.to_thread(get_response_func)
+    response = await run_cancellable(get_response_func)
     response_text = str(response["choices"][0]["message"]["content"])
 
     logger.debug(f"[RC Agent] Raw LLM Response (offline):\n{response_text}")
@@ -0,0 +1,173 @@
+"""
+smart_triager/triager/route_optimizer.py
+路线访问顺序优化
+
+路线修改器只决定「要去哪些地方」，插入的位置由模型给出，常常导致来回折返。
+这里把修改方案应用到原路线上，区分固定点（入口、挂号处、诊室、缴费处、药房、出口）与患者额外要求的停靠点，
+根据需求的时机（`Requirement.when`）确定每个停靠点可以插入的区间，再用最短路径表求出总距离最短的访问顺序。
+"""
+
+from src import logger
+from src.map import VisitStop, optimize_visit_order
+from src.map.registry import current_map
+from src.smart_triager.typedef import *
+
+
+# 标准就诊流程中的固定点（诊室按ID中包含 clinic 判断）
+_ANCHOR_IDS = {"entrance", "registration_center", "payment_center", "pharmacy", "quit"}
+
+# 停靠点的常见说法 用于把停靠点与患者的需求对应起来（节点名称本身总是会被匹配）
+_LOCATION_KEYWORDS = {
+    "toilet": ("洗手间", "卫生间", "厕所"),
+    "canteen": ("食堂", "餐厅", "吃饭"),
+}
+
+# 时机中提到的就诊环节 → 对应的固定点
+_STAGE_KEYWORDS = [
+    (("看病", "就诊", "问诊", "看医生", "医生"), "clinic"),
+    (("缴费", "付费", "交费", "付款"), "payment_center"),
+    (("拿药", "取药", "拿完药", "取完药"), "pharmacy"),
+    (("挂号",), "registration_center"),
+]
+
+
+def _is_anchor(node_id: str) -> bool:
+    return node_id in _ANCHOR_IDS or node_id.find("clinic") != -1
+
+
+def apply_route_patches(
+    origin_route: list[LocationLink],
+    patches: list[LocationLinkPatch]
+) -> list[str]:
+    """
+    把修改方案应用到原路线上 先执行所有删除 再执行所有插入（与路线修改器的约定一致）
+
+    对不上原路线的修改会被跳过。
+
+    Args:
+        origin_route (list[LocationLink]): 原路线
+        patches (list[LocationLinkPatch]): 修改方案
+    Returns:
+        list[str]: 修改后依次经过的地点ID
+    """
+
+    if not origin_route:
+        return []
+
+    sequence = [origin_route[0].this] + [link.next for link in origin_route]
+
+    for patch in [p for p in patches if p.type == "delete"]:
+        for i in range(1, len(sequence) - 1):
+            if sequence[i] == patch.this and sequence[i - 1] == patch.previous:
+                del sequence[i]
+                break
+        else:
+            logger.warning(f"Skip unmatched delete patch: {patch.previous} -> {patch.this}")
+
+    for patch in [p for p in patches if p.type == "insert"]:
+        if patch.previous not in sequence:
+            logger.warning(f"Skip unmatched insert patch: {patch.previous} -> {patch.this}")
+            continue
+        sequence.insert(sequence.index(patch.previous) + 1, patch.this)
+
+    return sequence
+
+
+def requirement_window(when: str, anchors: list[str]) -> tuple[int, int] | None:
+    """
+    根据需求的时机确定停靠点可以插入的区间
+
+    Args:
+        when (str): 需求的时机 例如“给医生看病前”“拿完药之后”“最后”“现在”
+        anchors (list[str]): 路线中按顺序排列的固定点
+    Returns:
+        tuple[int, int] | None: 必须在第 after 个固定点之后、第 before 个固定点之前访问 无法判断时返回 None
+    """
+
+    last = len(anchors) - 1
+
+    if any(keyword in when for keyword in ("最后", "离开前", "离开医院前")):
+        return (last - 1, last)
+
+    for keywords, stage in _STAGE_KEYWORDS:
+        if not any(keyword in when for keyword in keywords):
+            continue
+        matched = [i for i, anchor in enumerate(anchors) if (anchor.find("clinic") != -1 if stage == "clinic" else anchor == stage)]
+        if not matched:
+            continue
+        # 对应的固定点就是起点（或终点）时区间为空 退到紧挨着它的那一段
+        if "前" in when:
+            return (0, max(matched[0], 1))
+        if "后" in when or "完" in when:
+            return (min(matched[-1], last - 1), last)
+
+    if any(keyword in when for keyword in ("现在", "马上", "立刻", "先")):
+        return (0, 1)
+
+    return None
+
+
+def _match_requirement(node_id: str, requirements: list[Requirement]) -> Requirement | None:
+    """找到提到这个停靠点的需求"""
+
+    info = current_map().main_node_id_to_name_and_description.get(node_id, {})
+    keywords = [keyword for keyword in (info.get("name"), node_id) if keyword] + list(_LOCATION_KEYWORDS.get(node_id, ()))
+
+    for requirement in requirements:
+        if any(keyword in requirement.what for keyword in keywords):
+            return requirement
+    return None
+
+
+def optimize_route(
+    origin_route: list[LocationLink],
+    patches: list[LocationLinkPatch],
+    requirements: list[Requirement]
+) -> OptimizedRouteOutput:
+    """
+    应用修改方案 并在满足需求时机的前提下重新安排停靠点的访问顺序
+
+    没有对应需求、或者时机无法判断的停靠点，只在模型给出的位置两侧的固定点之间调整。
+
+    Args:
+        origin_route (list[LocationLink]): 原路线
+        patches (list[LocationLinkPatch]): 路线修改器给出的修改方案
+        requirements (list[Requirement]): 患者的需求
+    Returns:
+        OptimizedRouteOutput: 优化后的路线与总距离
+    Raises:
+        ValueError: 路线中的地点不存在 或者无法到达
+    """
+
+    sequence = apply_route_patches(origin_route, patches)
+    if len(sequence) < 2:
+        raise ValueError("Route is empty.")
+
+    # 起点和终点总是固定的
+    is_anchor = [i == 0 or i == len(sequence) - 1 or _is_anchor(node_id) for i, node_id in enumerate(sequence)]
+    anchors = [node_id for node_id, anchor in zip(sequence, is_anchor) if anchor]
+
+    stops: list[VisitStop] = []
+    anchors_passed = 0
+    for node_id, anchor in zip(sequence, is_anchor):
+        if anchor:
+            anchors_passed += 1
+            continue
+        if node_id in anchors or any(stop.node_id == node_id for stop in stops):
+            continue # 同一个地方只去一次
+
+        requirement = _match_requirement(node_id, requirements)
+        window = requirement_window(requirement.when, anchors) if requirement is not None else None
+        if window is None:
+            window = (anchors_passed - 1, anchors_passed)
+        stops.append(VisitStop(node_id=node_id, after=window[0], before=window[1]))
+
+    order, distance = optimize_visit_order(current_map().compiled, anchors, stops)
+    return OptimizedRouteOutput(route=generate_route_by_ids(*order), distance=distance)
+
+
+__all__ = [
+    "apply_route_patches",
+    "requirement_window",
+    "optimize_route",
+]
@@ -8,10 +8,11 @@ import asyncio
 from agents import Agent, ModelSettings, Runner
 
 from src import logger, utils
-from src.llm.online import get_online_chat_model
+from src.cancellation import CancellationToken, run_cancellable
+from src.llm.online import get_online_chat_model, get_online_scheduler, estimate_tokens, OnlinePriority
 from src.llm.offline import get_offline_chat_model
 from src.smart_triager.typedef import *
-from src.map import main_node_id_to_name_and_description
+from src.map.registry import current_map, cached_per_map_version
 
 
 def generate_route(specific_clinic_id: str) -> list[LocationLink]:
@@ -62,7 +63,7 @@ def _transform_input_to_text(
     return json.dumps(input_obj, ensure_ascii=False, indent=2)
 
 
-route_patcher_instructions = """
+_route_patcher_instructions_template = """
 ## Background
 You are now working in a SMART TRIAGE and ROUTING system designed for a **CHINESE** HOSPITAL ENVIRONMENT. The system's ultimate goal is to plan routes for users based on their specific needs and constraints.
 
@@ -225,7 +226,17 @@ Output:
     ]
 }
 
-""" .replace("$locations_mark$", json.dumps(main_node_id_to_name_and_description, ensure_ascii=False, indent=4)) \
+"""
+
+
+@cached_per_map_version
+def get_route_patcher_instructions() -> str:
+    """填入当前地图主节点列表的系统提示词（`$origin_route_mark$` 在调用时替换）"""
+
+    return _route_patcher_instructions_template.replace(
+        "$locations_mark$",
+        json.dumps(current_map().main_node_id_to_name_and_description, ensure_ascii=False, indent=4)
+    )
 
 
 _logit_bias = utils.build_logit_bias(
@@ -256,7 +267,7 @@ async def patch_route_online(
 
     agent = Agent(
         name = "Route Patcher Agent in Hospital Route Planner",
-        instructions = utils.instruction_token_wrapper(route_patcher_instructions.replace(
+        instructions = utils.instruction_token_wrapper(get_route_patcher_instructions().replace(
             "$origin_route_mark$",
             json.dumps([link.model_dump() for link in generate_route(destination_clinic_id)], ensure_ascii=False, indent=4)
         )),
@@ -267,10 +278,15 @@ async def patch_route_online(
         ),
     )
 
-    response = await Runner().run(
-        starting_agent = agent,
-        input = utils.input_token_wrapper("Input: {}".format( _transform_input_to_text(destination_clinic_id, requirement_summary, origin_route) )),
-        max_turns = 1 # idk whether the agent will ask multiple rounds of questions
+    input_text = _transform_input_to_text(destination_clinic_id, requirement_summary, origin_route)
+    response = await get_online_scheduler().run(
+        lambda: Runner().run(
+            starting_agent = agent,
+            input = utils.input_token_wrapper("Input: {}".format(input_text)),
+            max_turns = 1 # idk whether the agent will ask multiple rounds of questions
+        ),
+        priority = OnlinePriority.TRIAGE,
+        estimated_tokens = estimate_tokens(agent.instructions, input_text, max_tokens = 4096),
     )
 
     response_text = response.final_output
@@ -304,11 +320,11 @@ async def patch_route_offline(
 
     model = get_offline_chat_model()
 
-    def get_response_func():
+    def get_response_func(token: CancellationToken):
         model.reset()
         return model.create_chat_completion(
             messages = [
-                {"role": "system", "content": utils.instruction_token_wrapper(route_patcher_instructions.replace(
+                {"role": "system", "content": utils.instruction_token_wrapper(get_route_patcher_instructions().replace(
                     "$origin_route_mark$",
                     json.dumps([link.model_dump() for link in generate_route(destination_clinic_id)], ensure_ascii=False, indent=4)
                 ))},
@@ -317,10 +333,10 @@ async def patch_route_offline(
             response_format = {"type": "text"},
             temperature = 0.6,
             max_tokens = 1024,
-            logit_bias = _logit_bias()
+            logits_processor = utils.cancellable_logits_processor(model, token, _logit_bias()),
         )
 
-    response = await asyncio.to_thread(get_response_func)
+    response = await run_cancellable(get_response_func)
     response_text = str(response["choices"][0]["message"]["content"])
 
     logger.debug(f"[RP Agent] Raw LLM Response (offline):\n{response_text}")
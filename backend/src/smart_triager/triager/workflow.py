@@ -4,17 +4,57 @@ smart_triager/workflow.py
 """
 
 import asyncio
+from typing import AsyncIterator
 
 from src import logger
+from src.cancellation import with_deadline
+from src.config.general import BATCH_ONLINE_CONCURRENCY, REQUEST_DEADLINES
+from src.llm.online import get_online_scheduler
+from src.single_flight import SingleFlight, coalesced, normalize_input
 from src.smart_triager.typedef import *
 from src.smart_triager.triager import *
 
 
+async def _wait_before_retry(retry_time: int, online_model: bool) -> None:
+    """
+    在线模型解析失败后 按调度器的退避时间等待再重试 避免在高峰期立刻重发请求
+
+    Args:
+        retry_time (int): 已经重试的次数
+        online_model (bool): 是否使用在线模型
+    """
+
+    if online_model:
+        await asyncio.sleep(get_online_scheduler().backoff_delay(retry_time - 1))
+
+
+# 合并相同的进行中调用 键为 (智能体, 在线/离线, 规整后的输入)
+# 合并后的工作在不带截止时间的共享任务中执行（见 `SingleFlight._detached`），这里的重试循环不检查截止时间：
+# 调用者超时或断开后不再等待，最后一个调用者离开时共享任务被取消，正在进行的生成与退避等待随之中止。
+_workflow_flight = SingleFlight("triager_workflow")
+
+
+def _flight_key(agent: str):
+    """
+    生成某个智能体的合并键函数
+    """
+
+    def key_func(arguments: dict) -> tuple[str, str, str]:
+        backend = "online" if arguments.pop("online_model") else "offline"
+        arguments.pop("reuse_prefix", None) # 只影响离线推理的性能 不影响结果
+        return (agent, backend, normalize_input(arguments))
+
+    return key_func
+
+
 _CC_MAX_RETRY = 3
 
+@coalesced(_workflow_flight, _flight_key("condition_collector"))
 async def collect_conditions(
     user_input: str,
-    online_model: bool
+    online_model: bool,
+    reuse_prefix: bool = False,
+    history: list[ConditionTurn] | None = None
 ) -> ConditionCollectorOutput | None:
     """
     从用户的输入中提取结构化症状信息
@@ -22,6 +62,8 @@ async def collect_conditions(
     Args:
         user_input (str): 用户的原始输入
         online_model (bool): 是否使用在线的模型进行推理
+        reuse_prefix (bool): 离线推理时是否复用缓存的系统提示词前缀状态
+        history (list[ConditionTurn] | None): 多轮会话中之前的轮次 此时 `user_input` 是患者补充的信息
     Returns:
         ConditionCollectorOutput: 结构化症状信息
         None: 超过 `_CC_MAX_RETRY` 的尝试次数后也无法解析 返回空
@@ -33,10 +75,10 @@ async def collect_conditions(
 
         if online_model:
             # 使用在线模型推理
-            rsp = await collect_conditions_online(user_input)
+            rsp = await collect_conditions_online(user_input, history=history)
         else:
             # 使用离线模型推理
-            rsp = await collect_conditions_offline(user_input)
+            rsp = await collect_conditions_offline(user_input, reuse_prefix=reuse_prefix, history=history)
         
         if rsp:
             # 能够**正常**获取返回值 直接退出返回
@@ -45,14 +87,19 @@ async def collect_conditions(
         # 返回为空 重新解析
         _retry_time += 1
         logger.warning(f"Collect conditions failed. Already retry {_retry_time} times. Retrying...")
+        if _retry_time < _CC_MAX_RETRY:
+            # 最后一次失败后直接返回 不再等待
+            await _wait_before_retry(_retry_time, online_model)
     
     # 最终还是没有解析成功 返回空
     return None
 
 
+@coalesced(_workflow_flight, _flight_key("clinic_selector"))
 async def select_clinic(
     conditions: ConditionCollectorOutput,
-    online_model: bool
+    online_model: bool,
+    reuse_prefix: bool = False
 ) -> str | None:
     """
     根据结构化症状信息选择诊室
@@ -60,6 +107,7 @@ async def select_clinic(
     Args:
         conditions (ConditionCollectorOutput): 结构化症状信息
         online_model (bool): 是否使用在线的模型进行推理
+        reuse_prefix (bool): 离线推理时是否复用缓存的系统提示词前缀状态
     Returns:
         str: 选择的诊室ID
         None: 超过 `_SC_MAX_RETRY` 的尝试次数后也无法解析 返回空
@@ -80,7 +128,8 @@ async def select_clinic(
                 duration=conditions.duration,
                 severity=conditions.severity,
                 description=conditions.description,
-                other_relevant_information=conditions.other_relevant_information
+                other_relevant_information=conditions.other_relevant_information,
+                reuse_prefix=reuse_prefix
             )
         
         if rsp:
@@ -90,6 +139,8 @@ async def select_clinic(
         # 返回为空 重新解析
         _retry_time += 1
         logger.warning(f"Select clinic failed. Already retry {_retry_time} times. Retrying...")
+        if _retry_time < _SC_MAX_RETRY:
+            await _wait_before_retry(_retry_time, online_model)
     
     # 最终还是没有解析成功 返回空
     return None
@@ -97,6 +148,7 @@ async def select_clinic(
 
 _CR_MAX_RETRY = 3
 
+@coalesced(_workflow_flight, _flight_key("requirement_collector"))
 async def collect_requirement(
     user_input: str,
     online_model: bool
@@ -130,6 +182,8 @@ async def collect_requirement(
         # 返回为空 重新解析
         _retry_time += 1
         logger.warning(f"Collect requirement failed. Already retry {_retry_time} times. Retrying...")
+        if _retry_time < _CR_MAX_RETRY:
+            await _wait_before_retry(_retry_time, online_model)
     
     # 最终还是没有解析成功 返回空
     return None
@@ -137,6 +191,7 @@ async def collect_requirement(
     
 _PR_MAX_RETRY = 3
 
+@coalesced(_workflow_flight, _flight_key("route_patcher"))
 async def patch_route(
     destination_clinic_id: str,
     requirement_summary: list[Requirement],
@@ -176,6 +231,8 @@ async def patch_route(
         # 返回为空 重新解析
         logger.warning(f"Patch route failed. Already retry {_retry_time} times. Retrying...")
         _retry_time += 1
+        if _retry_time < _PR_MAX_RETRY:
+            await _wait_before_retry(_retry_time, online_model)
     
     # 最终还是没有解析成功 返回空
     return None
@@ -226,10 +283,160 @@ async def modify_route(
     return patched_route
 
 
+async def advance_session(
+    session: TriageSession,
+    user_input: str
+) -> list[str]:
+    """
+    多轮分诊会话：处理患者新说的一句话 只重新执行受影响的阶段
+
+    - 症状：带着之前的对话只解码新增的一句，模型输出完整的最新总结
+    - 需求：只从新的一句中提取，追加到已有的需求后面
+    - 诊室：症状总结发生变化时才重新选择
+    - 路线：诊室或者需求发生变化时才重新修改，修改后按需求的时机重新优化访问顺序
+
+    `session` 会被原地更新，调用方负责在成功后保存。
+
+    Args:
+        session (TriageSession): 会话状态
+        user_input (str): 患者新说的一句话
+    Returns:
+        list[str]: 本轮实际重新执行的阶段
+    Raises:
+        ValueError: 某个阶段失败 会话保持在失败之前一致的状态
+    """
+
+    online_model = session.online_model
+    rerun: list[str] = []
+
+    # 1. 症状 第一轮之后离线推理总是复用上一轮留下的对话状态
+    conditions = await collect_conditions(user_input, online_model, reuse_prefix=True, history=session.turns)
+    rerun.append("conditions")
+    if not conditions:
+        raise ValueError("Failed to collect conditions.")
+    conditions_changed = conditions != session.conditions
+
+    # 2. 需求 只看新的一句 没有提到需求时模型输出空列表
+    new_requirements = await collect_requirement(user_input, online_model)
+    rerun.append("requirements")
+    if new_requirements is None:
+        logger.warning(f"[Session {session.session_id}] Failed to collect requirements, keep the previous ones")
+    requirements_changed = bool(new_requirements)
+
+    # 3. 诊室
+    clinic_id = session.clinic_selection
+    if conditions_changed or clinic_id is None:
+        clinic_id = await select_clinic(conditions, online_model)
+        rerun.append("clinic")
+        if not clinic_id:
+            raise ValueError("Failed to select clinic.")
+    clinic_changed = clinic_id != session.clinic_selection
+
+    requirements = session.requirements + (new_requirements or [])
+
+    # 4. 路线 需要至少有一条需求才有修改的意义
+    patched_route = session.patched_route
+    if requirements and (clinic_changed or requirements_changed or patched_route is None):
+        patched_route = await patch_route(clinic_id, requirements, session.origin_route, online_model)
+        rerun.append("route")
+        if not patched_route:
+            raise ValueError("Failed to patch route.")
+
+    # 5. 访问顺序 不调用模型 路线修改后重新优化
+    optimized_route = session.optimized_route
+    if patched_route is not None and (patched_route is not session.patched_route or optimized_route is None):
+        try:
+            optimized_route = optimize_route(session.origin_route, patched_route.patches, requirements)
+        except ValueError as e:
+            logger.warning(f"[Session {session.session_id}] Failed to optimize visit order: {e}")
+            optimized_route = None
+
+    session.turns.append(ConditionTurn(user_input=user_input, conditions=conditions))
+    session.conditions = conditions
+    session.clinic_selection = clinic_id
+    session.requirements = requirements
+    session.patched_route = patched_route
+    session.optimized_route = optimized_route
+
+    logger.info(f"[Session {session.session_id}] turn {len(session.turns)} reran: {', '.join(rerun)}")
+    return rerun
+
+
+async def _triage_one(
+    index: int,
+    user_input: str,
+    online_model: bool
+) -> BatchTriageItemResult:
+    """
+    对批量中的一个患者执行 收集症状 → 选择诊室
+    任何失败都只体现在该条结果中 不影响其他患者
+    """
+
+    async def run() -> BatchTriageItemResult:
+        # 离线推理按顺序执行 共享同一个系统提示词前缀状态
+        conditions = await collect_conditions(user_input, online_model, reuse_prefix=not online_model)
+        if not conditions:
+            return BatchTriageItemResult(index=index, success=False, error="Failed to collect conditions.")
+
+        clinic_id = await select_clinic(conditions, online_model, reuse_prefix=not online_model)
+        if not clinic_id:
+            return BatchTriageItemResult(index=index, success=False, conditions=conditions, error="Failed to select clinic.")
+
+        return BatchTriageItemResult(index=index, success=True, conditions=conditions, clinic_selection=clinic_id)
+
+    try:
+        return await with_deadline(run(), REQUEST_DEADLINES["batch_item"])
+    except TimeoutError:
+        return BatchTriageItemResult(index=index, success=False, error="Deadline exceeded.")
+    except Exception as e:
+        logger.error(f"Batch triage item {index} failed: {e}")
+        return BatchTriageItemResult(index=index, success=False, error=str(e))
+
+
+async def triage_batch(
+    user_inputs: list[str],
+    online_model: bool
+) -> AsyncIterator[BatchTriageItemResult]:
+    """
+    批量分诊：对多位患者的自述分别收集症状并选择诊室 每完成一位就产出一条结果
+
+    - 离线模型：逐条执行，复用系统提示词的前缀状态，只计算每位患者输入的增量部分
+    - 在线模型：最多 `BATCH_ONLINE_CONCURRENCY` 条并行，按完成顺序产出
+
+    Args:
+        user_inputs (list[str]): 各位患者的原始输入
+        online_model (bool): 是否使用在线模型
+    Yields:
+        BatchTriageItemResult: 单个患者的结果（`index` 对应输入下标）
+    """
+
+    if not online_model:
+        for index, user_input in enumerate(user_inputs):
+            yield await _triage_one(index, user_input, online_model)
+        return
+
+    semaphore = asyncio.Semaphore(BATCH_ONLINE_CONCURRENCY)
+
+    async def bounded(index: int, user_input: str) -> BatchTriageItemResult:
+        async with semaphore:
+            return await _triage_one(index, user_input, online_model)
+
+    tasks = [asyncio.ensure_future(bounded(index, user_input)) for index, user_input in enumerate(user_inputs)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # 客户端中途断开时 取消还没跑完的部分
+        for task in tasks:
+            task.cancel()
+
+
 __all__ = [
     "collect_conditions",
     "collect_requirement",
     "select_clinic",
     "patch_route",
-    "modify_route"
+    "modify_route",
+    "advance_session",
+    "triage_batch"
 ]
@@ -91,9 +91,71 @@ def generate_route_by_ids(*ids: str) -> list[LocationLink]:
     ]
 
 
+class OptimizedRouteOutput(BaseModel):
+    """
+    访问顺序优化后的路线
+    """
+
+    route: list[LocationLink] = Field(..., description="按优化后的顺序排列的路线")
+
+    distance: int = Field(..., description="总步行距离")
+
+
 class ClinicSelectionOutput(BaseModel):
     """
     诊室选择结果
     """
 
-    clinic_selection: str = Field(..., description="诊室ID")
\ No newline at end of file
+    clinic_selection: str = Field(..., description="诊室ID")
+
+
+class BatchTriageItemResult(BaseModel):
+    """
+    批量分诊中单个患者的结果
+    """
+
+    index: int = Field(..., description="该患者在请求列表中的下标")
+
+    success: bool = Field(..., description="是否成功")
+
+    conditions: ConditionCollectorOutput | None = Field(None, description="结构化症状信息")
+
+    clinic_selection: str | None = Field(None, description="诊室ID")
+
+    error: str | None = Field(None, description="失败原因")
+
+
+class ConditionTurn(BaseModel):
+    """
+    多轮分诊会话中的一轮症状收集
+    """
+
+    user_input: str = Field(..., description="患者这一轮的输入")
+
+    conditions: ConditionCollectorOutput = Field(..., description="这一轮之后的症状总结")
+
+
+class TriageSession(BaseModel):
+    """
+    多轮分诊会话的状态
+    """
+
+    session_id: str = Field(..., description="会话ID")
+
+    online_model: bool = Field(False, description="是否使用在线模型")
+
+    origin_route: list[LocationLink] = Field(..., description="原路线")
+
+    turns: list[ConditionTurn] = Field(default_factory=list, description="已经进行的症状收集轮次")
+
+    conditions: ConditionCollectorOutput | None = Field(None, description="当前的症状总结")
+
+    clinic_selection: str | None = Field(None, description="当前选择的诊室ID")
+
+    requirements: list[Requirement] = Field(default_factory=list, description="累计的患者需求")
+
+    patched_route: RoutePatcherOutput | None = Field(None, description="当前的路线修改方案")
+
+    optimized_route: OptimizedRouteOutput | None = Field(None, description="应用修改方案并优化访问顺序后的路线")
+
+    updated_at: float = Field(0.0, description="最后一次更新的时间戳")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+路径 → 小车指令转换的等价性测试与基准测试
+
+`full_path_to_commands` 用 NumPy 批量计算每一跳的方向、转向与合并后的距离，
+这里保留原来逐跳处理的实现（`reference_commands`）作为对照：
+
+1. 等价性：在合成的医院地图上的最短路径 / 随机游走（带掉头）、随机坐标（小数坐标、坐标相同的相邻节点）上，
+   两种实现给出相同的动作序列，或者抛出相同信息的 ValueError；主节点指令段拼接（`parse_route_to_commands`）的结果也与之相同
+2. 基准：不同长度的实际路线（经过多个主节点的最短路径）与随机游走（转向多）上两种实现的单次转换耗时
+
+有任何不一致时脚本以状态码 1 退出。
+
+用法：
+    python car_commands_benchmark.py [--lengths 10 100 1000 10000] [--cases N] [--repeats N] [--seed S]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+# 将 backend 根目录加入导入路径
+script_dir = os.path.dirname(__file__)
+backend_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
+sys.path.insert(0, backend_root)
+
+from src.map.typedef import Map, Node, Edge
+from src.map.generator import generate_hospital_map_of_size
+from src.map.tools import get_compiled_map
+from src.smart_triager.typedef import generate_route_by_ids
+from src.smart_triager.car.typedef import Orientation, CarAction, CarCommandsOutput
+from src.smart_triager.car.parser import (
+    get_absolute_direction,
+    get_relative_turn,
+    merge_straight_moves,
+    expand_main_route_to_full_path,
+    parse_route_to_commands,
+    full_path_to_commands,
+)
+
+
+def reference_commands(full_path: list[str], map: Map) -> CarCommandsOutput:
+    """
+    逐跳处理的原实现：每一跳查节点、算方向与转向、构造一个 CarAction，最后合并直行
+    """
+
+    if len(full_path) < 2:
+        return CarCommandsOutput(actions=[])
+
+    compiled = get_compiled_map(map)
+    directions, distances = [], []
+    for node_id1, node_id2 in zip(full_path, full_path[1:]):
+        if node_id1 not in compiled.index or node_id2 not in compiled.index:
+            raise ValueError(f"Node not found: {node_id1} or {node_id2}")
+        node1 = compiled.nodes[compiled.index[node_id1]]
+        node2 = compiled.nodes[compiled.index[node_id2]]
+        dx = int(node2.x - node1.x)
+        dy = int(node2.y - node1.y)
+        directions.append(get_absolute_direction(dx, dy))
+        distances.append(abs(dx) + abs(dy))
+
+    actions = [
+        CarAction(
+            orientation=Orientation.straight if i == 0 else get_relative_turn(directions[i - 1], directions[i]),
+            distance=distances[i],
+        )
+        for i in range(len(directions))
+    ]
+    return CarCommandsOutput(actions=[action for action in merge_straight_moves(actions) if action.distance > 0])
+
+
+def outcome(convert, full_path: list[str], map: Map):
+    """转换结果（动作序列）或者 ValueError 的信息"""
+
+    try:
+        return [(action.orientation, action.distance) for action in convert(full_path, map).actions]
+    except ValueError as e:
+        return f"ValueError: {e}"
+
+
+def random_walk(map: Map, length: int, rng: random.Random) -> list[str]:
+    """沿着边随机游走（可能掉头）"""
+
+    neighbors: dict[str, list[str]] = {}
+    for edge in map.edges:
+        neighbors.setdefault(edge.u_node, []).append(edge.v_node)
+        neighbors.setdefault(edge.v_node, []).append(edge.u_node)
+
+    path = [rng.choice(list(neighbors))]
+    while len(path) <= length:
+        path.append(rng.choice(neighbors[path[-1]]))
+    return path
+
+
+def route_path(map: Map, length: int, rng: random.Random) -> list[str]:
+    """依次经过随机主节点的最短路径 截取前 length 跳（实际路线：长直行多、转向少）"""
+
+    main_ids = [node.id for node in map.nodes if node.type == "main"]
+    path = [rng.choice(main_ids)]
+    while len(path) <= length:
+        try:
+            path.extend(expand_main_route_to_full_path(generate_route_by_ids(path[-1], rng.choice(main_ids)), map, "distance")[1:])
+        except ValueError:
+            continue
+    return path[:length + 1]
+
+
+def random_coordinate_map(count: int, rng: random.Random) -> Map:
+    """坐标随机（小数、大量重复）的节点 用来覆盖截断与坐标相同的相邻节点"""
+
+    nodes = [
+        Node(id=f"r{i}", x=rng.choice([rng.randint(0, 5), rng.uniform(-5, 5)]), y=rng.choice([rng.randint(0, 5), rng.uniform(-5, 5)]), type="nav")
+        for i in range(count)
+    ]
+    return Map(nodes=nodes, edges=[Edge(u=nodes[0].id, v=nodes[1].id)])
+
+
+def check_equivalence(cases: int, seed: int) -> int:
+    """
+    Returns:
+        int: 不一致的用例数
+    """
+
+    rng = random.Random(seed)
+    mismatches = 0
+
+    def compare(full_path: list[str], map: Map, expected=None) -> None:
+        nonlocal mismatches
+        reference = outcome(reference_commands, full_path, map)
+        for actual in (outcome(full_path_to_commands, full_path, map), expected):
+            if actual is not None and actual != reference:
+                mismatches += 1
+                print(f"不一致：{full_path[:8]}... 原实现 {str(reference)[:120]} 新实现 {str(actual)[:120]}")
+
+    hospital = generate_hospital_map_of_size(400, seed=seed)
+    main_ids = [node.id for node in hospital.nodes if node.type == "main"]
+    for _ in range(cases):
+        route = generate_route_by_ids(*rng.sample(main_ids, rng.randint(2, 5)))
+        try:
+            full_path = expand_main_route_to_full_path(route, hospital, "distance")
+        except ValueError:
+            continue
+        compare(full_path, hospital, outcome(lambda _, map: parse_route_to_commands(route, map, "distance"), full_path, hospital))
+        compare(random_walk(hospital, rng.randint(1, 200), rng), hospital)
+
+    coordinates = random_coordinate_map(30, rng)
+    for _ in range(cases):
+        compare([f"r{rng.randrange(30)}" for _ in range(rng.randint(0, 6))], coordinates)
+
+    # 不存在的节点
+    compare(["missing", main_ids[0]], hospital)
+    compare([main_ids[0], main_ids[1], "missing"], hospital)
+
+    return mismatches
+
+
+def measure(convert, paths: list[list[str]], map: Map, repeats: int) -> float:
+    """平均单次转换耗时（毫秒）"""
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for full_path in paths:
+            convert(full_path, map)
+        samples.append((time.perf_counter() - start) / len(paths))
+    return statistics.mean(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="路径 → 小车指令转换的等价性测试与基准测试")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000, 10000], help="基准测试的路径跳数")
+    parser.add_argument("--cases", type=int, default=300, help="等价性测试的用例数")
+    parser.add_argument("--repeats", type=int, default=5, help="基准测试的重复次数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    mismatches = check_equivalence(args.cases, args.seed)
+    print(f"等价性：{args.cases} 组用例，{mismatches} 处不一致")
+
+    rng = random.Random(args.seed)
+    map = generate_hospital_map_of_size(2000, seed=args.seed)
+    get_compiled_map(map)
+
+    print(f"{'paths':>8} {'hops':>8} {'actions':>8} {'reference':>12} {'vectorized':>12} {'speedup':>8}")
+    for kind, build in (("route", route_path), ("walk", random_walk)):
+        for length in args.lengths:
+            paths = [build(map, length, rng) for _ in range(max(1, 2000 // length))]
+            actions = statistics.mean(len(full_path_to_commands(full_path, map).actions) for full_path in paths)
+            reference = measure(reference_commands, paths, map, args.repeats)
+            vectorized = measure(full_path_to_commands, paths, map, args.repeats)
+            print(f"{kind:>8} {length:>8} {actions:>8.0f} {reference:>10.3f}ms {vectorized:>10.3f}ms {reference / vectorized:>7.1f}x")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+多车调度基准测试
+
+在合成的医院地图（见 `src/map/generator.py`）上，按地图规模与小车数量测量一轮调度（`FleetDispatcher.dispatch`）：
+小车随机停在主节点上，每辆小车一个随机的就诊任务（接患者的地点 + 1~3 个后续地点）。
+
+每个场景记录：
+- 调度耗时（平均 / p95）
+- 分配出去的任务比例
+- 冲突数（同一时间步两辆小车在同一个导航节点或同一条边上 应当为 0，否则脚本以状态码 1 退出）
+- 为避让而等待的总时间 以及与每辆小车单独规划相比多花的时间（避让的代价）
+
+用法：
+    python fleet_benchmark.py [--sizes 400 2000] [--cars 10 20 40] [--repeats N] [--seed S] [--output results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+
+# 将 backend 根目录加入导入路径
+script_dir = os.path.dirname(__file__)
+backend_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
+sys.path.insert(0, backend_root)
+
+from src.map.generator import generate_hospital_map_of_size
+from src.map.tools import get_compiled_map
+from src.smart_triager.typedef import generate_route_by_ids
+from src.smart_triager.car.fleet import FleetDispatcher
+from src.smart_triager.car.typedef import FleetTask
+
+
+def random_tasks(rng: random.Random, main_ids: list[str], count: int) -> list[FleetTask]:
+    return [
+        FleetTask(task_id=f"task-{i}", route=generate_route_by_ids(*rng.sample(main_ids, rng.randint(2, 4))))
+        for i in range(count)
+    ]
+
+
+def run_scenario(map, car_count: int, repeats: int, rng: random.Random) -> dict:
+    main_ids = [node.id for node in map.nodes if node.type == "main"]
+
+    samples, assigned, conflicts, waits, delays = [], [], 0, [], []
+    for _ in range(repeats):
+        dispatcher = FleetDispatcher(map)
+        positions = {f"car-{i}": rng.choice(main_ids) for i in range(car_count)}
+        for car_id, node in positions.items():
+            dispatcher.add_car(car_id, node)
+        tasks = random_tasks(rng, main_ids, car_count)
+
+        start = time.perf_counter()
+        result = dispatcher.dispatch(tasks, now=0.0)
+        samples.append(time.perf_counter() - start)
+
+        conflicts += len(dispatcher.find_conflicts())
+        assigned.append(len(result.assignments) / len(tasks))
+        waits.append(sum(assignment.wait_seconds for assignment in result.assignments))
+
+        # 每辆小车单独规划（没有其它小车）时的完成时间
+        by_id = {task.task_id: task for task in tasks}
+        delay = 0.0
+        for assignment in result.assignments:
+            alone = FleetDispatcher(map)
+            alone.add_car(assignment.car_id, positions[assignment.car_id])
+            baseline = alone.dispatch([by_id[assignment.task_id]], now=0.0).assignments[0]
+            delay += assignment.finish_seconds - baseline.finish_seconds
+        delays.append(delay)
+
+    ordered = sorted(samples)
+    return {
+        "cars": car_count,
+        "dispatch_mean_ms": statistics.mean(ordered) * 1000,
+        "dispatch_p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "assigned_ratio": statistics.mean(assigned),
+        "conflicts": conflicts,
+        "wait_seconds": statistics.mean(waits),
+        "delay_seconds": statistics.mean(delays),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多车调度基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[400, 2000], help="合成地图的大约节点数")
+    parser.add_argument("--cars", type=int, nargs="+", default=[10, 20, 40], help="小车数量")
+    parser.add_argument("--repeats", type=int, default=3, help="每个场景的重复次数（每次随机放置小车和任务）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--output", type=str, default=None, help="结果写入的 JSON 文件")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    for size in args.sizes:
+        map = generate_hospital_map_of_size(size, seed=args.seed)
+        get_compiled_map(map).target_rows # 最短路径表只构建一次 不计入调度耗时
+
+        print(f"size {size}: {len(map.nodes)} nodes, {len(map.edges)} edges")
+        for car_count in args.cars:
+            result = run_scenario(map, car_count, args.repeats, rng)
+            result["size"] = size
+            results.append(result)
+            print(
+                f"    {car_count:>4} cars  dispatch avg {result['dispatch_mean_ms']:>9.1f}ms  p95 {result['dispatch_p95_ms']:>9.1f}ms"
+                f"  assigned {result['assigned_ratio']:>6.1%}  conflicts {result['conflicts']}"
+                f"  waits {result['wait_seconds']:>7.1f}s  delay {result['delay_seconds']:>7.1f}s"
+            )
+
+    if args.output:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"结果已写入 {args.output}")
+
+    conflicts = sum(result["conflicts"] for result in results)
+    if conflicts:
+        print(f"错误：调度结果中有 {conflicts} 处冲突")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+地图最短路径搜索算法基准测试
+
+在合成的网格地图（10² ~ 10⁵ 个节点，随机删去一部分边模拟墙和障碍）上，
+对比 dijkstra / astar / bidirectional 三种搜索策略的单次查询耗时，并校验三者的路径长度一致。
+加上 `--hierarchy` 时额外测试收缩层次（预处理耗时 + 查询耗时），只对不超过 `--hierarchy-max-nodes` 的规模进行。
+
+用法：
+    python map_search_benchmark.py [--sizes 100 1000 10000 100000] [--queries N] [--drop-rate R] [--seed S] [--hierarchy]
+
+示例：
+    python map_search_benchmark.py --sizes 100 10000 --queries 50
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import statistics
+
+# 将 backend 根目录加入导入路径
+script_dir = os.path.dirname(__file__)
+backend_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
+sys.path.insert(0, backend_root)
+
+from src.map.typedef import Map, Node, Edge
+from src.map.compiled import CompiledGraph
+from src.map.hierarchy import ContractionHierarchy
+
+
+STRATEGIES = ["dijkstra", "astar", "bidirectional"]
+
+
+def build_grid_map(node_count: int, drop_rate: float, rng: random.Random) -> Map:
+    """
+    生成 side × side 的网格地图 相邻节点之间有边 每条边以 drop_rate 的概率被删去
+    """
+
+    side = max(2, round(math.sqrt(node_count)))
+
+    nodes = [
+        Node(id=f"n{r}_{c}", x=c, y=r, type="nav")
+        for r in range(side) for c in range(side)
+    ]
+
+    edges = []
+    for r in range(side):
+        for c in range(side):
+            if c + 1 < side and rng.random() >= drop_rate:
+                edges.append(Edge(u=f"n{r}_{c}", v=f"n{r}_{c + 1}"))
+            if r + 1 < side and rng.random() >= drop_rate:
+                edges.append(Edge(u=f"n{r}_{c}", v=f"n{r + 1}_{c}"))
+
+    return Map(nodes=nodes, edges=edges)
+
+
+def path_cost(graph: CompiledGraph, path: list[int] | None) -> float | None:
+    if path is None:
+        return None
+    return sum(
+        abs(graph.xs[a] - graph.xs[b]) + abs(graph.ys[a] - graph.ys[b])
+        for a, b in zip(path, path[1:])
+    )
+
+
+def run_benchmark(node_count: int, queries: int, drop_rate: float, seed: int, with_hierarchy: bool = False) -> dict:
+    rng = random.Random(seed)
+
+    start = time.perf_counter()
+    map = build_grid_map(node_count, drop_rate, rng)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    graph = CompiledGraph(map)
+    compile_seconds = time.perf_counter() - start
+
+    pairs = [(rng.randrange(graph.node_count), rng.randrange(graph.node_count)) for _ in range(queries)]
+
+    hierarchy = None
+    hierarchy_seconds = None
+    if with_hierarchy:
+        start = time.perf_counter()
+        hierarchy = ContractionHierarchy.build(graph)
+        hierarchy_seconds = time.perf_counter() - start
+
+    timings: dict[str, list[float]] = {strategy: [] for strategy in STRATEGIES}
+    if hierarchy is not None:
+        timings["hierarchy"] = []
+    mismatches = 0
+
+    for source, target in pairs:
+        costs = set()
+        for strategy in STRATEGIES:
+            start = time.perf_counter()
+            path = graph.shortest_path(source, target, strategy)
+            timings[strategy].append(time.perf_counter() - start)
+            costs.add(path_cost(graph, path))
+        if hierarchy is not None:
+            start = time.perf_counter()
+            result = hierarchy.query(source, target)
+            timings["hierarchy"].append(time.perf_counter() - start)
+            costs.add(path_cost(graph, result[1] if result is not None else None))
+        if len(costs) != 1:
+            mismatches += 1
+
+    return {
+        "nodes": graph.node_count,
+        "edges": len(map.edges),
+        "build_seconds": build_seconds,
+        "compile_seconds": compile_seconds,
+        "hierarchy_seconds": hierarchy_seconds,
+        "mismatches": mismatches,
+        "timings": timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="地图最短路径搜索算法基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000], help="网格节点数")
+    parser.add_argument("--queries", type=int, default=30, help="每个规模的随机查询次数")
+    parser.add_argument("--drop-rate", type=float, default=0.2, help="随机删去边的比例")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--hierarchy", action="store_true", help="同时测试收缩层次")
+    parser.add_argument("--hierarchy-max-nodes", type=int, default=20000, help="收缩层次预处理较慢 只对不超过该节点数的规模测试")
+    args = parser.parse_args()
+
+    print(f"{'nodes':>8} {'edges':>8} {'compile':>9} " + " ".join(f"{s + ' avg':>18} {s + ' p95':>18}" for s in STRATEGIES) + f" {'mismatch':>9}")
+
+    for size in args.sizes:
+        with_hierarchy = args.hierarchy and size <= args.hierarchy_max_nodes
+        result = run_benchmark(size, args.queries, args.drop_rate, args.seed, with_hierarchy)
+
+        columns = []
+        for strategy in STRATEGIES:
+            samples = sorted(result["timings"][strategy])
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            columns.append(f"{statistics.mean(samples) * 1000:>16.3f}ms {p95 * 1000:>16.3f}ms")
+
+        print(
+            f"{result['nodes']:>8} {result['edges']:>8} {result['compile_seconds'] * 1000:>7.1f}ms "
+            + " ".join(columns)
+            + f" {result['mismatches']:>9}"
+        )
+
+        if result["hierarchy_seconds"] is not None:
+            samples = result["timings"]["hierarchy"]
+            print(f"{'':>8} hierarchy: preprocess {result['hierarchy_seconds']:.2f}s, query avg {statistics.mean(samples) * 1000:.3f}ms")
+
+        if result["mismatches"]:
+            print(f"错误：{result['mismatches']} 次查询中不同策略得到的路径长度不一致")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
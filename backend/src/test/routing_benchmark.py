@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+路由流程基准测试
+
+在合成的医院地图（见 `src/map/generator.py`）上，按规模测量路由流程中各个环节的耗时：
+地图加载（load_map_from_str）、compute_costs（含编译）、最短路径表构建、dijkstra_search（随机点对）、
+validate_path、expand_main_route_to_full_path 与 parse_route_to_commands（标准就诊路线，距离 / 时间两种优化目标）。
+
+每个环节记录平均耗时与 p95，结果写成 JSON；加上 `--compare` 时与之前保存的结果逐项比较，
+平均耗时变慢超过 `--threshold` 的环节视为性能回退，脚本以状态码 1 退出。
+
+用法：
+    python routing_benchmark.py [--sizes 100 1000 10000] [--repeats N] [--queries N] [--seed S]
+                                [--output results.json] [--compare baseline.json] [--threshold 0.2]
+
+示例：
+    python routing_benchmark.py --sizes 100 1000 --output baseline.json
+    python routing_benchmark.py --sizes 100 1000 --compare baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+from typing import Callable
+
+# 将 backend 根目录加入导入路径
+script_dir = os.path.dirname(__file__)
+backend_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
+sys.path.insert(0, backend_root)
+
+from src.map.generator import generate_hospital_map_of_size
+from src.map.tools import load_map_from_str, compute_costs, get_compiled_map, dijkstra_search, validate_path
+from src.smart_triager.typedef import generate_route_by_ids
+from src.smart_triager.car.parser import expand_main_route_to_full_path, parse_route_to_commands
+
+
+def summarize(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p95_ms": p95 * 1000,
+        "samples": len(ordered),
+    }
+
+
+def measure(func: Callable[[], object], repeats: int) -> list[float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def standard_route(node_ids: list[str]) -> list[str]:
+    """标准就诊路线：入口 → 挂号处 → 地图中的每一种诊室（第一间） → 缴费处 → 药房 → 出口"""
+
+    clinics = [node_id for node_id in node_ids if node_id.endswith("_clinic")]
+    return ["entrance", "registration_center", *clinics, "payment_center", "pharmacy", "quit"]
+
+
+def run_benchmark(node_count: int, repeats: int, queries: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    map_json = generate_hospital_map_of_size(node_count, seed=seed).model_dump_json(by_alias=True)
+
+    timings: dict[str, list[float]] = {}
+
+    # 每次都是新的地图对象 编译结果不会命中缓存
+    timings["load_map"] = measure(lambda: load_map_from_str(map_json), repeats)
+    maps = [load_map_from_str(map_json) for _ in range(repeats)]
+    timings["compute_costs"] = [measure(lambda: compute_costs(m), 1)[0] for m in maps]
+
+    # 最短路径表构建在大地图上很慢 只测一次
+    map = maps[-1]
+    timings["build_tables"] = measure(lambda: get_compiled_map(map).target_rows, 1)
+    node_ids = [node.id for node in map.nodes]
+    pairs = [(rng.choice(node_ids), rng.choice(node_ids)) for _ in range(queries)]
+    paths = [dijkstra_search(a, b, map) for a, b in pairs]
+    timings["dijkstra_search"] = [measure(lambda: dijkstra_search(a, b, map), 1)[0] for a, b in pairs]
+    timings["validate_path"] = [measure(lambda: validate_path(map, p), 1)[0] for p in paths if p]
+
+    route = generate_route_by_ids(*standard_route(node_ids))
+    for objective in ("distance", "time"):
+        timings[f"expand_full_path_{objective}"] = measure(lambda: expand_main_route_to_full_path(route, map, objective), repeats)
+        timings[f"parse_commands_{objective}"] = measure(lambda: parse_route_to_commands(route, map, objective), repeats)
+
+    return {
+        "size": node_count,
+        "nodes": len(map.nodes),
+        "edges": len(map.edges),
+        "route_stops": len(route) + 1,
+        "operations": {name: summarize(samples) for name, samples in timings.items()},
+    }
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    """
+    与基线逐项比较平均耗时
+
+    Returns:
+        list[str]: 性能回退的描述
+    """
+
+    baseline_by_size = {result["size"]: result for result in baseline.get("results", [])}
+    regressions = []
+
+    for result in results:
+        previous = baseline_by_size.get(result["size"])
+        if previous is None:
+            continue
+        for name, stats in result["operations"].items():
+            old = previous["operations"].get(name)
+            if old is None or old["mean_ms"] <= 0:
+                continue
+            ratio = stats["mean_ms"] / old["mean_ms"]
+            marker = "  <-- 回退" if ratio > 1 + threshold else ""
+            print(f"{result['size']:>8} {name:>26} {old['mean_ms']:>10.3f}ms -> {stats['mean_ms']:>10.3f}ms ({ratio:>5.2f}x){marker}")
+            if marker:
+                regressions.append(f"{name} @ {result['size']}: {old['mean_ms']:.3f}ms -> {stats['mean_ms']:.3f}ms")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="路由流程基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="合成地图的大约节点数")
+    parser.add_argument("--repeats", type=int, default=5, help="加载、编译、路线解析等环节的重复次数")
+    parser.add_argument("--queries", type=int, default=30, help="dijkstra_search / validate_path 的随机查询次数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--output", type=str, default=None, help="结果写入的 JSON 文件")
+    parser.add_argument("--compare", type=str, default=None, help="作为基线的之前的结果 JSON 文件")
+    parser.add_argument("--threshold", type=float, default=0.2, help="平均耗时变慢超过该比例视为回退")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        result = run_benchmark(size, args.repeats, args.queries, args.seed)
+        results.append(result)
+
+        print(f"size {size}: {result['nodes']} nodes, {result['edges']} edges, route of {result['route_stops']} stops")
+        for name, stats in result["operations"].items():
+            print(f"    {name:>26} avg {stats['mean_ms']:>10.3f}ms  p95 {stats['p95_ms']:>10.3f}ms")
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "repeats": args.repeats,
+        "queries": args.queries,
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"错误：{len(regressions)} 项性能回退（阈值 {args.threshold:.0%}）")
+            for regression in regressions:
+                print(f"    {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
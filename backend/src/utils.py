@@ -4,7 +4,11 @@
 import os
 import subprocess
 from typing import Callable
-from llama_cpp import Llama
+
+import numpy as np
+from llama_cpp import Llama, LogitsProcessorList
+
+from src.cancellation import CancellationToken
 
 
 def remove_os_environ_proxies() -> None:
@@ -72,6 +76,43 @@ def build_logit_bias(
     return wrapper
 
 
+def cancellable_logits_processor(
+    model: Llama,
+    token: CancellationToken,
+    logit_bias: dict[int, float] | None = None,
+) -> LogitsProcessorList:
+    """
+    构建一个检查取消标记的 logits processor 列表
+    作为 `create_chat_completion` 的 logits_processor 参数传入，取消后模型在下一个 token 输出 EOS 结束生成
+
+    注意不要同时传入 `logit_bias` 与 `logits_processor`：llama-cpp-python 合并两者时用的是
+    `logits_processor = logits_processor.extend(...)`（结果为 None），两者都会被丢弃。
+    所以 logit bias 也在这里作为列表中的第一个 processor 应用（与 llama-cpp-python 内部的实现相同）。
+
+    Args:
+        model: Llama 模型实例
+        token: 取消标记
+        logit_bias: 可选的 logit bias 字典（见 `build_logit_bias`）
+    Returns:
+        LogitsProcessorList: 可以直接传入模型调用的 logits_processor
+    """
+
+    processors = []
+    if logit_bias:
+        bias_tokens = np.array(list(logit_bias.keys()), dtype=np.int32)
+        bias_values = np.array(list(logit_bias.values()), dtype=np.single)
+
+        def logit_bias_processor(input_ids, scores):
+            scores = np.copy(scores)
+            scores[bias_tokens] += bias_values
+            return scores
+
+        processors.append(logit_bias_processor)
+
+    processors.append(token.logits_processor(model.token_eos()))
+    return LogitsProcessorList(processors)
+
+
 def instruction_token_wrapper(origin: str) -> str:
     """
     将 **instruction** 用 **LFM2.5** 的格式包装起来
@@ -87,4 +128,4 @@ def input_token_wrapper(origin: str) -> str:
     """
 
     return f"<|im_start|>user{origin}<|im_end|>"
-    # return origin
\ No newline at end of file
+    # return origin